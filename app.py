@@ -1,22 +1,161 @@
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, make_response, render_template, request, stream_with_context
+from functools import wraps
+import cProfile
+import datetime
+import hashlib
+import io
+import json
+import os
+import pstats
 import sqlite3
-import pandas as pd
-from db_utils import get_connection, get_stock_news, get_market_news, get_news_price_correlation
+import threading
+import time
+import numpy as np
+from cache import TTLCache
+from metrics import HTTP_REQUEST_SECONDS, begin_request, end_request, render_all, slow_queries
+from resample import INTERVALS, bucket_ohlcv, downsample_line, period_bounds, resample
+from rollups import ROLLUP_TABLES, rollup_complete, rollups_available
+from indicators import INDICATOR_FIELDS, get_indicators, indicators_available
+from news_search import search_available, search_news
+from backtest import DEFAULT_COST_BPS, daily_returns, parameter_grid, parse_grid, run_strategy
+from query_engine import QueryError, get_query_engine
+from quotes import (MAX_SUBSCRIPTION, FakeQuoteProvider, QuoteCache, QuoteHub, QuotePoller, YFinanceQuoteProvider,
+                    event_data)
+from screener import SNAPSHOT_FIELDS, TEXT_FIELDS, load_snapshot, screen, snapshot_available
+from db_utils import (DATA_VERSION_NEWS, DATA_VERSION_PRICES, DATA_VERSION_STOCKS,
+                      get_data_versions, get_pool, pool_stats, get_stock_id, get_stock_news, get_market_news,
+                      get_news_for_stocks, get_news_price_correlation, get_last_closes, load_price_arrays)
+
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
 
 app = Flask(__name__)
+# ?profile=1 (cProfile) or ?profile=pyinstrument returns a profile of the request instead of its response.
+# Off unless PROFILE_REQUESTS=1 is set in the environment.
+app.config['PROFILE_REQUESTS'] = os.environ.get('PROFILE_REQUESTS') == '1'
+# Lines of cProfile output returned by ?profile=1
+PROFILE_LINES = 60
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    begin_request()
+    mode = request.args.get('profile') if app.config['PROFILE_REQUESTS'] else None
+    if mode == 'pyinstrument' and Profiler is not None:
+        g.profiler = Profiler()
+        g.profiler.start()
+    elif mode:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request_timing(response):
+    """Observes the route's time in /metrics and reports it with the SQLite share in a Server-Timing header."""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        response = _profile_response(profiler)
+    elapsed = time.perf_counter() - g.pop('request_started', time.perf_counter())
+    sql_seconds, queries = end_request()
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(elapsed, request.method, route, str(response.status_code))
+    response.headers['Server-Timing'] = (f'app;dur={elapsed * 1000:.2f}, '
+                                         f'db;dur={sql_seconds * 1000:.2f};desc="{queries} queries"')
+    return response
+
+def _profile_response(profiler) -> Response:
+    if Profiler is not None and isinstance(profiler, Profiler):
+        profiler.stop()
+        return Response(profiler.output_html(), mimetype='text/html')
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return Response(out.getvalue(), mimetype='text/plain')
+
+def get_db(readonly: bool = True) -> sqlite3.Connection:
+    """
+    Returns the connection for the current request, borrowing it from the shared
+    pool on first use. GET handlers use read-only connections; it is returned
+    to the pool when the request ends.
+    """
+    key = 'db_read' if readonly else 'db_write'
+    borrowed = g.get(key)
+    if borrowed is None:
+        pool = get_pool(readonly)
+        borrowed = (pool, pool.acquire())
+        setattr(g, key, borrowed)
+    return borrowed[1]
+
+@app.teardown_appcontext
+def release_db(exc):
+    for key in ('db_read', 'db_write'):
+        borrowed = g.pop(key, None)
+        if borrowed is not None:
+            pool, conn = borrowed
+            pool.release(conn)
+
+# Rendered bodies of the hot read endpoints, keyed by URL and the data versions they depend on
+response_cache = TTLCache()
+# data_version is re-read at most this often (seconds); the most a write can go unnoticed
+VERSION_CHECK_INTERVAL = 1.0
+_versions = {'checked_at': None, 'values': {}}
+_versions_lock = threading.Lock()
+
+def _data_versions() -> dict:
+    """Current data versions, re-read from the DB at most every VERSION_CHECK_INTERVAL seconds."""
+    with _versions_lock:
+        now = time.monotonic()
+        if _versions['checked_at'] is None or now - _versions['checked_at'] >= VERSION_CHECK_INTERVAL:
+            _versions['values'] = get_data_versions(conn=get_db())
+            _versions['checked_at'] = now
+        return _versions['values']
+
+def cached(ttl: float, *depends: str):
+    """
+    Caches a GET endpoint's 200 responses for `ttl` seconds. Entries are keyed on
+    the data versions named in `depends`, so they go stale as soon as an
+    ingestion script commits new data. Responses carry a content ETag and a
+    matching If-None-Match gets a 304 without a body.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = _data_versions()
+            key = (request.full_path, tuple(versions.get(name, 0) for name in depends))
+            entry = response_cache.get(key)
+            status = 'HIT'
+            if entry is None:
+                status = 'MISS'
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = (body, response.mimetype, hashlib.sha1(body).hexdigest())
+                response_cache.set(key, entry, ttl)
+
+            body, mimetype, etag = entry
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.headers['X-Cache'] = status
+            return response
+        return wrapper
+    return decorator
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/api/stocks')
+@cached(300, DATA_VERSION_STOCKS)
 def get_stocks_api():
     """Returns a list of all active stocks."""
-    conn = get_connection()
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
     cursor.execute("SELECT id, ticker, name, sector FROM stocks WHERE is_active = 1 ORDER BY ticker")
     rows = cursor.fetchall()
-    conn.close()
     
     stocks = [
         {"id": r[0], "ticker": r[1], "name": r[2], "sector": r[3]} 
@@ -24,126 +163,588 @@ def get_stocks_api():
     ]
     return jsonify(stocks)
 
+PRICE_FIELDS = ('date', 'open', 'high', 'low', 'close', 'volume')
+# Rows pulled from the cursor per chunk when streaming
+STREAM_CHUNK_ROWS = 500
+# Wire types for format=binary; prices are packed as float32, volume keeps float64 precision
+BINARY_DTYPES = {'date': '<i4', 'open': '<f4', 'high': '<f4', 'low': '<f4', 'close': '<f4', 'volume': '<f8'}
+
+def _parse_fields(raw: str):
+    """Validates a comma-separated fields= value. 'date' is always returned first."""
+    if not raw:
+        return list(PRICE_FIELDS)
+    requested = [f.strip().lower() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in PRICE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(PRICE_FIELDS)}")
+    return ['date'] + [f for f in PRICE_FIELDS[1:] if f in requested]
+
+def _range_query(table: str, date_column: str, fields, stock_id: int, start_date=None, end_date=None,
+                 tail=None):
+    """SELECT for one stock's rows in [start_date, end_date], oldest first. `fields` come from PRICE_FIELDS."""
+    columns = [f"{date_column} AS date" if f == 'date' else f for f in fields]
+    query = f"""
+        SELECT {', '.join(columns)}
+        FROM {table}
+        WHERE stock_id = ?
+    """
+    params = [stock_id]
+
+    if start_date:
+        query += f" AND {date_column} >= ?"
+        params.append(start_date)
+
+    if end_date:
+        query += f" AND {date_column} <= ?"
+        params.append(end_date)
+
+    if tail:
+        # Newest N rows from the index, flipped back to ascending order
+        query = f"SELECT * FROM ({query} ORDER BY {date_column} DESC LIMIT ?) ORDER BY date ASC"
+        params.append(tail)
+    else:
+        query += f" ORDER BY {date_column} ASC"
+    return query, params
+
+def _stream_rows(ticker: str, fields, chunks):
+    """Yields a JSON document {"ticker", "fields", "data": [[...], ...]} chunk by chunk from `chunks`."""
+    yield json.dumps({"ticker": ticker, "fields": fields})[:-1] + ', "data": ['
+    first = True
+    for rows in chunks:
+        chunk = json.dumps(rows, separators=(',', ':'))[1:-1]
+        yield chunk if first else ',' + chunk
+        first = False
+    yield ']}'
+
+def _to_arrays(fields, rows) -> dict:
+    """Row tuples to one NumPy array per field (dates as datetime64[D], NULLs as NaN)."""
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    return {
+        field: np.array(values, dtype='datetime64[D]' if field == 'date' else np.float64)
+        for field, values in zip(fields, columns)
+    }
+
+def _to_rows(fields, arrays: dict) -> list:
+    """Inverse of _to_arrays, with JSON-safe values (ISO dates, NaN as None, integer volume)."""
+    lists = []
+    for field in fields:
+        values = arrays[field]
+        if field == 'date':
+            lists.append(np.datetime_as_string(values, unit='D').tolist())
+        elif field == 'volume':
+            lists.append(np.nan_to_num(values).astype(np.int64).tolist())
+        else:
+            lists.append([None if v != v else v for v in values.tolist()])
+    return list(zip(*lists))
+
+def _downsample(fields, rows, interval, max_points, method):
+    """Applies interval= aggregation, then max_points= reduction (OHLC buckets or LTTB)."""
+    arrays = _to_arrays(fields, rows)
+    if interval:
+        arrays = resample(arrays, interval)
+    if max_points and len(arrays['date']) > max_points:
+        value_fields = [f for f in fields if f != 'date']
+        if method == 'lttb' and value_fields:
+            value_field = 'close' if 'close' in value_fields else value_fields[0]
+            arrays = downsample_line(arrays, max_points, value_field)
+        else:
+            arrays = bucket_ohlcv(arrays, max_points)
+    return _to_rows(fields, arrays)
+
+def _pack_binary(fields, rows) -> bytes:
+    """Packs each field as one contiguous little-endian array (dates as days since 1970-01-01)."""
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    parts = []
+    for field, values in zip(fields, columns):
+        if field == 'date':
+            array = np.array(values, dtype='datetime64[D]').astype(BINARY_DTYPES[field])
+        else:
+            # NULLs become NaN
+            array = np.array(values, dtype=np.float64).astype(BINARY_DTYPES[field])
+        parts.append(array.tobytes())
+    return b''.join(parts)
+
 @app.route('/api/data/<ticker>')
 def get_stock_data(ticker):
-    """Returns historical data for a given ticker."""
-    conn = get_connection()
-    cursor = conn.cursor()
+    """
+    Returns historical data for a given ticker.
+    Query params: start, end (YYYY-MM-DD), fields (comma-separated subset of
+    date,open,high,low,close,volume) and format:
+      rows     {"data": [{"date": ..., "close": ...}, ...]} (default)
+      columns  {"data": {"date": [...], "close": [...]}}
+      stream   chunked {"fields": [...], "data": [[...], ...]} written straight from the cursor
+      binary   application/octet-stream, one packed array per field in `fields` order;
+               X-Fields / X-Dtypes / X-Count headers describe the layout
+    Long ranges can be reduced on the server:
+      interval    1w | 1M calendar OHLCV bars (first open, max high, min low,
+                  last close, summed volume), dated by period start and
+                  read from the weekly/monthly rollup tables when built
+      max_points  upper bound on returned points, applied after interval
+      method      ohlc (default) merges equal-count buckets into OHLCV bars;
+                  lttb keeps the visually significant raw points of close
+    tail=N returns only the last N rows of the range (still oldest first); with
+    interval, the last N bars.
+    """
+    conn = get_db()
     
     # Get stock ID first
-    cursor.execute("SELECT id FROM stocks WHERE ticker = ?", (ticker,))
-    result = cursor.fetchone()
+    stock_id = get_stock_id(ticker, conn=conn)
     
-    if not result:
-        conn.close()
+    if stock_id is None:
         return jsonify({"error": "Stock not found"}), 404
-        
-    stock_id = result[0]
+
+    fmt = request.args.get('format', 'rows')
+    if fmt not in ('rows', 'columns', 'stream', 'binary'):
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+    try:
+        fields = _parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    interval = request.args.get('interval')
+    if interval and interval not in INTERVALS:
+        return jsonify({"error": f"Unknown interval: {interval}. Allowed: {', '.join(INTERVALS)}"}), 400
+    method = request.args.get('method', 'ohlc')
+    if method not in ('ohlc', 'lttb'):
+        return jsonify({"error": f"Unknown method: {method}"}), 400
+    tail = request.args.get('tail', type=int)
+    if tail is not None and tail < 1:
+        return jsonify({"error": "tail must be at least 1"}), 400
+    max_points = request.args.get('max_points', type=int)
+    if max_points is not None and max_points < 3:
+        return jsonify({"error": "max_points must be at least 3"}), 400
+    downsampling = bool(interval or max_points)
     
     # Fetch price data
     # Filter by date range if query params provided
     start_date = request.args.get('start')
     end_date = request.args.get('end')
-    
-    query = """
-        SELECT date, open, close, high, low, volume 
-        FROM daily_prices 
-        WHERE stock_id = ?
-    """
-    
-    params = [stock_id]
-    
-    if start_date:
-        query += " AND date >= ?"
-        params.append(start_date)
-        
-    if end_date:
-        query += " AND date <= ?"
-        params.append(end_date)
-        
-    query += " ORDER BY date ASC"
-    
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
-    
-    # Convert to list of dicts
-    data = df.to_dict(orient='records')
+
+    if interval:
+        # Bars cover whole calendar periods overlapping [start, end]
+        try:
+            if start_date:
+                start_date = period_bounds(start_date, interval)[0]
+            if end_date:
+                end_date = period_bounds(end_date, interval)[1]
+        except ValueError:
+            return jsonify({"error": "start and end must be dates (YYYY-MM-DD)"}), 400
+
+    rows = None
+    if interval and rollups_available(conn) and rollup_complete(conn, interval, stock_id):
+        # Served from the precomputed rollup table once it covers the stock's whole history
+        query, params = _range_query(ROLLUP_TABLES[interval], 'period_start', fields, stock_id,
+                                     start_date, end_date, tail)
+        rows = conn.execute(query, params).fetchall() or None
+        if rows is not None:
+            interval = None  # already aggregated
+            tail = None
+
+    if rows is None:
+        # With interval, tail counts bars, so it is applied after resampling
+        query, params = _range_query('daily_prices', 'date', fields, stock_id, start_date, end_date,
+                                     None if interval else tail)
+        cursor = conn.execute(query, params)
+
+        if fmt == 'stream' and not downsampling:
+            chunks = iter(lambda: cursor.fetchmany(STREAM_CHUNK_ROWS), [])
+            return Response(stream_with_context(_stream_rows(ticker, fields, chunks)), mimetype='application/json')
+
+        rows = cursor.fetchall()
+
+    source_count = len(rows)
+    if interval and tail:
+        rows = _downsample(fields, rows, interval, None, method)[-tail:]
+        interval = None
+    if downsampling:
+        rows = _downsample(fields, rows, interval, max_points, method)
+
+    if fmt == 'stream':
+        chunks = (rows[i:i + STREAM_CHUNK_ROWS] for i in range(0, len(rows), STREAM_CHUNK_ROWS))
+        return Response(_stream_rows(ticker, fields, chunks), mimetype='application/json')
+
+    if fmt == 'binary':
+        response = Response(_pack_binary(fields, rows), mimetype='application/octet-stream')
+        response.headers['X-Count'] = str(len(rows))
+        response.headers['X-Source-Count'] = str(source_count)
+        response.headers['X-Fields'] = ','.join(fields)
+        response.headers['X-Dtypes'] = ','.join(BINARY_DTYPES[f] for f in fields)
+        return response
+
+    if fmt == 'columns':
+        columns = zip(*rows) if rows else [()] * len(fields)
+        data = {field: list(values) for field, values in zip(fields, columns)}
+    else:
+        # Convert to list of dicts
+        data = [dict(zip(fields, row)) for row in rows]
     return jsonify({
         "ticker": ticker,
-        "count": len(data),
+        "count": len(rows),
+        "source_count": source_count,
         "data": data
     })
 
+@app.route('/api/indicators/<ticker>')
+@cached(300, DATA_VERSION_PRICES)
+def get_indicators_api(ticker):
+    """
+    Technical indicators for a ticker, oldest first.
+    Query params: start, end (YYYY-MM-DD), tail (newest N rows only) and
+    fields (comma-separated subset of the indicator columns, default all).
+    Returns {"ticker", "fields", "data": [[date, ...], ...]}.
+    """
+    conn = get_db()
+    stock_id = get_stock_id(ticker, conn=conn)
+    if stock_id is None:
+        return jsonify({"error": "Stock not found"}), 404
+    if not indicators_available(conn):
+        return jsonify({"error": "Indicators not built; run python3 indicators.py --rebuild"}), 503
+
+    raw = request.args.get('fields')
+    fields = [f.strip().lower() for f in raw.split(',') if f.strip()] if raw else list(INDICATOR_FIELDS)
+    unknown = [f for f in fields if f not in INDICATOR_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}. "
+                                 f"Allowed: {', '.join(INDICATOR_FIELDS)}"}), 400
+
+    tail = request.args.get('tail', type=int)
+    if tail is not None and tail < 1:
+        return jsonify({"error": "tail must be at least 1"}), 400
+
+    rows = get_indicators(conn, stock_id, fields, request.args.get('start'), request.args.get('end'), tail)
+    return jsonify({
+        "ticker": ticker,
+        "fields": ['date'] + fields,
+        "count": len(rows),
+        "data": [list(row) for row in rows]
+    })
+
+def _loaded_snapshot(conn: sqlite3.Connection) -> dict:
+    """The screener snapshot as NumPy arrays, loaded once per prices/stocks data version."""
+    versions = _data_versions()
+    key = ('latest_snapshot', versions.get(DATA_VERSION_PRICES, 0), versions.get(DATA_VERSION_STOCKS, 0))
+    snapshot = response_cache.get(key)
+    if snapshot is None:
+        snapshot = load_snapshot(conn)
+        response_cache.set(key, snapshot, 300)
+    return snapshot
+
+@app.route('/api/screen')
+@cached(60, DATA_VERSION_PRICES, DATA_VERSION_STOCKS)
+def screen_api():
+    """
+    Screens every active stock's latest snapshot with a filter expression.
+    Query params: q (e.g. close > sma_200 and volume > 2 * avg_volume_20),
+    sort (field, prefixed with - for descending) and limit (default 50).
+    Returns {"query", "count", "fields", "results": [...]}.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing q", "fields": list(SNAPSHOT_FIELDS) + list(TEXT_FIELDS)}), 400
+    conn = get_db()
+    if not snapshot_available(conn):
+        return jsonify({"error": "Snapshot not built; run python3 screener.py --rebuild"}), 503
+    try:
+        result = screen(_loaded_snapshot(conn), query, request.args.get('sort'),
+                        request.args.get('limit', 50, type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"query": query, **result})
+
+# Parameter combinations one /api/backtest request may sweep (the CLI has no limit)
+MAX_API_BACKTESTS = 50
+# Strategy parameters are passed as p.<name>=<values>, so other query params (e.g. ?profile=) never reach the grid
+BACKTEST_PARAM_PREFIX = 'p.'
+
+@app.route('/api/backtest')
+@cached(300, DATA_VERSION_PRICES)
+def backtest_api():
+    """
+    Backtests a strategy over the price store.
+    Query params: strategy (sma_cross, momentum, mean_reversion), tickers
+    (comma-separated, default all), start, end, cost_bps, limit (stocks
+    listed, default 20) and the strategy's own parameters prefixed with "p.",
+    e.g. p.fast=20&p.slow=100.
+    A parameter given as a comma-separated list sweeps every combination and
+    returns {"results": [{"params", <metrics>}, ...]} (best Sharpe first);
+    otherwise returns {"metrics", "equity": [[date, value], ...], "stocks"}.
+    """
+    strategy = request.args.get('strategy', 'sma_cross')
+    tickers = request.args.get('tickers')
+    tickers = [t.strip() for t in tickers.split(',') if t.strip()] if tickers else None
+    cost_bps = request.args.get('cost_bps', DEFAULT_COST_BPS, type=float)
+    try:
+        grid = parse_grid(f"{k[len(BACKTEST_PARAM_PREFIX):]}={v}" for k, v in request.args.items()
+                          if k.startswith(BACKTEST_PARAM_PREFIX))
+        combinations = parameter_grid(grid)
+        if len(combinations) > MAX_API_BACKTESTS:
+            raise ValueError(f"At most {MAX_API_BACKTESTS} parameter combinations per request; "
+                             f"use python3 backtest.py for larger sweeps")
+        prices = load_price_arrays(tickers, request.args.get('start'), request.args.get('end'), fields=('close',))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except KeyError as e:
+        return jsonify({"error": f"No prices for ticker {e.args[0]}"}), 404
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 503
+    close = prices['close']
+    if close.ndim == 1:
+        close = close[:, np.newaxis]
+    if not len(close):
+        return jsonify({"error": "No prices in this date range"}), 404
+    returns = daily_returns(close)
+
+    try:
+        if len(combinations) > 1:
+            results = [{"params": params,
+                        **run_strategy(close, strategy, params, cost_bps, returns, per_stock=False)["metrics"]}
+                       for params in combinations]
+            results.sort(key=lambda r: -np.inf if r["sharpe"] is None else r["sharpe"], reverse=True)
+            return jsonify({"strategy": strategy, "results": results})
+        result = run_strategy(close, strategy, combinations[0], cost_bps, returns)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stock_metrics = result["stock_metrics"]
+    order = np.argsort(-np.nan_to_num(stock_metrics["sharpe"], nan=-np.inf), kind='stable')
+    limit = request.args.get('limit', 20, type=int)
+    stocks = [
+        {"ticker": prices['tickers'][i],
+         **{name: (None if np.isnan(values[i]) else float(values[i])) for name, values in stock_metrics.items()}}
+        for i in order[:max(limit, 0)].tolist()
+    ]
+    dates = np.datetime_as_string(prices['dates'], unit='D').tolist()
+    return jsonify({
+        "strategy": strategy,
+        "params": combinations[0],
+        "metrics": result["metrics"],
+        "equity": [[d, round(v, 6)] for d, v in zip(dates, result["equity"].tolist())],
+        "stocks": stocks,
+    })
+
 @app.route('/api/execute_sql', methods=['POST'])
 def execute_sql():
-    """Executes a raw SQL query and returns the results."""
-    data = request.json
+    """
+    Runs a read-only SQL query through the guarded query engine.
+    JSON body: query, cursor (the previous page's next_cursor) and limit
+    (rows per page). Returns {"columns", "data", "plan", "row_count",
+    "truncated", "next_cursor", "elapsed_ms"}.
+    """
+    data = request.get_json(silent=True) or {}
     query = data.get('query')
-    
+
     if not query:
         return jsonify({"error": "No query provided"}), 400
-        
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+
     try:
-        cursor.execute(query)
-        
-        # If it's a SELECT query, fetch results
-        if cursor.description:
-            columns = [description[0] for description in cursor.description]
-            rows = cursor.fetchall()
-            
-            # Convert rows to list of dicts? Or just list of lists?
-            # List of lists is easier for dynamic table rendering if we send columns separately
-            results = [list(row) for row in rows]
-            
-            return jsonify({
-                "columns": columns,
-                "data": results
-            })
-        else:
-            # For INSERT, UPDATE, DELETE
-            conn.commit()
-            return jsonify({
-                "message": f"Query executed successfully. Rows affected: {cursor.rowcount}",
-                "rows_affected": cursor.rowcount
-            })
-            
-    except Exception as e:
+        return jsonify(get_query_engine().execute(query, cursor=data.get('cursor'), limit=data.get('limit')))
+    except QueryError as e:
+        return jsonify({"error": str(e)}), e.status
+
+@app.route('/api/news/search')
+@cached(60, DATA_VERSION_NEWS)
+def search_news_api():
+    """
+    Full-text news search ranked by bm25.
+    Query params: q (words, "quoted phrases", prefix*), ticker, from / to
+    (YYYY-MM-DD, inclusive), page (from 1) and limit (page size, max 100).
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"error": "No query provided"}), 400
+    conn = get_db()
+    if not search_available(conn):
+        return jsonify({"error": "Search index not built; run python3 news_search.py --rebuild"}), 503
+
+    ticker = request.args.get('ticker')
+    if ticker and get_stock_id(ticker, conn=conn) is None:
+        return jsonify({"error": "Stock not found"}), 404
+
+    try:
+        result = search_news(
+            conn, text, ticker=ticker,
+            date_from=request.args.get('from'), date_to=request.args.get('to'),
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('limit', 20, type=int)
+        )
+    except ValueError as e:
         return jsonify({"error": str(e)}), 400
-    finally:
-        conn.close()
+    return jsonify(result)
 
 @app.route('/api/news/<ticker>')
+@cached(60, DATA_VERSION_NEWS, DATA_VERSION_PRICES)
 def get_stock_news_api(ticker):
     """Returns news and impact analysis for a given ticker."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM stocks WHERE ticker = ?", (ticker,))
-    result = cursor.fetchone()
+    # One pooled connection serves all three lookups
+    conn = get_db()
+    stock_id = get_stock_id(ticker, conn=conn)
     
-    if not result:
-        conn.close()
+    if stock_id is None:
         return jsonify({"error": "Stock not found"}), 404
-        
-    stock_id = result[0]
-    conn.close()
     
-    news = get_stock_news(stock_id)
-    impact = get_news_price_correlation(stock_id)
+    try:
+        news = get_stock_news(stock_id, limit=request.args.get('limit', 20, type=int),
+                              cursor=request.args.get('cursor'), conn=conn)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    impact = get_news_price_correlation(stock_id, conn=conn)
     
     return jsonify({
         "ticker": ticker,
         "news": news,
+        "next_cursor": news[-1]["cursor"] if news else None,
         "impact": impact
     })
 
+@app.route('/api/news/batch')
+@cached(60, DATA_VERSION_NEWS)
+def news_batch_api():
+    """
+    Latest news for several tickers in one request (e.g. a watchlist).
+    Query params: tickers (comma-separated), limit (items per ticker).
+    Returns {ticker: [items]}; unknown tickers are left out.
+    """
+    tickers = [t.strip() for t in request.args.get('tickers', '').split(',') if t.strip()]
+    if not tickers:
+        return jsonify({"error": "No tickers provided"}), 400
+    conn = get_db()
+    ids = dict(conn.execute(
+        f"SELECT id, ticker FROM stocks WHERE ticker IN ({', '.join('?' * len(tickers))})", tickers
+    ).fetchall())
+    news = get_news_for_stocks(ids, limit=request.args.get('limit', 5, type=int), conn=conn)
+    return jsonify({ids[stock_id]: items for stock_id, items in news.items()})
+
 @app.route('/api/market_news')
+@cached(60, DATA_VERSION_NEWS)
 def market_news():
-    """Returns recent news across the market."""
-    news = get_market_news()
+    """
+    Returns recent news across the market, newest first.
+    Query params: limit, cursor (an item's cursor, to continue after it).
+    """
+    try:
+        news = get_market_news(limit=request.args.get('limit', 15, type=int),
+                               cursor=request.args.get('cursor'), conn=get_db())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(news)
 
+# Intraday quotes come from "yfinance" or "fake" (a local random walk). With QUOTE_POLLING off the
+# poller is created but not started, and quotes only move when something calls its poll_once.
+app.config['QUOTE_PROVIDER'] = os.environ.get('QUOTE_PROVIDER', 'yfinance')
+app.config['QUOTE_POLLING'] = True
+# Seconds between keep-alive comments on an idle quote stream
+QUOTE_HEARTBEAT = 15.0
+_quote_poller = {}
+_quote_poller_lock = threading.Lock()
+
+def _quote_reference_key():
+    """Changes when new closes are stored or the date rolls over, so change figures use the latest close."""
+    return get_data_versions().get(DATA_VERSION_PRICES), datetime.date.today()
+
+def get_quote_poller() -> QuotePoller:
+    """Returns the shared quote poller, creating (and starting) it on first use."""
+    with _quote_poller_lock:
+        poller = _quote_poller.get('poller')
+        if poller is None:
+            provider = FakeQuoteProvider() if app.config['QUOTE_PROVIDER'] == 'fake' else YFinanceQuoteProvider()
+            poller = _quote_poller['poller'] = QuotePoller(QuoteCache(), QuoteHub(), provider,
+                                                            reference_loader=get_last_closes,
+                                                            reference_key=_quote_reference_key)
+        if app.config['QUOTE_POLLING']:
+            poller.start()
+        return poller
+
+def _quote_tickers():
+    """
+    The `tickers` query param as a list, or an error response. Only active
+    stocks are accepted, so clients cannot make the poller fetch arbitrary symbols.
+    """
+    tickers = list(dict.fromkeys(t.strip() for t in request.args.get('tickers', '').split(',') if t.strip()))
+    if not tickers:
+        return None, (jsonify({"error": "No tickers provided"}), 400)
+    if len(tickers) > MAX_SUBSCRIPTION:
+        return None, (jsonify({"error": f"At most {MAX_SUBSCRIPTION} tickers per request"}), 400)
+    known = {row[0] for row in get_db().execute(
+        f"SELECT ticker FROM stocks WHERE is_active = 1 AND ticker IN ({', '.join('?' * len(tickers))})", tickers
+    )}
+    unknown = [t for t in tickers if t not in known]
+    if unknown:
+        return None, (jsonify({"error": f"Unknown tickers: {', '.join(unknown)}"}), 404)
+    return tickers, None
+
+@app.route('/api/quotes')
+def quotes_api():
+    """
+    Latest intraday quote per ticker from the in-memory cache (never the provider).
+    Query params: tickers (comma-separated), history=1 to add each ticker's ring buffer.
+    Only tickers that a quote stream (or the poller's watchlist) follows have quotes.
+    """
+    tickers, error = _quote_tickers()
+    if error:
+        return error
+    poller = get_quote_poller()
+    result = poller.cache.latest(tickers)
+    if request.args.get('history') == '1':
+        for ticker in result:
+            result[ticker]['history'] = poller.cache.history(ticker)
+    return jsonify(result)
+
+@app.route('/api/quotes/stream')
+def quotes_stream_api():
+    """
+    Server-Sent Events feed of intraday quotes for `tickers`. The first event
+    ("snapshot") carries the cached quotes; each "quotes" event after it
+    carries only the tickers whose price or volume changed, as
+    {ticker: {price, volume, ts, change, change_pct, seq}}.
+    """
+    tickers, error = _quote_tickers()
+    if error:
+        return error
+    poller = get_quote_poller()
+    subscription = poller.hub.subscribe(tickers)
+    snapshot = json.dumps(poller.cache.latest(tickers), separators=(',', ':'))
+
+    def events():
+        try:
+            yield f"retry: 3000\nevent: snapshot\ndata: {snapshot}\n\n"
+            while not subscription.closed:
+                payloads = subscription.get(QUOTE_HEARTBEAT)
+                yield f"event: quotes\ndata: {event_data(payloads)}\n\n" if payloads else ": keep-alive\n\n"
+        finally:
+            poller.hub.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/quote_stats')
+def quote_stats_api():
+    """Quote poller and subscription counters."""
+    return jsonify(get_quote_poller().stats())
+
+@app.route('/api/pool_stats')
+def pool_stats_api():
+    """Connection pool counters (hit rate, waits) for sizing the pool."""
+    return jsonify(pool_stats())
+
+@app.route('/api/query_stats')
+def query_stats_api():
+    """Query engine counters (completed, timed out, refused) and its connection pool."""
+    return jsonify(get_query_engine().stats())
+
+@app.route('/api/slow_queries')
+def slow_queries_api():
+    """The most recent statements over metrics.SLOW_QUERY_SECONDS, with their parameters."""
+    return jsonify(slow_queries())
+
+@app.route('/metrics')
+def metrics_api():
+    """Prometheus text exposition: request and SQLite timings, plus the ingestion scripts' last runs."""
+    return Response(render_all(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache_stats')
+def cache_stats_api():
+    """Response cache counters (hit rate, evictions, expirations)."""
+    return jsonify(response_cache.stats())
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -1,38 +1,132 @@
-import yfinance as yf
+import argparse
+import datetime
 import time
-from db_utils import get_all_stocks, save_daily_data
+from typing import Dict, List, Tuple
+from db_utils import DailyPriceWriter, get_all_stocks, get_last_price_rows, refresh_price_store
+from metrics import StageTimer
+from price_fetcher import PriceFetcher, DEFAULT_CHUNK_SIZE
 
-def backfill_history():
+FULL_PERIOD = "10y"
+# Stocks whose last stored bar is older than this get a full history fetch.
+FULL_REFRESH_GAP_DAYS = 180
+# Incremental fetches start this many calendar days before the last stored bar,
+# so the overlapping bars can be compared against what is already stored.
+OVERLAP_DAYS = 7
+# Relative change in a stored close that signals a split/dividend adjustment.
+ADJUSTMENT_TOLERANCE = 0.005
+
+def plan_backfill(stocks: List[Tuple[int, str]], last_rows: Dict[int, Tuple[str, float]],
+                  today: datetime.date = None):
+    """
+    Splits stocks into those needing the full history and those needing only
+    their missing tail. Tail stocks are grouped by fetch start date so each
+    group can be downloaded in shared multi-ticker requests.
+    """
+    today = today or datetime.date.today()
+    full = []
+    tails: Dict[str, List[Tuple[int, str]]] = {}
+    for stock_id, ticker in stocks:
+        last = last_rows.get(stock_id)
+        if last is None:
+            full.append((stock_id, ticker))
+            continue
+        last_date = datetime.date.fromisoformat(last[0])
+        if (today - last_date).days > FULL_REFRESH_GAP_DAYS:
+            full.append((stock_id, ticker))
+            continue
+        start = (last_date - datetime.timedelta(days=OVERLAP_DAYS)).isoformat()
+        tails.setdefault(start, []).append((stock_id, ticker))
+    return full, tails
+
+def is_adjusted(df, last_date: str, last_close: float) -> bool:
+    """True if the freshly fetched close for `last_date` no longer matches the stored one."""
+    if last_close is None:
+        return False
+    overlap = df[df.index.strftime('%Y-%m-%d') == last_date]
+    if overlap.empty:
+        return False
+    fetched = float(overlap['Close'].iloc[0])
+    return abs(fetched - last_close) > ADJUSTMENT_TOLERANCE * abs(last_close)
+
+def backfill_history(incremental: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE, provider=None):
     stocks = get_all_stocks()
-    print(f"Starting backfill for {len(stocks)} stocks...")
+    print(f"Starting {'incremental' if incremental else 'full'} backfill for {len(stocks)} stocks "
+          f"in chunks of {chunk_size}...")
     
     start_time = time.time()
     
-    for i, (stock_id, ticker) in enumerate(stocks):
-        # Optional: Skip if already has data? For now user said "collect", so backfill all.
-        print(f"[{i+1}/{len(stocks)}] Fetching 10y data for {ticker}...")
-        
-        try:
-            # Download 10 years of data
-            # Use auto_adjust=True to get adjusted prices (optional)
-            # User asked for Opening and Closing. Often adjust=False is safer for raw prices.
-            # But yfinance defaults usually work fine.
-            df = yf.download(ticker, period="10y", progress=False, multi_level_index=False)
-            
-            if df.empty:
-                print(f"  WARNING: No data found for {ticker}")
-                continue
-                
-            save_daily_data(stock_id, df)
-            
-            # Rate limiting to be polite
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"  ERROR fetching {ticker}: {e}")
+    # One multi-ticker download per chunk, paced by the fetcher's rate limiter.
+    # Use auto_adjust defaults from yfinance (adjusted prices).
+    timer = StageTimer("backfill_data")
+    fetcher = PriceFetcher(provider=provider, chunk_size=chunk_size, timer=timer)
+    failed = []
+    saved = 0
+
+    # Every batch is staged into one writer and committed in a single transaction
+    writer = DailyPriceWriter()
+    try:
+        if incremental:
+            last_rows = get_last_price_rows()
+            full, tails = plan_backfill(stocks, last_rows)
+            print(f"  {len(full)} stocks need full history, {len(stocks) - len(full)} only their tail.")
+
+            adjusted = []
+            for start, group in sorted(tails.items()):
+                for batch in fetcher.fetch_batches(group, start=start):
+                    frames, tickers = [], []
+                    for stock_id, ticker, df in batch:
+                        last_date, last_close = last_rows[stock_id]
+                        if is_adjusted(df, last_date, last_close):
+                            print(f"  Adjustment detected for {ticker}; scheduling full re-backfill.")
+                            adjusted.append((stock_id, ticker))
+                            continue
+                        new_rows = df[df.index.strftime('%Y-%m-%d') > last_date]
+                        if not new_rows.empty:
+                            frames.append((stock_id, new_rows))
+                            tickers.append(ticker)
+                    with timer.stage("write", tickers):
+                        writer.add(frames)
+                    saved += len(frames)
+                failed.extend(fetcher.failed)
+            full.extend(adjusted)
+        else:
+            full = stocks
+
+        for batch in fetcher.fetch_batches(full, period=FULL_PERIOD):
+            print(f"  Staging {FULL_PERIOD} data for {len(batch)} stocks ({batch[0][1]}...)")
+            with timer.stage("write", [ticker for _, ticker, _ in batch]):
+                writer.add([(stock_id, df) for stock_id, _, df in batch])
+            saved += len(batch)
+        failed.extend(fetcher.failed)
+    except BaseException:
+        writer.rollback()
+        raise
+    # Merges the last rows and refreshes rollups, indicators and the screener snapshot
+    with timer.stage("commit"):
+        writer.commit()
+
+    stats = writer.stats
+    print(f"  Rows inserted: {stats['inserted']}, updated: {stats['updated']}, unchanged: {stats['unchanged']}.")
+
+    for stock_id, ticker in failed:
+        print(f"  WARNING: No data found for {ticker}")
             
+    with timer.stage("price_store"):
+        bars = refresh_price_store(writer.touched)
+    print(f"  Price store synced ({bars} bars).")
+
     elapsed = time.time() - start_time
-    print(f"Backfill complete in {elapsed:.2f} seconds.")
+    print(f"Backfill complete in {elapsed:.2f} seconds. Stocks saved: {saved} "
+          f"({fetcher.requests} download requests).")
+    for line in timer.report():
+        print(line)
+    timer.finish()
 
 if __name__ == "__main__":
-    backfill_history()
+    parser = argparse.ArgumentParser(description="Backfill daily price history.")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-download the full history for every stock instead of only missing data.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Tickers per download request.")
+    args = parser.parse_args()
+    backfill_history(incremental=not args.full, chunk_size=args.chunk_size)
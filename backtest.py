@@ -0,0 +1,268 @@
+"""
+Vectorized backtests over the (date x stock) close matrix of the price store.
+
+A strategy is a function of the close matrix and its parameters that
+returns target positions of the same shape (-1 short, 0 flat, 1 long;
+fractions allowed). Positions are taken at the close they were computed on
+and earn the next day's return. The portfolio splits its capital equally
+across the open positions of each day, and costs are charged on the
+change in weights. Every step is a whole-matrix operation, with no loop
+over days, so a parameter sweep costs one pass per parameter set.
+sweep() spreads those passes over a process pool whose workers
+memory-map the store themselves.
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from indicators import rolling_mean_std
+from price_store import PriceStore
+
+TRADING_DAYS = 252
+# Cost per unit of weight traded, in basis points
+DEFAULT_COST_BPS = 10.0
+
+
+def _window(value, name: str) -> int:
+    window = int(value)
+    if window < 1:
+        raise ValueError(f"{name} must be at least 1")
+    return window
+
+
+def _lookback_return(close: np.ndarray, lookback: int) -> np.ndarray:
+    """close[t] / close[t - lookback] - 1, NaN for the first `lookback` rows."""
+    result = np.full_like(close, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result[lookback:] = close[lookback:] / close[:-lookback] - 1.0
+    return result
+
+
+def sma_cross(close: np.ndarray, fast: int = 20, slow: int = 50, short: int = 0) -> np.ndarray:
+    """Long while the fast SMA is above the slow one; short (if `short`) or flat below it."""
+    fast_sma, _ = rolling_mean_std(close, _window(fast, "fast"))
+    slow_sma, _ = rolling_mean_std(close, _window(slow, "slow"))
+    with np.errstate(invalid='ignore'):
+        above = fast_sma > slow_sma
+        below = fast_sma < slow_sma
+    return above.astype(np.float64) - (below.astype(np.float64) if short else 0.0)
+
+
+def momentum(close: np.ndarray, lookback: int = 120, top: float = 0.2) -> np.ndarray:
+    """Long the `top` fraction of stocks by trailing `lookback`-day return, rebalanced daily."""
+    if not 0 < top <= 1:
+        raise ValueError("top must be in (0, 1]")
+    trailing = _lookback_return(close, _window(lookback, "lookback"))
+    ranked = ~np.isnan(trailing)
+    threshold = np.full(len(close), np.inf)
+    rows = ranked.any(axis=1)
+    threshold[rows] = np.nanquantile(trailing[rows], 1.0 - float(top), axis=1)
+    with np.errstate(invalid='ignore'):
+        return (trailing >= threshold[:, np.newaxis]).astype(np.float64)
+
+
+def mean_reversion(close: np.ndarray, window: int = 20, entry: float = 2.0) -> np.ndarray:
+    """Long below mean - entry * std of the trailing `window`, short above mean + entry * std."""
+    mean, std = rolling_mean_std(close, _window(window, "window"))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (close - mean) / std
+        return (z < -entry).astype(np.float64) - (z > entry).astype(np.float64)
+
+
+STRATEGIES: Dict[str, Callable[..., np.ndarray]] = {
+    'sma_cross': sma_cross,
+    'momentum': momentum,
+    'mean_reversion': mean_reversion,
+}
+
+
+def daily_returns(close: np.ndarray) -> np.ndarray:
+    """Close-to-close returns, 0 where either close is missing (no bar, not listed yet)."""
+    returns = np.zeros_like(close)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[1:] = close[1:] / close[:-1] - 1.0
+    return np.where(np.isfinite(returns), returns, 0.0)
+
+
+def _max_drawdown(equity: np.ndarray) -> np.ndarray:
+    """Deepest fall from a running peak, along axis 0 (negative fraction)."""
+    return (equity / np.maximum.accumulate(equity, axis=0) - 1.0).min(axis=0)
+
+
+def _metrics(returns: np.ndarray, turnover: np.ndarray) -> dict:
+    """Summary statistics of daily returns (axis 0) and traded weight per day."""
+    days = returns.shape[0]
+    equity = np.cumprod(1.0 + returns, axis=0)
+    std = returns.std(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = np.where(std > 0, returns.mean(axis=0) / std * np.sqrt(TRADING_DAYS), np.nan)
+    return {
+        "total_return": equity[-1] - 1.0,
+        "cagr": equity[-1] ** (TRADING_DAYS / days) - 1.0,
+        "volatility": std * np.sqrt(TRADING_DAYS),
+        "sharpe": sharpe,
+        "max_drawdown": _max_drawdown(equity),
+        "turnover": turnover.mean(axis=0) * TRADING_DAYS,
+    }
+
+
+def _clean(value) -> Optional[float]:
+    value = float(value)
+    return None if value != value else value
+
+
+def backtest(close: np.ndarray, positions: np.ndarray, cost_bps: float = DEFAULT_COST_BPS,
+             returns: Optional[np.ndarray] = None, per_stock: bool = True) -> dict:
+    """
+    Runs target `positions` (date x stock) against `close`. Returns
+    {"metrics": portfolio statistics, "equity": daily portfolio equity
+    (starting at 1), "stock_metrics": {statistic: per-stock array} for each
+    stock traded on its own, skipped unless `per_stock`}. Pass precomputed
+    daily_returns(close) as `returns` when running many strategies over the
+    same prices.
+    """
+    if returns is None:
+        returns = daily_returns(close)
+    positions = np.where(np.isnan(close), 0.0, np.nan_to_num(positions))
+    cost = cost_bps / 10_000.0
+
+    # Equal capital across the day's open positions
+    gross = np.abs(positions).sum(axis=1, keepdims=True)
+    weights = np.divide(positions, gross, out=np.zeros_like(positions), where=gross > 0)
+    traded = np.abs(np.diff(weights, axis=0, prepend=0.0)).sum(axis=1)
+    portfolio = np.zeros(len(close))
+    portfolio[1:] = (weights[:-1] * returns[1:]).sum(axis=1)
+    portfolio -= traded * cost
+
+    metrics = {name: _clean(value) for name, value in _metrics(portfolio, traded).items()}
+    metrics["exposure"] = float((gross[:, 0] > 0).mean())
+    result = {"metrics": metrics, "equity": np.cumprod(1.0 + portfolio), "stock_metrics": None}
+    if per_stock:
+        stock_traded = np.abs(np.diff(positions, axis=0, prepend=0.0))
+        stock_returns = np.zeros_like(returns)
+        stock_returns[1:] = positions[:-1] * returns[1:]
+        stock_returns -= stock_traded * cost
+        result["stock_metrics"] = _metrics(stock_returns, stock_traded)
+    return result
+
+
+def run_strategy(close: np.ndarray, strategy: str, params: dict, cost_bps: float = DEFAULT_COST_BPS,
+                 returns: Optional[np.ndarray] = None, per_stock: bool = True) -> dict:
+    """backtest() of a named strategy from STRATEGIES. Raises ValueError for unknown names or parameters."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}. Available: {', '.join(STRATEGIES)}")
+    try:
+        positions = STRATEGIES[strategy](close, **params)
+    except TypeError as e:
+        raise ValueError(f"Invalid parameters for {strategy}: {e}")
+    return backtest(close, positions, cost_bps, returns, per_stock)
+
+
+def parameter_grid(grid: Dict[str, Iterable]) -> List[dict]:
+    """Every combination of the values in `grid`, e.g. {"fast": [10, 20], "slow": [100]}."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(grid[name]) for name in names))]
+
+
+# Per-worker state of a sweep: the close matrix (a memmap view) and its returns
+_worker = {}
+
+
+def _init_worker(store_path: str, tickers: Optional[List[str]], start: Optional[str], end: Optional[str]):
+    close = PriceStore.open(store_path).view(tickers, start, end, fields=('close',))['close']
+    _worker['close'] = close
+    _worker['returns'] = daily_returns(close)
+
+
+def _run_params(strategy: str, params: dict, cost_bps: float) -> dict:
+    result = run_strategy(_worker['close'], strategy, params, cost_bps, _worker['returns'], per_stock=False)
+    return {"params": params, **result["metrics"]}
+
+
+def sweep(store_path: str, strategy: str, grid: Dict[str, Iterable], tickers: Optional[List[str]] = None,
+          start: Optional[str] = None, end: Optional[str] = None, cost_bps: float = DEFAULT_COST_BPS,
+          processes: Optional[int] = None) -> List[dict]:
+    """
+    Backtests every parameter combination of `grid` across a process pool
+    (`processes` workers, default one per CPU; 1 runs in this process).
+    Returns one {"params", <metrics>} per combination, best Sharpe first.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}. Available: {', '.join(STRATEGIES)}")
+    combinations = parameter_grid(grid)
+    processes = min(processes or os.cpu_count() or 1, len(combinations))
+    if processes <= 1:
+        _init_worker(store_path, tickers, start, end)
+        results = [_run_params(strategy, params, cost_bps) for params in combinations]
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker,
+                                 initargs=(store_path, tickers, start, end)) as pool:
+            results = list(pool.map(_run_params, itertools.repeat(strategy), combinations,
+                                    itertools.repeat(cost_bps)))
+    return sorted(results, key=lambda r: -np.inf if r["sharpe"] is None else r["sharpe"], reverse=True)
+
+
+def _parse_value(text: str):
+    number = float(text)
+    return int(number) if number.is_integer() and '.' not in text else number
+
+
+def parse_grid(items: Iterable[str]) -> Dict[str, list]:
+    """["fast=10,20", "slow=100"] -> {"fast": [10, 20], "slow": [100]}."""
+    grid = {}
+    for item in items:
+        name, sep, values = item.partition('=')
+        if not sep or not name.strip() or not values.strip():
+            raise ValueError(f"Expected name=value[,value...], got {item!r}")
+        try:
+            parsed = [_parse_value(v.strip()) for v in values.split(',') if v.strip()]
+        except ValueError:
+            raise ValueError(f"Parameter values must be numbers: {item!r}")
+        if not parsed:
+            raise ValueError(f"Expected name=value[,value...], got {item!r}")
+        grid[name.strip()] = parsed
+    return grid
+
+
+if __name__ == "__main__":
+    import db_utils
+
+    parser = argparse.ArgumentParser(description="Backtest a strategy, or sweep its parameters, on the price store.")
+    parser.add_argument("strategy", choices=sorted(STRATEGIES))
+    parser.add_argument("-p", "--param", action="append", default=[],
+                        help="Parameter values, e.g. -p fast=10,20,50 -p slow=100,200 (every combination is run).")
+    parser.add_argument("--tickers", help="Comma-separated tickers (default: the whole universe).")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--cost-bps", type=float, default=DEFAULT_COST_BPS)
+    parser.add_argument("--processes", type=int, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--top", type=int, default=20, help="Rows to print.")
+    args = parser.parse_args()
+
+    tickers = [t.strip() for t in args.tickers.split(',')] if args.tickers else None
+    try:
+        grid = parse_grid(args.param)
+    except ValueError as e:
+        parser.error(str(e))
+    if PriceStore.open(db_utils.PRICE_STORE_DIR) is None:
+        parser.error("price store not built; run python3 price_store.py --rebuild")
+
+    start_time = time.time()
+    try:
+        results = sweep(db_utils.PRICE_STORE_DIR, args.strategy, grid, tickers, args.start, args.end,
+                        args.cost_bps, args.processes)
+    except (ValueError, KeyError) as e:
+        parser.error(str(e))
+    print(f"{len(results)} backtests in {time.time() - start_time:.2f} seconds.")
+    print(f"{'params':<40} {'total':>9} {'cagr':>8} {'sharpe':>7} {'max dd':>8} {'turnover':>9}")
+    for r in results[:args.top]:
+        params = " ".join(f"{k}={v}" for k, v in r["params"].items()) or "(defaults)"
+        cells = [f"{r[k]:>{w}.2%}" if r[k] is not None else f"{'-':>{w}}"
+                 for k, w in (("total_return", 9), ("cagr", 8))]
+        sharpe = f"{r['sharpe']:>7.2f}" if r['sharpe'] is not None else f"{'-':>7}"
+        print(f"{params:<40} {cells[0]} {cells[1]} {sharpe} {r['max_drawdown']:>8.2%} {r['turnover']:>9.1f}")
@@ -0,0 +1 @@
+"""Performance benchmarks. Run from the repository root, e.g. `python -m bench.bench_save_daily_data`."""
@@ -0,0 +1,83 @@
+"""
+Cost of keeping the indicators table current for a synthetic universe
+(default 500 stocks x 10 years): a full recompute from daily_prices against
+the incremental update that runs after a nightly load appends one bar per
+stock, which resumes from the stored EMA/RSI/ATR state. Also checks that
+both produce the same rows.
+
+    python -m bench.bench_indicators --stocks 500 --years 10
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from bench.bench_price_layout import synthetic_rows
+from indicators import INDICATOR_FIELDS, rebuild_indicators, update_indicators
+
+
+def build(path: str, n_stocks: int, years: int):
+    conn = sqlite3.connect(path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.executemany("INSERT INTO stocks (id, ticker, name) VALUES (?, ?, ?)",
+                     [(i, f"SYN{i}.BO", f"Company{i}") for i in range(1, n_stocks + 1)])
+    for stock_id, day_numbers, open_, close, high, low, volume in synthetic_rows(n_stocks, years):
+        dates = np.datetime_as_string(day_numbers.astype("datetime64[D]"), unit="D").tolist()
+        conn.executemany(
+            "INSERT INTO daily_prices (stock_id, date, open, close, high, low, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip([stock_id] * len(dates), dates, open_.tolist(), close.tolist(), high.tolist(), low.tolist(),
+                volume.tolist())
+        )
+    conn.commit()
+    return conn
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run(n_stocks: int, years: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_indicators_"), "bench.db")
+    conn = build(path, n_stocks, years)
+    last_date = conn.execute("SELECT MAX(date) FROM daily_prices").fetchone()[0]
+    # Hold back the last bar, as if tonight's update has not run yet
+    new_bars = conn.execute("SELECT * FROM daily_prices WHERE date = ?", (last_date,)).fetchall()
+    conn.execute("DELETE FROM daily_prices WHERE date = ?", (last_date,))
+    n_rows = conn.execute("SELECT COUNT(*) FROM daily_prices").fetchone()[0]
+    print(f"{n_stocks} stocks, {n_rows:,} daily bars")
+
+    full_seconds, written = timed(lambda: rebuild_indicators(conn))
+    conn.commit()
+    print(f"  full recompute                 {full_seconds:8.3f} s  {written:>10,} rows")
+
+    conn.executemany(f"INSERT INTO daily_prices VALUES ({', '.join('?' * len(new_bars[0]))})", new_bars)
+    touched = {row[1]: last_date for row in new_bars}
+    incremental_seconds, written = timed(lambda: update_indicators(conn, touched))
+    conn.commit()
+    print(f"  incremental, one new bar each  {incremental_seconds:8.3f} s  {written:>10,} rows   "
+          f"{full_seconds / incremental_seconds:6.1f}x faster")
+
+    fields = ", ".join(INDICATOR_FIELDS)
+    incremental = conn.execute(f"SELECT stock_id, {fields} FROM indicators WHERE date = ? ORDER BY stock_id",
+                               (last_date,)).fetchall()
+    rebuild_indicators(conn)
+    full = conn.execute(f"SELECT stock_id, {fields} FROM indicators WHERE date = ? ORDER BY stock_id",
+                        (last_date,)).fetchall()
+    a = np.array(incremental, dtype=np.float64)
+    b = np.array(full, dtype=np.float64)
+    print(f"  max difference vs full recompute: {np.nanmax(np.abs(a - b)):.2e}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=500)
+    parser.add_argument("--years", type=int, default=10)
+    args = parser.parse_args()
+    run(args.stocks, args.years)
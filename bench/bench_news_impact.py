@@ -0,0 +1,120 @@
+"""
+Time to compute news/price correlations for the whole universe: the
+original per-stock get_news_price_correlation (two read_sql_query round
+trips and a merge per stock) against news_impact.compute_impact, which
+loads everything in two queries and computes same-day, lagged and rolling
+correlations in one vectorized pass. Also checks that both agree on the
+same-day correlation.
+
+    python -m bench.bench_news_impact --stocks 500 --articles 20
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from news_impact import compute_impact
+
+AS_OF = "2026-10-16"
+
+
+def build(path: str, n_stocks: int, articles_per_day: int, days: int):
+    """Random-walk bars for the last `days` business days and news whose sentiment leaks into returns."""
+    conn = sqlite3.connect(path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.executemany("INSERT INTO stocks (id, ticker, name) VALUES (?, ?, ?)",
+                     [(i, f"SYN{i}.BO", f"Company{i}") for i in range(1, n_stocks + 1)])
+    rng = np.random.default_rng(11)
+    end = np.datetime64(AS_OF)
+    dates = np.arange(end - np.timedelta64(days, "D"), end + np.timedelta64(1, "D"))
+    dates = dates[np.is_busday(dates)]
+    iso = np.datetime_as_string(dates, unit="D").tolist()
+
+    news_id = 0
+    for stock_id in range(1, n_stocks + 1):
+        mood = rng.normal(0, 0.3, len(dates))
+        has_news = rng.random(len(dates)) < articles_per_day / 100
+        pct = rng.normal(0, 1.0, len(dates)) + 0.8 * np.where(has_news, mood, 0)
+        open_ = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        close = open_ * (1 + pct / 100)
+        conn.executemany(
+            "INSERT INTO daily_prices (stock_id, date, open, close, high, low, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip([stock_id] * len(dates), iso, open_.tolist(), close.tolist(),
+                np.maximum(open_, close).tolist(), np.minimum(open_, close).tolist(), [1000] * len(dates))
+        )
+        rows, links = [], []
+        for day in np.flatnonzero(has_news).tolist():
+            news_id += 1
+            rows.append((news_id, f"Story {news_id}", f"https://news.example.com/{news_id}",
+                         f"{iso[day]} 09:15:00", float(np.clip(mood[day], -1, 1))))
+            links.append((stock_id, news_id))
+        conn.executemany("INSERT INTO news (id, headline, url, published_at, sentiment_score) VALUES (?, ?, ?, ?, ?)",
+                         rows)
+        conn.executemany("INSERT INTO stock_news (stock_id, news_id) VALUES (?, ?)", links)
+    conn.commit()
+    conn.execute("ANALYZE")
+    return conn
+
+
+def legacy_correlation(conn: sqlite3.Connection, stock_id: int, since: str):
+    """The original per-stock implementation (lookback measured from `since` rather than now)."""
+    news_df = pd.read_sql_query("""
+        SELECT date(n.published_at) as news_date, AVG(n.sentiment_score) as avg_sentiment
+        FROM news n
+        JOIN stock_news sn ON n.id = sn.news_id
+        WHERE sn.stock_id = ? AND n.published_at >= ?
+        GROUP BY news_date
+    """, conn, params=(stock_id, since))
+    if news_df.empty:
+        return None
+    price_df = pd.read_sql_query("""
+        SELECT date, (close - open) / open * 100 as pct_change
+        FROM daily_prices
+        WHERE stock_id = ? AND date >= ?
+    """, conn, params=(stock_id, since))
+    merged = pd.merge(news_df, price_df, left_on='news_date', right_on='date')
+    if len(merged) < 3:
+        return None
+    return merged['avg_sentiment'].corr(merged['pct_change'])
+
+
+def run(n_stocks: int, articles_per_day: int, days: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_news_impact_"), "bench.db")
+    conn = build(path, n_stocks, articles_per_day, days)
+    since = (datetime.date.fromisoformat(AS_OF) - datetime.timedelta(days=days)).isoformat()
+    n_news = conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+    print(f"{n_stocks} stocks, {days} days, {n_news} articles")
+
+    start = time.perf_counter()
+    legacy = {stock_id: legacy_correlation(conn, stock_id, since) for stock_id in range(1, n_stocks + 1)}
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    impact = compute_impact(conn, lookback_days=days, as_of=AS_OF)
+    engine_seconds = time.perf_counter() - start
+
+    diffs = [abs(impact[stock_id][0]["correlation"] - r) for stock_id, r in legacy.items()
+             if r is not None and not np.isnan(r)]
+    print(f"  per-stock legacy (same-day only)      {legacy_seconds:8.3f} s")
+    print(f"  compute_impact (lags 0-5 + rolling)   {engine_seconds:8.3f} s   "
+          f"{legacy_seconds / engine_seconds:6.1f}x")
+    print(f"  max same-day correlation difference   {max(diffs) if diffs else 0:.2e} over {len(diffs)} stocks")
+    lag_means = [np.nanmean([np.nan if lags[lag]["correlation"] is None else lags[lag]["correlation"]
+                             for lags in impact.values()]) for lag in range(3)]
+    print("  mean correlation by lag               " + "  ".join(f"{m:+.3f}" for m in lag_means))
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stocks", type=int, default=500)
+    parser.add_argument("--articles", type=int, default=20, help="Chance (percent) of news on a trading day.")
+    parser.add_argument("--days", type=int, default=365, help="Calendar days of history.")
+    args = parser.parse_args()
+    run(args.stocks, args.articles, args.days)
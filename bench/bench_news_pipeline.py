@@ -0,0 +1,117 @@
+"""
+Compares the original serial news loop with the staged NewsPipeline against
+FakeNewsProvider, which simulates per-request latency and syndicated stories.
+
+    python -m bench.bench_news_pipeline --stocks 100 --latency 0.3
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import db_utils
+import fetch_news
+from price_fetcher import TokenBucket
+
+
+def legacy_fetch_and_store_news(stocks, provider, pause: float) -> int:
+    """
+    The pre-pipeline implementation: one stock at a time, two or three statements
+    per article, fixed sleep. Returns the number of SQL statements executed.
+    """
+    conn = db_utils.get_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    cursor = conn.cursor()
+    for stock_id, ticker in stocks:
+        for item in provider.news(fetch_news.yf_symbol(ticker)):
+            article = fetch_news.parse_news_item(item)
+            if article is None:
+                continue
+            sentiment = fetch_news.analyze_sentiment(f"{article['headline']} {article['summary']}")
+            cursor.execute("""
+                INSERT OR IGNORE INTO news (headline, summary, url, publisher, published_at, sentiment_score)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (article['headline'], article['summary'], article['url'], article['publisher'],
+                  article['published_at'], sentiment))
+            if cursor.rowcount > 0:
+                news_id = cursor.lastrowid
+            else:
+                cursor.execute("SELECT id FROM news WHERE url = ?", (article['url'],))
+                res = cursor.fetchone()
+                news_id = res[0] if res else None
+            if news_id:
+                cursor.execute("INSERT OR IGNORE INTO stock_news (stock_id, news_id) VALUES (?, ?)",
+                               (stock_id, news_id))
+        conn.commit()
+        time.sleep(pause)
+    conn.close()
+    return len(statements)
+
+
+def fresh_db(path: str, n_stocks: int):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.executemany("INSERT INTO stocks (id, ticker, name) VALUES (?, ?, ?)",
+                     [(i + 1, f"SYN{i}.BO", f"Synthetic {i}") for i in range(n_stocks)])
+    conn.commit()
+    conn.close()
+
+
+def table_counts(path: str):
+    conn = sqlite3.connect(path)
+    counts = tuple(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("news", "stock_news"))
+    conn.close()
+    return counts
+
+
+def run(n_stocks: int, latency: float, pause: float, workers: int, rate: float):
+    stocks = [(i + 1, f"SYN{i}.BO") for i in range(n_stocks)]
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench_news_"), "bench.db")
+    db_utils.DB_NAME = db_path
+    results = {}
+
+    fresh_db(db_path, n_stocks)
+    start = time.perf_counter()
+    statements = {"legacy serial loop": legacy_fetch_and_store_news(
+        stocks, fetch_news.FakeNewsProvider(latency=latency), pause)}
+    results["legacy serial loop"] = time.perf_counter() - start
+    expected = table_counts(db_path)
+
+    fresh_db(db_path, n_stocks)
+    pipeline = fetch_news.NewsPipeline(fetch_news.FakeNewsProvider(latency=latency), fetch_workers=workers,
+                                       limiter=TokenBucket(rate, max(1, int(rate))))
+    stats = pipeline.run(stocks)
+    results[f"pipeline, {workers} fetch workers"] = stats["elapsed"]
+    statements[f"pipeline, {workers} fetch workers"] = stats["statements"]
+    assert table_counts(db_path) == expected, (table_counts(db_path), expected)
+
+    # Second run over the same stories: everything is already stored
+    stats = pipeline.run(stocks)
+    results["pipeline, rerun (all duplicates)"] = stats["elapsed"]
+    statements["pipeline, rerun (all duplicates)"] = stats["statements"]
+    assert stats["inserted"] == 0 and stats["linked"] == 0, stats
+    assert stats["duplicates"] == stats["articles"], stats
+
+    print(f"{n_stocks} stocks, {latency * 1000:.0f} ms per request, {rate:g} requests/s limit; "
+          f"{expected[0]} articles, {expected[1]} links")
+    for name, elapsed in results.items():
+        print(f"  {name:<36} {elapsed:8.2f} s  {n_stocks / elapsed:8.1f} stocks/s  "
+              f"{statements[name]:6d} statements executed")
+    print(f"  stage busy time (last run): fetch {stats['fetch_seconds']:.2f} s, "
+          f"sentiment {stats['sentiment_seconds']:.2f} s, write {stats['write_seconds']:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=100, help="Number of synthetic stocks.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Simulated seconds per news request.")
+    parser.add_argument("--pause", type=float, default=0.5, help="Legacy sleep between stocks.")
+    parser.add_argument("--workers", type=int, default=fetch_news.FETCH_WORKERS)
+    parser.add_argument("--rate", type=float, default=fetch_news.NEWS_RATE, help="Pipeline requests per second.")
+    args = parser.parse_args()
+    run(args.stocks, args.latency, args.pause, args.workers, args.rate)
@@ -0,0 +1,120 @@
+"""
+Latency of /api/news/search queries (news_search.search_news) on a synthetic
+news archive, default one million articles, against the LIKE '%term%' scan
+the same lookup needs without the FTS index.
+
+    python -m bench.bench_news_search --articles 1000000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from news_search import build_match_query, search_news
+
+N_STOCKS = 500
+VOCABULARY = 5000
+
+
+def words(n: int):
+    """Synthetic vocabulary; word i has Zipf-like frequency ~ 1 / (i + 10)."""
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    rng = np.random.default_rng(3)
+    return ["".join(rng.choice(letters, size=rng.integers(4, 10))) for _ in range(n)]
+
+
+def build(path: str, n_articles: int, batch: int = 50_000) -> float:
+    conn = sqlite3.connect(path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.executemany("INSERT INTO stocks (id, ticker, name) VALUES (?, ?, ?)",
+                     [(i + 1, f"SYN{i}.BO", f"Company{i}") for i in range(N_STOCKS)])
+    vocab = np.array(words(VOCABULARY))
+    weights = 1.0 / (np.arange(VOCABULARY) + 10)
+    weights /= weights.sum()
+    rng = np.random.default_rng(5)
+    first_day = np.datetime64("2021-10-16T00:00")
+
+    start = time.perf_counter()
+    for offset in range(0, n_articles, batch):
+        n = min(batch, n_articles - offset)
+        companies = rng.integers(0, N_STOCKS, n)
+        headline_words = vocab[rng.choice(VOCABULARY, size=(n, 6), p=weights)]
+        summary_words = vocab[rng.choice(VOCABULARY, size=(n, 25), p=weights)]
+        minutes = rng.integers(0, 5 * 365 * 24 * 60, n)
+        published = np.datetime_as_string(first_day + minutes.astype("timedelta64[m]"), unit="s")
+        rows = [
+            (f"Company{c} " + " ".join(h), " ".join(s), f"https://news.example.com/{offset + i}",
+             published[i].replace("T", " "))
+            for i, (c, h, s) in enumerate(zip(companies.tolist(), headline_words.tolist(), summary_words.tolist()))
+        ]
+        conn.executemany("INSERT INTO news (headline, summary, url, published_at) VALUES (?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO stock_news (stock_id, news_id) VALUES (?, ?)",
+                         [(c + 1, offset + i + 1) for i, c in enumerate(companies.tolist())])
+        conn.commit()
+    conn.execute("INSERT INTO news_fts(news_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - start
+
+
+def timings(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def run(n_articles: int, repeat: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_search_"), "bench.db")
+    build_time = build(path, n_articles)
+    vocab = words(VOCABULARY)
+    conn = sqlite3.connect(path)
+    size = os.path.getsize(path) / 1e6
+    print(f"{n_articles:,} articles, {size:.0f} MB, built and indexed in {build_time:.1f} s")
+
+    cases = {
+        "company name": dict(text="Company42"),
+        "rare word": dict(text=vocab[3000]),
+        "mid-frequency word": dict(text=vocab[300]),
+        "two words": dict(text=f"{vocab[40]} {vocab[300]}"),
+        "phrase": dict(text=f'"{vocab[2]} {vocab[3]}"'),
+        "prefix": dict(text=vocab[500][:4] + "*"),
+        "frequent word": dict(text=vocab[5]),
+        "frequent word, one ticker": dict(text=vocab[5], ticker="SYN42.BO"),
+        "frequent word, one month": dict(text=vocab[5], date_from="2024-03-01", date_to="2024-03-31"),
+        "mid word, page 5": dict(text=vocab[300], page=5),
+    }
+    # matches: articles containing the query terms, before ticker/date filters
+    print(f"  {'query':<28} {'matches':>9} {'med ms':>8} {'p95 ms':>8}")
+    for name, kwargs in cases.items():
+        matches = conn.execute("SELECT COUNT(*) FROM news_fts WHERE news_fts MATCH ?",
+                               (build_match_query(kwargs["text"]),)).fetchone()[0]
+        median, p95 = timings(lambda: search_news(conn, **kwargs), repeat)
+        print(f"  {name:<28} {matches:>9,} {median:8.2f} {p95:8.2f}")
+
+    # A term that is not in the archive: LIKE has to read every row before it
+    # knows the page is empty, where the index answers from one lookup
+    term = "qqqqzz"
+    like = ("SELECT id, headline FROM news WHERE headline LIKE ? OR summary LIKE ? "
+            "ORDER BY published_at DESC LIMIT 20")
+    median, p95 = timings(lambda: search_news(conn, term), repeat)
+    print(f"  {'absent word':<28} {0:>9,} {median:8.2f} {p95:8.2f}")
+    median, p95 = timings(lambda: conn.execute(like, (f"%{term}%", f"%{term}%")).fetchall(), 3)
+    print(f"  {'absent word, LIKE scan':<28} {0:>9,} {median:8.2f} {p95:8.2f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--articles", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=30, help="Runs per query.")
+    args = parser.parse_args()
+    run(args.articles, args.repeat)
@@ -0,0 +1,132 @@
+"""
+Compares DB size and range-query latency of the daily_prices layouts on a
+synthetic universe (default 500 stocks x 10 years):
+
+  rowid          the original table: surrogate id, UNIQUE(stock_id, date) and
+                 the duplicate idx_daily_prices_stock_date index
+  clustered      WITHOUT ROWID, PRIMARY KEY (stock_id, date), ISO text dates
+  clustered_int  as clustered, but dates stored as integer day numbers
+
+    python -m bench.bench_price_layout --stocks 500 --years 10
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from migrate_daily_prices import CLUSTERED_DDL
+
+LAYOUTS = {
+    "rowid": """
+        CREATE TABLE daily_prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stock_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            open REAL, close REAL, high REAL, low REAL, volume INTEGER,
+            UNIQUE(stock_id, date)
+        );
+        CREATE INDEX idx_daily_prices_stock_date ON daily_prices(stock_id, date);
+    """,
+    # Same definition migrate_daily_prices creates, under its final name
+    "clustered": CLUSTERED_DDL.replace("daily_prices_clustered", "daily_prices"),
+    "clustered_int": """
+        CREATE TABLE daily_prices (
+            stock_id INTEGER NOT NULL,
+            date INTEGER NOT NULL,
+            open REAL, close REAL, high REAL, low REAL, volume INTEGER,
+            PRIMARY KEY (stock_id, date)
+        ) WITHOUT ROWID;
+    """,
+}
+
+
+def synthetic_rows(n_stocks: int, years: int, seed: int = 7):
+    """Yields (stock_id, day_number, open, close, high, low, volume) random-walk bars."""
+    rng = np.random.default_rng(seed)
+    end = np.datetime64("2026-10-16")
+    days = np.arange(end - np.timedelta64(365 * years, "D"), end + np.timedelta64(1, "D"))
+    days = days[np.is_busday(days)]
+    day_numbers = days.astype(np.int64)
+    for stock_id in range(1, n_stocks + 1):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(days))))
+        open_ = close * (1 + rng.normal(0, 0.005, len(days)))
+        high = np.maximum(open_, close) * 1.01
+        low = np.minimum(open_, close) * 0.99
+        volume = rng.integers(10_000, 5_000_000, len(days))
+        yield stock_id, day_numbers, open_, close, high, low, volume
+
+
+def build(path: str, layout: str, n_stocks: int, years: int) -> float:
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE stocks (id INTEGER PRIMARY KEY)")
+    conn.executescript(LAYOUTS[layout])
+    start = time.perf_counter()
+    for stock_id, day_numbers, open_, close, high, low, volume in synthetic_rows(n_stocks, years):
+        if layout == "clustered_int":
+            dates = day_numbers.tolist()
+        else:
+            dates = np.datetime_as_string(day_numbers.astype("datetime64[D]"), unit="D").tolist()
+        conn.executemany(
+            "INSERT INTO daily_prices (stock_id, date, open, close, high, low, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip([stock_id] * len(dates), dates, open_.tolist(), close.tolist(), high.tolist(), low.tolist(),
+                volume.tolist())
+        )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return time.perf_counter() - start
+
+
+RANGE_SQL = ("SELECT date, open, close, high, low, volume FROM daily_prices "
+             "WHERE stock_id = ? AND date >= ? ORDER BY date")
+# Same range without materializing Python rows, to isolate storage cost
+AGGREGATE_SQL = "SELECT COUNT(*), SUM(close) FROM daily_prices WHERE stock_id = ? AND date >= ?"
+
+
+def query_latency(path: str, layout: str, n_stocks: int, queries: int, days: int, sql: str = RANGE_SQL):
+    """Median/p95 latency (ms) of per-stock range queries starting `days` before the last bar."""
+    conn = sqlite3.connect(path)
+    rng = random.Random(11)
+    end = np.datetime64("2026-10-16")
+    start_day = end - np.timedelta64(days, "D")
+    bound = int(start_day.astype(np.int64)) if layout == "clustered_int" else str(start_day)
+    timings = []
+    for _ in range(queries):
+        stock_id = rng.randint(1, n_stocks)
+        start = time.perf_counter()
+        conn.execute(sql, (stock_id, bound)).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def run(n_stocks: int, years: int, queries: int):
+    workdir = tempfile.mkdtemp(prefix="bench_layout_")
+    print(f"{n_stocks} stocks x {years} years, {queries} queries per range")
+    print(f"  {'layout':<14} {'build s':>8} {'size MB':>8} {'1y med/p95 ms':>16} {'full med/p95 ms':>18}"
+          f" {'full agg med/p95 ms':>20}")
+    for layout in LAYOUTS:
+        path = os.path.join(workdir, f"{layout}.db")
+        build_time = build(path, layout, n_stocks, years)
+        size = os.path.getsize(path) / 1e6
+        one_year = query_latency(path, layout, n_stocks, queries, 365)
+        full = query_latency(path, layout, n_stocks, queries, 365 * years + 1)
+        agg = query_latency(path, layout, n_stocks, queries, 365 * years + 1, AGGREGATE_SQL)
+        print(f"  {layout:<14} {build_time:8.2f} {size:8.1f} "
+              f"{one_year[0]:8.3f}/{one_year[1]:<7.3f} {full[0]:9.3f}/{full[1]:<8.3f} "
+              f"{agg[0]:10.3f}/{agg[1]:<9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark daily_prices storage layouts.")
+    parser.add_argument("--stocks", type=int, default=500)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run(args.stocks, args.years, args.queries)
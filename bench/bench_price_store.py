@@ -0,0 +1,102 @@
+"""
+Cold-load time and memory of the whole universe's OHLCV as (date x stock)
+matrices: pd.read_sql_query over daily_prices plus a pivot, against the
+memory-mapped price store. Every measurement runs in a fresh process (the
+OS page cache stays warm), reads every field once and also one ticker's
+last year. Mapped pages count as resident but are file-backed and shared
+between processes. Linux only (RSS from /proc/self/status).
+
+    python -m bench.bench_price_store --stocks 500 --years 10
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from bench.bench_indicators import build
+from price_store import PRICE_STORE_FIELDS, PriceStore, rebuild_price_store
+
+TICKER = "SYN7.BO"
+
+
+def _peak_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _resident_kb() -> int:
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+
+
+def load_sqlite(db_path: str, store_path: str):
+    import pandas as pd
+
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query(f"""
+        SELECT s.ticker, d.date, {', '.join('d.' + f for f in PRICE_STORE_FIELDS)}
+        FROM daily_prices d JOIN stocks s ON s.id = d.stock_id
+    """, conn)
+    wide = df.pivot(index='date', columns='ticker', values=list(PRICE_STORE_FIELDS))
+    matrices = {field: wide[field].to_numpy() for field in PRICE_STORE_FIELDS}
+    since = str(np.datetime64(wide.index[-1]) - np.timedelta64(365, 'D'))
+    one = pd.read_sql_query("""
+        SELECT d.date, d.close FROM daily_prices d JOIN stocks s ON s.id = d.stock_id
+        WHERE s.ticker = ? AND d.date >= ?
+    """, conn, params=(TICKER, since))
+    conn.close()
+    return matrices, one['close'].to_numpy()
+
+
+def load_store(db_path: str, store_path: str):
+    store = PriceStore.open(store_path)
+    matrices = store.view()
+    since = str(store.dates[-1] - np.timedelta64(365, 'D'))
+    one = store.view(TICKER, start=since, fields=('close',))
+    return matrices, one['close']
+
+
+def _measure(method, db_path, store_path):
+    peak, resident = _peak_kb(), _resident_kb()
+    start = time.perf_counter()
+    matrices, one = method(db_path, store_path)
+    # Read every field once so the mapped pages count as resident
+    result = [float(np.nanmean(matrices[field])) for field in PRICE_STORE_FIELDS] + [float(np.mean(one))]
+    seconds = time.perf_counter() - start
+    return seconds, (_peak_kb() - peak) / 1024, (_resident_kb() - resident) / 1024, result
+
+
+def run(n_stocks: int, years: int):
+    directory = tempfile.mkdtemp(prefix="bench_price_store_")
+    db_path = os.path.join(directory, "bench.db")
+    store_path = os.path.join(directory, "price_store")
+    conn = build(db_path, n_stocks, years)
+    n_rows = conn.execute("SELECT COUNT(*) FROM daily_prices").fetchone()[0]
+    start = time.perf_counter()
+    rebuild_price_store(conn, store_path)
+    conn.close()
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(store_path) for f in files)
+    print(f"{n_stocks} stocks, {n_rows:,} daily bars; store built in {time.perf_counter() - start:.2f} s "
+          f"({size / 2**20:.0f} MB on disk)")
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for label, method in (("read_sql_query + pivot", load_sqlite), ("memory-mapped store", load_store)):
+        with context.Pool(1) as pool:
+            seconds, peak_mb, resident_mb, results[label] = pool.apply(_measure, (method, db_path, store_path))
+        print(f"  {label:<24} {seconds:8.3f} s   peak RSS +{peak_mb:7.1f} MB   "
+              f"resident after +{resident_mb:7.1f} MB")
+    values = list(results.values())
+    print(f"  results agree: {np.allclose(values[0], values[1])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=500)
+    parser.add_argument("--years", type=int, default=10)
+    args = parser.parse_args()
+    run(args.stocks, args.years)
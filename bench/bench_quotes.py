@@ -0,0 +1,166 @@
+"""
+Fan-out of intraday quote deltas to many concurrent subscribers.
+
+Each round polls FakeQuoteProvider for a universe of tickers, and every
+subscriber (one thread each, like one streaming request each) follows a few
+random tickers. Reports the poller's publish cost per round and the delay
+from the start of a poll until each subscriber holds its deltas. With
+--http, subscribers are real Server-Sent Events clients of
+/api/quotes/stream on a threaded local server.
+
+    python -m bench.bench_quotes --subscribers 100 500 1000
+    python -m bench.bench_quotes --http --subscribers 200
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from quotes import FakeQuoteProvider, QuoteCache, QuoteHub, QuotePoller
+from price_fetcher import TokenBucket
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float('nan')
+
+
+def _subscriptions(n_subscribers: int, universe: list, per_subscriber: int, seed: int = 1) -> list:
+    rng = np.random.default_rng(seed)
+    return [[universe[i] for i in rng.choice(len(universe), per_subscriber, replace=False)]
+            for _ in range(n_subscribers)]
+
+
+def run_hub(n_subscribers: int, universe: list, per_subscriber: int, rounds: int, move_share: float) -> dict:
+    hub = QuoteHub()
+    poller = QuotePoller(QuoteCache(), hub, FakeQuoteProvider(move_share=move_share), batch_size=len(universe),
+                         limiter=TokenBucket(1e6, 1e6), watchlist=universe)
+    round_started = [0.0]
+    delays, lock, stop = [], threading.Lock(), threading.Event()
+
+    def consume(subscription):
+        while not stop.is_set():
+            if subscription.get(0.2):
+                delay = time.perf_counter() - round_started[0]
+                with lock:
+                    delays.append(delay)
+
+    subscriptions = [hub.subscribe(tickers) for tickers in _subscriptions(n_subscribers, universe, per_subscriber)]
+    threads = [threading.Thread(target=consume, args=(s,), daemon=True) for s in subscriptions]
+    for thread in threads:
+        thread.start()
+    poller.poll_once()  # first quotes for every ticker
+    time.sleep(0.5)
+    delays.clear()
+
+    poll_times, deltas = [], 0
+    for _ in range(rounds):
+        round_started[0] = time.perf_counter()
+        deltas += poller.poll_once()
+        poll_times.append(time.perf_counter() - round_started[0])
+        time.sleep(0.25)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {"poll": poll_times, "delays": delays, "deltas": deltas}
+
+
+def run_http(n_subscribers: int, universe: list, per_subscriber: int, rounds: int, move_share: float) -> dict:
+    import logging
+    from werkzeug.serving import make_server
+    import app as app_module
+    import db_utils
+
+    # Streams only accept known stocks; no prices are needed
+    db_utils.DB_NAME = os.path.join(tempfile.mkdtemp(prefix="bench_quotes_"), "stocks.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        db_utils.init_db()
+    db_utils.sync_stocks({ticker: (ticker, None) for ticker in universe})
+    app_module.app.config['QUOTE_POLLING'] = False
+    app_module.app.config['QUOTE_PROVIDER'] = 'fake'
+    poller = app_module.get_quote_poller()
+    poller.provider = FakeQuoteProvider(move_share=move_share)
+    poller.limiter = TokenBucket(1e6, 1e6)
+    poller.batch_size = len(universe)
+    poller.reference_loader = None
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    round_started = [0.0]
+    delays, lock, stop = [], threading.Lock(), threading.Event()
+    connected = threading.Semaphore(0)
+
+    def client(tickers):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("GET", f"/api/quotes/stream?tickers={','.join(tickers)}")
+        response = conn.getresponse()
+        connected.release()
+        while not stop.is_set():
+            line = response.fp.readline()
+            if not line:
+                break
+            if line.startswith(b"event: quotes"):
+                delay = time.perf_counter() - round_started[0]
+                with lock:
+                    delays.append(delay)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(tickers,), daemon=True)
+               for tickers in _subscriptions(n_subscribers, universe, per_subscriber)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        connected.acquire()
+    poller.poll_once()
+    time.sleep(1.0)
+    delays.clear()
+
+    poll_times, deltas = [], 0
+    for _ in range(rounds):
+        round_started[0] = time.perf_counter()
+        deltas += poller.poll_once()
+        poll_times.append(time.perf_counter() - round_started[0])
+        time.sleep(0.5)
+    stop.set()
+    # Wake the clients so they disconnect, then the handlers so they notice and unsubscribe
+    latest = list(poller.cache.latest(universe).values())
+    poller.hub.publish(latest)
+    for thread in threads:
+        thread.join()
+    poller.hub.publish(latest)
+    time.sleep(0.5)
+    server.shutdown()
+    return {"poll": poll_times, "delays": delays, "deltas": deltas}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--tickers", type=int, default=500, help="Universe being polled.")
+    parser.add_argument("--per-subscriber", type=int, default=5, help="Tickers each subscriber follows.")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--move-share", type=float, default=0.3, help="Share of tickers that change per poll.")
+    parser.add_argument("--http", action="store_true", help="Subscribe through /api/quotes/stream over HTTP.")
+    args = parser.parse_args()
+
+    universe = [f"SYN{i}.BO" for i in range(args.tickers)]
+    run = run_http if args.http else run_hub
+    print(f"{args.tickers} tickers, {args.per_subscriber} per subscriber, {args.rounds} polls, "
+          f"{args.move_share:.0%} moving per poll ({'HTTP/SSE' if args.http else 'in-process'})")
+    for n in args.subscribers:
+        result = run(n, universe, args.per_subscriber, args.rounds, args.move_share)
+        delays = result["delays"]
+        print(f"  {n:>5} subscribers: poll+publish median {statistics.median(result['poll']) * 1000:7.2f} ms   "
+              f"delivery p50 {_percentile(delays, 50):7.2f} ms  p99 {_percentile(delays, 99):7.2f} ms  "
+              f"max {_percentile(delays, 100):7.2f} ms   ({len(delays):,} deliveries, "
+              f"{result['deltas']:,} deltas)")
@@ -0,0 +1,113 @@
+"""
+Compares the original iterrows-based save_daily_data with the vectorized
+upsert writer on synthetic 10-year frames.
+
+    python -m bench.bench_save_daily_data --stocks 50
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+import db_utils
+from price_fetcher import FakeProvider
+
+
+def legacy_save_daily_data(stock_id: int, df: pd.DataFrame):
+    """The pre-vectorization implementation, kept here as the reference point."""
+    conn = db_utils.get_connection()
+    cursor = conn.cursor()
+    data_to_insert = []
+    for date, row in df.iterrows():
+        date_str = date.strftime('%Y-%m-%d')
+        data_to_insert.append((
+            stock_id,
+            date_str,
+            row.get('Open'),
+            row.get('Close'),
+            row.get('High'),
+            row.get('Low'),
+            int(row.get('Volume', 0))
+        ))
+    cursor.executemany(
+        """
+        INSERT OR REPLACE INTO daily_prices (stock_id, date, open, close, high, low, volume)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        data_to_insert
+    )
+    conn.commit()
+    conn.close()
+
+
+def make_frames(n_stocks: int, period: str = "10y"):
+    provider = FakeProvider(end_date="2026-10-16")
+    dates = provider._dates(period, None, None)
+    return [(i + 1, provider.frame_for(f"SYN{i}.BO", dates)) for i in range(n_stocks)]
+
+
+def fresh_db(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.close()
+
+
+def run(n_stocks: int):
+    frames = make_frames(n_stocks)
+    n_rows = sum(len(df) for _, df in frames)
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench_save_"), "bench.db")
+    db_utils.DB_NAME = db_path
+
+    results = {}
+
+    fresh_db(db_path)
+    start = time.perf_counter()
+    for stock_id, df in frames:
+        legacy_save_daily_data(stock_id, df)
+    results["legacy iterrows, one txn per stock"] = time.perf_counter() - start
+
+    fresh_db(db_path)
+    start = time.perf_counter()
+    for stock_id, df in frames:
+        db_utils.save_daily_frames([(stock_id, df)])
+    results["vectorized, one txn per stock"] = time.perf_counter() - start
+
+    fresh_db(db_path)
+    start = time.perf_counter()
+    db_utils.save_daily_frames(frames)
+    results["vectorized, one txn for all"] = time.perf_counter() - start
+
+    # Nightly reload of data that is already stored: every row is a no-op upsert
+    start = time.perf_counter()
+    stats = db_utils.save_daily_frames(frames)
+    results["vectorized, reload unchanged rows"] = time.perf_counter() - start
+    assert stats["unchanged"] == n_rows, stats
+
+    # Row-building cost alone, without SQLite
+    start = time.perf_counter()
+    for stock_id, df in frames:
+        [(stock_id, d.strftime('%Y-%m-%d'), r.get('Open'), r.get('Close'), r.get('High'), r.get('Low'),
+          int(r.get('Volume', 0))) for d, r in df.iterrows()]
+    results["row building only: iterrows"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for stock_id, df in frames:
+        list(db_utils._price_rows(stock_id, df).itertuples(index=False, name=None))
+    results["row building only: vectorized"] = time.perf_counter() - start
+
+    print(f"{n_stocks} stocks, {n_rows:,} rows")
+    for name, elapsed in results.items():
+        print(f"  {name:<40} {elapsed:8.3f} s  {n_rows / elapsed:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=50, help="Number of synthetic stocks.")
+    args = parser.parse_args()
+    run(args.stocks)
@@ -0,0 +1,81 @@
+"""
+Latency of stock screens over a synthetic universe (default 2000 stocks x 2
+years): screener.screen over the in-memory latest_snapshot arrays against
+the same filter written as SQL over daily_prices and indicators (the latest
+bar per stock, 20-bar volume average and lookback returns computed per
+query). Also checks that both select the same stocks.
+
+    python -m bench.bench_screener --stocks 2000 --years 2
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench.bench_indicators import build
+from indicators import rebuild_indicators
+from screener import load_snapshot, rebuild_snapshot, screen
+
+SCREENS = [
+    ("close > sma_200 and volume > 2 * avg_volume_20",
+     "l.close > i.sma_200 AND l.volume > 2 * l.avg_volume_20"),
+    ("return_20d >= 5 and rsi_14 < 70",
+     "(l.close / l.close_20 - 1) * 100 >= 5 AND i.rsi_14 < 70"),
+]
+
+# The filter as a one-off query: latest bar, 20-bar average volume before it
+# and the close 20 bars earlier, for every stock, then the indicator join
+SQL_SCREEN = """
+    WITH ranked AS (
+        SELECT stock_id, date, close, volume,
+               ROW_NUMBER() OVER (PARTITION BY stock_id ORDER BY date DESC) AS n
+        FROM daily_prices
+    ), l AS (
+        SELECT stock_id,
+               MAX(CASE WHEN n = 1 THEN date END) AS date,
+               MAX(CASE WHEN n = 1 THEN close END) AS close,
+               MAX(CASE WHEN n = 1 THEN volume END) AS volume,
+               MAX(CASE WHEN n = 21 THEN close END) AS close_20,
+               AVG(CASE WHEN n BETWEEN 2 AND 21 THEN volume END) AS avg_volume_20
+        FROM ranked WHERE n <= 21 GROUP BY stock_id
+    )
+    SELECT s.ticker FROM l
+    JOIN indicators i ON i.stock_id = l.stock_id AND i.date = l.date
+    JOIN stocks s ON s.id = l.stock_id
+    WHERE {where}
+"""
+
+
+def timed(fn, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def run(n_stocks: int, years: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_screener_"), "bench.db")
+    conn = build(path, n_stocks, years)
+    rebuild_indicators(conn)
+    seconds, rows = timed(lambda: rebuild_snapshot(conn))
+    conn.commit()
+    print(f"{n_stocks} stocks; snapshot rebuilt in {seconds:.2f} s ({rows} rows)")
+
+    load_seconds, snapshot = timed(lambda: load_snapshot(conn))
+    print(f"  load_snapshot                    {load_seconds * 1000:8.2f} ms (once per data version)")
+    for text, where in SCREENS:
+        screen_seconds, result = timed(lambda: screen(snapshot, text, limit=10_000), repeat=20)
+        sql_seconds, rows = timed(lambda: conn.execute(SQL_SCREEN.format(where=where)).fetchall())
+        same = {item["ticker"] for item in result["results"]} == {row[0] for row in rows}
+        print(f"  {text}")
+        print(f"    screen {screen_seconds * 1000:8.2f} ms   SQL {sql_seconds * 1000:8.1f} ms   "
+              f"{sql_seconds / screen_seconds:7.0f}x   {result['count']} matches, same: {same}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=2)
+    args = parser.parse_args()
+    run(args.stocks, args.years)
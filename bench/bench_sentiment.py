@@ -0,0 +1,88 @@
+"""
+Sentiment scoring throughput in articles per second, per backend, inline and
+across a process pool, and through SentimentEngine with its content-hash cache.
+The corpus comes from FakeNewsProvider, so it contains syndicated duplicates
+the way real news does.
+
+    python -m bench.bench_sentiment --stocks 500 --processes 4
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import db_utils
+import sentiment
+from fetch_news import FakeNewsProvider, parse_news_item
+
+
+def corpus(n_stocks: int):
+    provider = FakeNewsProvider(items_per_stock=10)
+    texts = []
+    for i in range(n_stocks):
+        for item in provider.news(f"SYN{i}.BO"):
+            article = parse_news_item(item)
+            texts.append(f"{article['headline']} {article['summary']}")
+    return texts
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run(n_stocks: int, processes: int):
+    texts = corpus(n_stocks)
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench_sentiment_"), "bench.db")
+    db_utils.DB_NAME = db_path
+    conn = sqlite3.connect(db_path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+
+    results = {}
+    reference = None
+    for backend in sentiment.BACKENDS:
+        scorer = sentiment.get_scorer(backend)
+        elapsed, scores = timed(lambda: [scorer.score(text) for text in texts])
+        results[f"{backend}, inline, every article"] = elapsed
+        if reference is None:
+            reference = scores
+        else:
+            worst = max(abs(a - b) for a, b in zip(reference, scores))
+            print(f"{backend} vs {sentiment.DEFAULT_BACKEND}: max abs difference {worst:.4f}")
+
+    if processes > 1:
+        engine = sentiment.SentimentEngine(processes=processes, use_db_cache=False)
+        engine._score(texts[:sentiment.MIN_PARALLEL_BATCH])  # start the workers outside the timing
+        elapsed, _ = timed(lambda: engine._score(texts))
+        results[f"{sentiment.DEFAULT_BACKEND}, {processes} processes, every article"] = elapsed
+        engine.close()
+
+    for backend in sentiment.BACKENDS:
+        engine = sentiment.SentimentEngine(backend)
+        elapsed, _ = timed(lambda: engine.score_batch(texts))
+        results[f"{backend}, engine, cold cache"] = elapsed
+        engine.save(conn)
+        conn.commit()
+        unique = engine.stats["scored"]
+
+        # A later run in a new process: scores come from sentiment_cache
+        engine = sentiment.SentimentEngine(backend)
+        elapsed, _ = timed(lambda: engine.score_batch(texts))
+        results[f"{backend}, engine, warm DB cache"] = elapsed
+        assert engine.stats["scored"] == 0, engine.stats
+    conn.close()
+
+    print(f"{len(texts)} articles, {unique} distinct texts")
+    for name, elapsed in results.items():
+        print(f"  {name:<40} {elapsed:8.3f} s  {len(texts) / elapsed:12,.0f} articles/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=500, help="Stocks in the synthetic corpus (10 articles each).")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    run(args.stocks, args.processes)
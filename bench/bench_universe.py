@@ -0,0 +1,58 @@
+"""
+Loading the ~5k-entry BSE scrip code map (stk.json) into an empty stocks
+table and re-running it against the loaded table: the old per-row add_stock
+loop (one connection checkout and commit per stock, a second SELECT on
+conflict) against db_utils.sync_stocks (one read, an in-memory diff and one
+transaction).
+
+    python -m bench.bench_universe
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+import db_utils
+from populate_stocks import load_scrip_codes
+
+
+def fresh_db(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.close()
+
+
+def per_row(universe: dict) -> float:
+    start = time.perf_counter()
+    for ticker, (name, sector) in universe.items():
+        db_utils.add_stock(ticker, name, sector)
+    return time.perf_counter() - start
+
+
+def bulk(universe: dict) -> float:
+    start = time.perf_counter()
+    db_utils.sync_stocks(universe)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, help="Only the first N scrip codes.")
+    args = parser.parse_args()
+
+    universe = dict(list(load_scrip_codes().items())[:args.limit])
+    directory = tempfile.mkdtemp(prefix="bench_universe_")
+    print(f"{len(universe):,} stocks")
+    for label, fn in (("add_stock loop", per_row), ("sync_stocks", bulk)):
+        db_utils.DB_NAME = os.path.join(directory, f"{fn.__name__}.db")
+        fresh_db(db_utils.DB_NAME)
+        with contextlib.redirect_stdout(io.StringIO()):
+            empty = fn(universe)
+            loaded = fn(universe)
+        print(f"  {label:<16} empty table {empty:8.3f} s   loaded table {loaded:8.3f} s")
@@ -0,0 +1,230 @@
+"""
+Benchmark suite for the hot paths, on a synthetic database from
+bench.synthetic: save_daily_data, get_market_news,
+get_news_price_correlation, /api/data/<ticker> through Flask's test client
+and fetch_and_store_news against FakeNewsProvider.
+
+Writes a JSON report (per-case median / p95 / min over its runs). With
+--baseline, each median is compared with the baseline's; a case slower by
+more than --tolerance (and by more than MIN_DELTA_MS) is a regression and
+the run exits with status 1. Record a baseline on the same machine and
+scale with --write-baseline.
+
+    python -m bench.suite --report bench_report.json --write-baseline bench_baseline.json
+    python -m bench.suite --baseline bench_baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import db_utils
+import metrics
+from bench.synthetic import END_DATE, generate
+
+# Slowdowns smaller than this are noise, whatever the ratio
+MIN_DELTA_MS = 1.0
+
+
+def _timings(fn: Callable[[int], None], runs: int, setup: Optional[Callable[[], None]] = None) -> List[float]:
+    """Milliseconds of each call fn(i) for i in range(runs), with stdout silenced. `setup` runs untimed before each."""
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(runs):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn(i)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _summary(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 3),
+        "min_ms": round(ordered[0], 3),
+    }
+
+
+def bench_save_daily_data(conn: sqlite3.Connection, runs: int) -> List[float]:
+    """One stock's last year re-saved with revised closes: the upsert's update path."""
+    tickers = conn.execute("SELECT id FROM stocks ORDER BY id LIMIT ?", (runs,)).fetchall()
+    frames = []
+    for (stock_id,) in tickers:
+        rows = conn.execute("""
+            SELECT date, open, high, low, close, volume FROM daily_prices
+            WHERE stock_id = ? AND date > date(?, '-1 year') ORDER BY date
+        """, (stock_id, END_DATE)).fetchall()
+        df = pd.DataFrame(rows, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
+        df.index = pd.to_datetime(df.pop('Date'))
+        df['Close'] *= 1.001
+        frames.append((stock_id, df))
+    return _timings(lambda i: db_utils.save_daily_data(*frames[i % len(frames)]), runs)
+
+
+def bench_market_news(conn: sqlite3.Connection, runs: int) -> List[float]:
+    """The market feed's first page followed by the next two pages through cursors."""
+    def feed(_):
+        page = db_utils.get_market_news(limit=15)
+        for _ in range(2):
+            page = db_utils.get_market_news(limit=15, cursor=page[-1]["cursor"])
+    return _timings(feed, runs)
+
+
+def bench_news_price_correlation(conn: sqlite3.Connection, runs: int) -> List[float]:
+    """Stored impact lookups for a spread of stocks."""
+    ids = [row[0] for row in conn.execute("SELECT id FROM stocks ORDER BY id")]
+    return _timings(lambda i: db_utils.get_news_price_correlation(ids[(i * 37) % len(ids)]), runs)
+
+
+def bench_api_data(conn: sqlite3.Connection, runs: int) -> List[float]:
+    """GET /api/data/<ticker> for a ticker's full history (uncached endpoint)."""
+    import app
+
+    client = app.app.test_client()
+    tickers = [row[0] for row in conn.execute("SELECT ticker FROM stocks ORDER BY id")]
+
+    def get(i):
+        response = client.get(f"/api/data/{tickers[(i * 13) % len(tickers)]}")
+        assert response.status_code == 200, response.status_code
+    return _timings(get, runs)
+
+
+def bench_fetch_and_store_news(conn: sqlite3.Connection, runs: int) -> List[float]:
+    """
+    A news run over the first 100 stocks with FakeNewsProvider (no latency or
+    rate limit, lexicon sentiment). The database is restored before every run,
+    so each one inserts the same new articles.
+    """
+    import fetch_news
+
+    pristine = sqlite3.connect(":memory:")
+    conn.backup(pristine)
+
+    def restore():
+        pristine.backup(conn)
+
+    def fetch(i):
+        provider = fetch_news.FakeNewsProvider(items_per_stock=10, end_date=END_DATE + "T09:00:00")
+        fetch_news.fetch_and_store_news(limit=100, provider=provider, backend="lexicon", rate=1e6)
+    try:
+        return _timings(fetch, runs, setup=restore)
+    finally:
+        pristine.close()
+
+
+# name -> (function, runs)
+CASES: Dict[str, tuple] = {
+    "save_daily_data": (bench_save_daily_data, 20),
+    "get_market_news": (bench_market_news, 50),
+    "get_news_price_correlation": (bench_news_price_correlation, 100),
+    "api_data": (bench_api_data, 30),
+    "fetch_and_store_news": (bench_fetch_and_store_news, 3),
+}
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[dict]:
+    """One row per case in both reports: medians, ratio and whether it regressed."""
+    rows = []
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        regressed = ratio > 1 + tolerance and result["median_ms"] - base["median_ms"] > MIN_DELTA_MS
+        rows.append({"case": name, "baseline_ms": base["median_ms"], "median_ms": result["median_ms"],
+                     "ratio": round(ratio, 3), "regressed": regressed})
+    return rows
+
+
+def run(scale: dict, cases: List[str]) -> dict:
+    results = {}
+    previous_db, previous_metrics = db_utils.DB_NAME, metrics.METRICS_DIR
+    # The synthetic DB and the metrics textfiles the cases write only live for this run
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as directory:
+        path = os.path.join(directory, "bench.db")
+        start = time.perf_counter()
+        counts = generate(path, scale["stocks"], scale["years"], scale["news"], scale["seed"])
+        print(f"Synthetic DB: " + ", ".join(f"{n:,} {t}" for t, n in counts.items())
+              + f" ({time.perf_counter() - start:.1f} s)")
+        db_utils.DB_NAME = path
+        metrics.METRICS_DIR = os.path.join(directory, "metrics")
+
+        conn = sqlite3.connect(path)
+        try:
+            for name in cases:
+                fn, runs = CASES[name]
+                results[name] = _summary(fn(conn, runs))
+                r = results[name]
+                print(f"  {name:<28} median {r['median_ms']:9.2f} ms   p95 {r['p95_ms']:9.2f} ms   "
+                      f"min {r['min_ms']:9.2f} ms   ({r['runs']} runs)")
+        finally:
+            conn.close()
+            for readonly in (True, False):
+                db_utils.get_pool(readonly).close()
+            db_utils.DB_NAME = previous_db
+            metrics.METRICS_DIR = previous_metrics
+    return {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "sqlite": sqlite3.sqlite_version, "numpy": np.__version__, "cpus": os.cpu_count()},
+        "scale": scale,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=500, help="Stocks from stk.json (at most ~5k).")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--news", type=int, default=20, help="Articles per stock.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="Run only these cases.")
+    parser.add_argument("--report", default="bench_report.json", help="Where to write the JSON report.")
+    parser.add_argument("--baseline", help="Report to compare against; regressions exit with status 1.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown of a median (0.25 = 25%%).")
+    parser.add_argument("--write-baseline", help="Also save this run's report as a baseline here.")
+    args = parser.parse_args()
+
+    scale = {"stocks": args.stocks, "years": args.years, "news": args.news, "seed": args.seed}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["scale"] != scale:
+            parser.error(f"baseline was recorded at scale {baseline['scale']}, not {scale}")
+
+    report = run(scale, args.case or list(CASES))
+    regressions = []
+    if baseline is not None:
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance,
+                                "cases": compare(report, baseline, args.tolerance)}
+        print(f"Against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for row in report["comparison"]["cases"]:
+            flag = "REGRESSION" if row["regressed"] else "ok"
+            print(f"  {row['case']:<28} {row['baseline_ms']:9.2f} -> {row['median_ms']:9.2f} ms   "
+                  f"x{row['ratio']:.2f}   {flag}")
+        regressions = [row["case"] for row in report["comparison"]["cases"] if row["regressed"]]
+
+    for target in filter(None, (args.report, args.write_baseline)):
+        with open(target, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
+    if regressions:
+        print(f"Regressed: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,137 @@
+"""
+Deterministic synthetic market database for the benchmark suite.
+
+Stocks come from stk.json's BSE scrip codes (ticker "<code>.BO"), prices
+are geometric random walks over business days, and news is a mix of
+company stories and wire stories linked to several stocks. The same seed
+and scale always produce the same database.
+
+    python -m bench.synthetic /tmp/synthetic.db --stocks 500 --years 2 --news 20
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from news_impact import refresh_news_impact
+
+END_DATE = "2026-10-16"
+SECTORS = ("Financial Services", "Information Technology", "Healthcare", "Capital Goods", "Chemicals",
+           "Automobile and Auto Components", "Fast Moving Consumer Goods", "Metals & Mining", "Power",
+           "Oil Gas & Consumable Fuels", "Construction", "Textiles")
+# Share of articles that are wire stories, each linked to 2-5 stocks
+WIRE_SHARE = 0.2
+# Days back that articles are spread over
+NEWS_DAYS = 365
+
+
+def scrip_codes(path: str = "stk.json") -> list:
+    """(code, name) pairs from stk.json, ordered by scrip code."""
+    with open(path) as f:
+        return sorted(json.load(f).items())
+
+
+def _stocks(conn: sqlite3.Connection, rng: np.random.Generator, n_stocks: int) -> int:
+    codes = scrip_codes()[:n_stocks]
+    sectors = rng.integers(0, len(SECTORS), len(codes))
+    conn.executemany(
+        "INSERT INTO stocks (id, ticker, name, sector) VALUES (?, ?, ?, ?)",
+        [(i + 1, f"{code}.BO", name, SECTORS[s]) for i, ((code, name), s) in enumerate(zip(codes, sectors.tolist()))]
+    )
+    return len(codes)
+
+
+def _prices(conn: sqlite3.Connection, rng: np.random.Generator, n_stocks: int, years: int):
+    end = np.datetime64(END_DATE)
+    days = np.arange(end - np.timedelta64(365 * years, 'D'), end + np.timedelta64(1, 'D'))
+    days = days[np.is_busday(days)]
+    dates = np.datetime_as_string(days, unit='D').tolist()
+    shape = (len(days), n_stocks)
+
+    # (day x stock) random walks, one column per stock
+    log_returns = rng.normal(0.0003, 0.018, shape)
+    close = rng.uniform(20, 3000, n_stocks) * np.exp(np.cumsum(log_returns, axis=0))
+    open_ = close * np.exp(-log_returns * rng.uniform(0.2, 0.8, shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.006, shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.006, shape)))
+    volume = rng.lognormal(11, 1.0, shape).astype(np.int64)
+    columns = [np.round(a, 2) for a in (open_, close, high, low)]
+
+    for stock in range(n_stocks):
+        conn.executemany(
+            "INSERT INTO daily_prices (stock_id, date, open, close, high, low, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip([stock + 1] * len(dates), dates, *(c[:, stock].tolist() for c in columns), volume[:, stock].tolist())
+        )
+
+
+def _news(conn: sqlite3.Connection, rng: np.random.Generator, n_stocks: int, per_stock: int):
+    n_articles = n_stocks * per_stock
+    end = np.datetime64(END_DATE + "T15:30:00")
+    minutes = rng.integers(0, NEWS_DAYS * 24 * 60, n_articles)
+    published = np.datetime_as_string(end - minutes.astype('timedelta64[m]'), unit='s').tolist()
+    sentiment = np.round(rng.uniform(-1, 1, n_articles), 4).tolist()
+    wire = rng.random(n_articles) < WIRE_SHARE
+    owner = np.repeat(np.arange(1, n_stocks + 1), per_stock)
+    tickers = dict(conn.execute("SELECT id, ticker FROM stocks").fetchall())
+
+    articles, links = [], []
+    for i in range(n_articles):
+        news_id = i + 1
+        stock_id = int(owner[i])
+        if wire[i]:
+            headline = f"Sensex moves as markets react to wire story {news_id}"
+            linked = {stock_id, *rng.integers(1, n_stocks + 1, rng.integers(1, 5)).tolist()}
+        else:
+            headline = f"{tickers[stock_id]} update {news_id}: quarterly results and outlook"
+            linked = {stock_id}
+        articles.append((news_id, headline, f"{headline}. Analysts review the numbers.",
+                         f"https://news.example.com/{news_id}", f"Wire {news_id % 7}",
+                         published[i].replace('T', ' '), sentiment[i]))
+        links.extend((linked_id, news_id) for linked_id in sorted(linked))
+    conn.executemany("""
+        INSERT INTO news (id, headline, summary, url, publisher, published_at, sentiment_score)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, articles)
+    conn.executemany("INSERT INTO stock_news (stock_id, news_id) VALUES (?, ?)", links)
+
+
+def generate(path: str, n_stocks: int = 500, years: int = 2, news_per_stock: int = 20, seed: int = 7) -> dict:
+    """
+    Writes a fresh database at `path` (replacing any file there) with
+    schema.sql, stocks, prices, news and the derived news_impact table.
+    Returns row counts.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    try:
+        with open("schema.sql") as f:
+            conn.executescript(f.read())
+        n_stocks = _stocks(conn, rng, n_stocks)
+        _prices(conn, rng, n_stocks, years)
+        _news(conn, rng, n_stocks, news_per_stock)
+        refresh_news_impact(conn, as_of=END_DATE)
+        conn.commit()
+        conn.execute("ANALYZE")
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("stocks", "daily_prices", "news", "stock_news")}
+    finally:
+        conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic market database.")
+    parser.add_argument("path")
+    parser.add_argument("--stocks", type=int, default=500, help="Stocks from stk.json (at most ~5k).")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--news", type=int, default=20, help="Articles per stock.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    start = time.time()
+    counts = generate(args.path, args.stocks, args.years, args.news, args.seed)
+    print(", ".join(f"{n:,} {table}" for table, n in counts.items()) + f" in {time.time() - start:.1f} s")
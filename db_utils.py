@@ -1,12 +1,253 @@
+import base64
+import json
+import os
 import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional
+from metrics import record_query
+from news_impact import compute_impact, load_impact
+from indicators import update_indicators
+from rollups import refresh_rollups
+from screener import refresh_snapshot
+from price_store import PRICE_STORE_FIELDS, open_price_store, sync_price_store
 
 DB_NAME = "stocks.db"
+# Memory-mapped columnar copy of daily_prices (see price_store.py)
+PRICE_STORE_DIR = "price_store"
+
+# Connections kept per pool. Size it to the number of request threads per worker.
+POOL_SIZE = 8
+# Seconds a caller waits for a free pooled connection before giving up.
+POOL_TIMEOUT = 10.0
+# Applied once when a pooled connection is opened.
+POOL_PRAGMAS = {
+    "busy_timeout": 5000,
+    "cache_size": -16384,
+    "temp_store": "MEMORY",
+}
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor whose execute/executemany calls are recorded by metrics.record_query (time up to the first row)."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, seq_of_parameters, time.perf_counter() - start, many=True)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection that hands out TimedCursors, including for the execute shortcuts."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
 
 def get_connection():
     """Establishes a connection to the SQLite database."""
-    return sqlite3.connect(DB_NAME)
+    return sqlite3.connect(DB_NAME, factory=TimedConnection)
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: dict):
+    """Applies {name: value} PRAGMAs to a connection."""
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to one database file.
+    Read-only pools open the file with mode=ro, so GET handlers cannot write.
+    Counters: `hits` (idle connection reused), `misses` (new connection opened),
+    `waits` / `wait_time` (callers that blocked because the pool was exhausted).
+    """
+
+    def __init__(self, db_name: str, readonly: bool = False, max_size: int = POOL_SIZE,
+                 timeout: float = POOL_TIMEOUT, pragmas: Optional[dict] = None):
+        self.db_name = db_name
+        self.readonly = readonly
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = POOL_PRAGMAS if pragmas is None else pragmas
+        self._idle = deque()
+        self._created = 0
+        self._cond = threading.Condition()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def _open(self) -> sqlite3.Connection:
+        if self.readonly:
+            uri = f"file:{os.path.abspath(self.db_name)}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=TimedConnection)
+        else:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False, factory=TimedConnection)
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrows a connection, opening one if the pool is below max_size."""
+        conn = None
+        waited_since = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    self.hits += 1
+                    break
+                if self._created < self.max_size:
+                    self._created += 1
+                    self.misses += 1
+                    break
+                if waited_since is None:
+                    waited_since = time.perf_counter()
+                    self.waits += 1
+                remaining = waited_since + self.timeout - time.perf_counter()
+                if remaining <= 0:
+                    self.wait_time += time.perf_counter() - waited_since
+                    self.timeouts += 1
+                    raise TimeoutError(f"No free database connection after {self.timeout}s")
+                self._cond.wait(remaining)
+            if waited_since is not None:
+                self.wait_time += time.perf_counter() - waited_since
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Returns a borrowed connection, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped rather than handed out again
+            conn.close()
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Closes idle connections. Borrowed ones are closed when released to a new pool."""
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            lookups = self.hits + self.misses
+            return {
+                "readonly": self.readonly,
+                "size": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "waits": self.waits,
+                "wait_time": round(self.wait_time, 6),
+                "timeouts": self.timeouts,
+            }
+
+_pools: Dict[Tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(readonly: bool = True) -> ConnectionPool:
+    """Returns the shared pool for the current DB_NAME, creating it on first use."""
+    key = (DB_NAME, readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(DB_NAME, readonly=readonly)
+    return pool
+
+def pool_stats() -> dict:
+    """Counters for every pool, keyed "read" / "write" (prefixed by DB file if several are open)."""
+    result = {}
+    for (db_name, readonly), pool in list(_pools.items()):
+        name = "read" if readonly else "write"
+        if db_name != DB_NAME:
+            name = f"{db_name}:{name}"
+        result[name] = pool.stats()
+    return result
+
+@contextmanager
+def pooled_connection(readonly: bool = True, conn: Optional[sqlite3.Connection] = None):
+    """
+    Yields `conn` if the caller already holds one (e.g. the Flask request
+    connection); otherwise borrows one from the shared pool for the block.
+    """
+    if conn is not None:
+        yield conn
+        return
+    with get_pool(readonly).connection() as pooled:
+        yield pooled
+
+# Columns added to tables after their first release: (table, column, declaration).
+# CREATE TABLE IF NOT EXISTS leaves existing tables alone, so init_db adds these first.
+ADDED_COLUMNS = (
+    ("news", "content_hash", "TEXT"),
+    ("news", "tickers", "TEXT"),
+    ("stock_news", "published_at", "TEXT"),
+)
+# Statements that fill an added column for the rows already stored.
+COLUMN_BACKFILLS = {
+    "stock_news.published_at": """
+        UPDATE stock_news
+        SET published_at = coalesce((SELECT published_at FROM news WHERE id = stock_news.news_id), '')
+    """,
+}
+
+def upgrade_schema(conn: sqlite3.Connection) -> List[str]:
+    """Adds ADDED_COLUMNS missing from existing tables. Returns the columns added."""
+    added = []
+    for table, column, declaration in ADDED_COLUMNS:
+        existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if existing and column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+            name = f"{table}.{column}"
+            if name in COLUMN_BACKFILLS:
+                conn.execute(COLUMN_BACKFILLS[name])
+            added.append(name)
+    return added
 
 def init_db(schema_file: str = "schema.sql"):
     """Initializes the database using the provided schema file."""
@@ -14,6 +255,9 @@ def init_db(schema_file: str = "schema.sql"):
     try:
         with open(schema_file, 'r') as f:
             schema = f.read()
+        # Before the script, whose indexes may refer to the new columns
+        for column in upgrade_schema(conn):
+            print(f"Added column {column}")
         conn.executescript(schema)
         conn.commit()
         print("Database initialized successfully.")
@@ -22,167 +266,531 @@ def init_db(schema_file: str = "schema.sql"):
     finally:
         conn.close()
 
-def add_stock(ticker: str, name: str, sector: str = None) -> int:
-    """Adds a new stock to the stocks table. Returns the stock ID."""
-    conn = get_connection()
-    cursor = conn.cursor()
+# Data version counters, bumped by every writer in the same transaction as its
+# changes. Cached API responses are keyed on them (see app.py).
+DATA_VERSION_PRICES = "prices"
+DATA_VERSION_NEWS = "news"
+DATA_VERSION_STOCKS = "stocks"
+
+def bump_data_version(conn: sqlite3.Connection, *names: str):
+    """Increments the named data versions inside the caller's transaction; the caller commits."""
     try:
-        cursor.execute(
-            "INSERT INTO stocks (ticker, name, sector) VALUES (?, ?, ?)",
-            (ticker, name, sector)
+        conn.executemany(
+            """
+            INSERT INTO data_version (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+            """,
+            [(name,) for name in names]
         )
-        conn.commit()
-        return cursor.lastrowid
-    except sqlite3.IntegrityError:
-        # Stock already exists, fetch its ID
-        cursor.execute("SELECT id FROM stocks WHERE ticker = ?", (ticker,))
-        result = cursor.fetchone()
-        return result[0] if result else None
-    finally:
-        conn.close()
+    except sqlite3.OperationalError:
+        # Databases created before data_version existed: caches fall back to their TTLs
+        pass
+
+def get_data_versions(conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+    """Returns {name: version} for every data version counter."""
+    with pooled_connection(conn=conn) as conn:
+        try:
+            return dict(conn.execute("SELECT name, version FROM data_version").fetchall())
+        except sqlite3.OperationalError:
+            return {}
+
+def add_stock(ticker: str, name: str, sector: str = None, conn: Optional[sqlite3.Connection] = None) -> int:
+    """Adds a new stock to the stocks table. Returns the stock ID."""
+    with pooled_connection(readonly=False, conn=conn) as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO stocks (ticker, name, sector) VALUES (?, ?, ?)",
+                (ticker, name, sector)
+            )
+            stock_id = cursor.lastrowid
+            bump_data_version(conn, DATA_VERSION_STOCKS)
+            conn.commit()
+            return stock_id
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            # Stock already exists, fetch its ID
+            cursor.execute("SELECT id FROM stocks WHERE ticker = ?", (ticker,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+# Rows per multi-row INSERT ... RETURNING into stocks (3 parameters each)
+STOCK_INSERT_ROWS = 300
+
+def sync_stocks(universe: Dict[str, Tuple[str, Optional[str]]], deactivate_missing: bool = True,
+                conn: Optional[sqlite3.Connection] = None) -> Tuple[Dict[str, int], dict]:
+    """
+    Makes the stocks table match `universe` ({ticker: (name, sector)}) in one
+    transaction. The table is read once and diffed in memory; new tickers are
+    inserted with multi-row INSERT ... RETURNING, and renames, sector changes,
+    reactivations and (unless deactivate_missing is False) deactivations of
+    tickers missing from the universe are applied with executemany. A None
+    sector never overwrites a stored one. Returns the {ticker: id} map of
+    every stock in the table and the counts of each kind of change.
+    """
+    with pooled_connection(readonly=False, conn=conn) as conn:
+        stored = {ticker: (stock_id, name, sector, bool(active)) for stock_id, ticker, name, sector, active
+                  in conn.execute("SELECT id, ticker, name, sector, is_active FROM stocks")}
+
+        new, renamed, resectored, reactivated = [], [], [], []
+        for ticker, (name, sector) in universe.items():
+            row = stored.get(ticker)
+            if row is None:
+                new.append((ticker, name, sector))
+                continue
+            stock_id, stored_name, stored_sector, active = row
+            if name and name != stored_name:
+                renamed.append((name, stock_id))
+            if sector is not None and sector != stored_sector:
+                resectored.append((sector, stock_id))
+            if not active:
+                reactivated.append((stock_id,))
+        deactivated = [(stock_id,) for ticker, (stock_id, _, _, active) in stored.items()
+                       if active and ticker not in universe] if deactivate_missing else []
+
+        ids = {ticker: row[0] for ticker, row in stored.items()}
+        try:
+            cursor = conn.cursor()
+            for offset in range(0, len(new), STOCK_INSERT_ROWS):
+                chunk = new[offset:offset + STOCK_INSERT_ROWS]
+                cursor.execute(
+                    f"INSERT INTO stocks (ticker, name, sector) VALUES {', '.join(['(?, ?, ?)'] * len(chunk))} "
+                    "RETURNING ticker, id",
+                    [value for row in chunk for value in row]
+                )
+                ids.update(cursor.fetchall())
+            cursor.executemany("UPDATE stocks SET name = ? WHERE id = ?", renamed)
+            cursor.executemany("UPDATE stocks SET sector = ? WHERE id = ?", resectored)
+            cursor.executemany("UPDATE stocks SET is_active = 1 WHERE id = ?", reactivated)
+            cursor.executemany("UPDATE stocks SET is_active = 0 WHERE id = ?", deactivated)
+            stats = {
+                "inserted": len(new),
+                "renamed": len(renamed),
+                "sector_changed": len(resectored),
+                "reactivated": len(reactivated),
+                "deactivated": len(deactivated),
+            }
+            if any(stats.values()):
+                bump_data_version(conn, DATA_VERSION_STOCKS)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        active = {ticker for ticker, row in stored.items() if row[3]}
+        if deactivate_missing:
+            active &= universe.keys()
+        stats["active"] = len(active | universe.keys())
+        return ids, stats
 
-def get_all_stocks() -> List[Tuple[int, str]]:
+def get_all_stocks(conn: Optional[sqlite3.Connection] = None) -> List[Tuple[int, str]]:
     """Returns a list of all active stocks (id, ticker)."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, ticker FROM stocks WHERE is_active = 1")
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with pooled_connection(conn=conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, ticker FROM stocks WHERE is_active = 1")
+        return cursor.fetchall()
+
+def get_stock_id(ticker: str, conn: Optional[sqlite3.Connection] = None) -> Optional[int]:
+    """Returns the id of a ticker, or None if it is unknown."""
+    with pooled_connection(conn=conn) as conn:
+        row = conn.execute("SELECT id FROM stocks WHERE ticker = ?", (ticker,)).fetchone()
+        return row[0] if row else None
+
+def get_last_price_rows(conn: Optional[sqlite3.Connection] = None) -> Dict[int, Tuple[str, float]]:
+    """
+    Returns {stock_id: (last_date, last_close)} for every stock with price history.
+    A single grouped query, served from the (stock_id, date) index.
+    """
+    with pooled_connection(conn=conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT d.stock_id, d.date, d.close
+            FROM daily_prices d
+            JOIN (
+                SELECT stock_id, MAX(date) AS max_date
+                FROM daily_prices
+                GROUP BY stock_id
+            ) m ON d.stock_id = m.stock_id AND d.date = m.max_date
+        """)
+        rows = cursor.fetchall()
+    return {stock_id: (date, close) for stock_id, date, close in rows}
+
+def get_last_closes(tickers: Iterable[str], conn: Optional[sqlite3.Connection] = None) -> Dict[str, float]:
+    """Returns {ticker: last stored close} for the given tickers, one index lookup per stock."""
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    with pooled_connection(conn=conn) as conn:
+        rows = conn.execute(f"""
+            SELECT s.ticker,
+                   (SELECT close FROM daily_prices WHERE stock_id = s.id ORDER BY date DESC LIMIT 1)
+            FROM stocks s WHERE s.ticker IN ({', '.join('?' * len(tickers))})
+        """, tickers).fetchall()
+    return {ticker: close for ticker, close in rows if close is not None}
+
+def _price_rows(stock_id: int, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Builds the daily_prices insert columns for one stock without per-row Python work.
+    Dates are formatted in one NumPy call; missing price columns become NULL.
+    """
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    n = len(df)
+    columns = {
+        'stock_id': np.full(n, stock_id, dtype=np.int64),
+        'date': np.datetime_as_string(index.values.astype('datetime64[D]'), unit='D'),
+    }
+    for field in ('Open', 'Close', 'High', 'Low'):
+        columns[field.lower()] = (
+            df[field].to_numpy(dtype=np.float64, na_value=np.nan) if field in df.columns
+            else np.full(n, np.nan)
+        )
+    volume = df['Volume'].to_numpy(dtype=np.float64, na_value=0.0) if 'Volume' in df.columns else np.zeros(n)
+    columns['volume'] = np.nan_to_num(volume).astype(np.int64)
+    return pd.DataFrame(columns)
+
+# PRAGMAs for bulk price loads: WAL lets readers continue during the load,
+# synchronous=NORMAL drops the per-commit fsync of the WAL, and the staging
+# table lives in memory. cache_size is in KiB when negative.
+BULK_WRITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+}
+
+PRICE_VALUE_COLUMNS = ("open", "close", "high", "low", "volume")
+
+class DailyPriceWriter:
+    """
+    Single-transaction bulk writer for daily_prices.
+
+    Frames passed to `add` are staged in a temp table and merged by `commit`
+    (or on leaving a `with` block) with INSERT ... ON CONFLICT(stock_id, date)
+    DO UPDATE, skipping rows whose values are unchanged, so existing rows keep
+    their id and untouched pages are never rewritten. Staging only writes the
+    connection's temp database, so the write lock on the main database is
+    taken at `commit` and held just for the merge, not while the caller
+    downloads; the temp database spills to a file once it outgrows the page
+    cache. `stats` counts rows inserted, updated and unchanged. Unless
+    maintain_rollups / maintain_indicators / maintain_snapshot is False, the
+    weekly/monthly rollups, technical indicators and screener snapshot
+    covering inserted or changed rows are refreshed in the same transaction.
+    """
+
+    def __init__(self, pragmas: Optional[dict] = None, maintain_rollups: bool = True,
+                 maintain_indicators: bool = True, maintain_snapshot: bool = True):
+        self.maintain_rollups = maintain_rollups
+        self.maintain_indicators = maintain_indicators
+        self.maintain_snapshot = maintain_snapshot
+        self.stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+        # stock_id -> earliest date inserted or changed, for the rollup, indicator and snapshot refresh
+        self.touched: Dict[int, str] = {}
+        self.rollup_rows = 0
+        self.indicator_rows = 0
+        self.snapshot_rows = 0
+        self._staged = 0
+        self.conn = get_connection()
+        # Manage the transaction explicitly so staging and merging share it
+        self.conn.isolation_level = None
+        apply_pragmas(self.conn, BULK_WRITE_PRAGMAS if pragmas is None else pragmas)
+        # Staging can hold a whole backfill; let it spill to disk instead of growing in memory
+        self.conn.execute("PRAGMA temp_store = FILE")
+        self.conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS staged_prices (
+                stock_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                open REAL, close REAL, high REAL, low REAL, volume INTEGER,
+                PRIMARY KEY (stock_id, date)
+            )
+        """)
+
+    def add(self, frames: Iterable[Tuple[int, pd.DataFrame]]) -> int:
+        """Stages (stock_id, DataFrame) pairs. Returns the number of rows staged."""
+        staged = 0
+        # Touches only temp.staged_prices, so no lock is taken on the main database
+        self.conn.execute("BEGIN")
+        try:
+            for stock_id, df in frames:
+                if df.empty:
+                    continue
+                rows = _price_rows(stock_id, df)
+                self.conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO temp.staged_prices (stock_id, date, open, close, high, low, volume)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    rows.itertuples(index=False, name=None)
+                )
+                staged += len(rows)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self._staged += staged
+        return staged
+
+    def _merge(self):
+        """Merges staged rows into daily_prices inside the commit transaction."""
+        if not self._staged:
+            return
+        changed = " OR ".join(f"d.{c} IS NOT s.{c}" for c in PRICE_VALUE_COLUMNS)
+        total, inserted, updated = self.conn.execute(f"""
+            SELECT COUNT(*),
+                   COALESCE(SUM(d.stock_id IS NULL), 0),
+                   COALESCE(SUM(d.stock_id IS NOT NULL AND ({changed})), 0)
+            FROM temp.staged_prices s
+            LEFT JOIN daily_prices d ON d.stock_id = s.stock_id AND d.date = s.date
+        """).fetchone()
+        if self.maintain_rollups or self.maintain_indicators or self.maintain_snapshot:
+            for stock_id, first_date in self.conn.execute(f"""
+                SELECT s.stock_id, MIN(s.date)
+                FROM temp.staged_prices s
+                LEFT JOIN daily_prices d ON d.stock_id = s.stock_id AND d.date = s.date
+                WHERE d.stock_id IS NULL OR {changed}
+                GROUP BY s.stock_id
+            """):
+                previous = self.touched.get(stock_id)
+                self.touched[stock_id] = first_date if previous is None else min(previous, first_date)
+
+        assignments = ", ".join(f"{c} = excluded.{c}" for c in PRICE_VALUE_COLUMNS)
+        differs = " OR ".join(f"daily_prices.{c} IS NOT excluded.{c}" for c in PRICE_VALUE_COLUMNS)
+        # "WHERE true" disambiguates the upsert clause from a join constraint
+        self.conn.execute(f"""
+            INSERT INTO daily_prices (stock_id, date, open, close, high, low, volume)
+            SELECT stock_id, date, open, close, high, low, volume FROM temp.staged_prices WHERE true
+            ON CONFLICT(stock_id, date) DO UPDATE SET {assignments}
+            WHERE {differs}
+        """)
+        self.conn.execute("DELETE FROM temp.staged_prices")
+
+        self.stats["inserted"] += inserted
+        self.stats["updated"] += updated
+        self.stats["unchanged"] += total - inserted - updated
+        self._staged = 0
+
+    def commit(self) -> dict:
+        """Merges the staged rows in one write transaction, commits and closes the connection. Returns `stats`."""
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._merge()
+            if self.maintain_rollups:
+                self.rollup_rows = refresh_rollups(self.conn, self.touched)
+            if self.maintain_indicators:
+                self.indicator_rows = update_indicators(self.conn, self.touched)
+            if self.maintain_snapshot:
+                self.snapshot_rows = refresh_snapshot(self.conn, self.touched)
+            if self.stats["inserted"] or self.stats["updated"]:
+                bump_data_version(self.conn, DATA_VERSION_PRICES)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.rollback()
+            raise
+        self.conn.close()
+        return self.stats
+
+    def rollback(self):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+def save_daily_frames(frames: Iterable[Tuple[int, pd.DataFrame]], pragmas: Optional[dict] = None) -> dict:
+    """
+    Saves price data for several stocks in a single transaction.
+    `frames` yields (stock_id, DataFrame) pairs in the format save_daily_data expects.
+    Returns {"inserted", "updated", "unchanged"} row counts.
+    """
+    with DailyPriceWriter(pragmas=pragmas) as writer:
+        writer.add(frames)
+    return writer.stats
 
 def save_daily_data(stock_id: int, df: pd.DataFrame):
     """
     Saves daily price data to the daily_prices table.
     Expects a DataFrame with index 'Date' and columns 'Open', 'High', 'Low', 'Close', 'Volume'.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Prepare data for bulk insert
-    data_to_insert = []
-    for date, row in df.iterrows():
-        # Format date as YYYY-MM-DD
-        date_str = date.strftime('%Y-%m-%d')
-        data_to_insert.append((
-            stock_id,
-            date_str,
-            row.get('Open'),
-            row.get('Close'),
-            row.get('High'),
-            row.get('Low'),
-            int(row.get('Volume', 0))
-        ))
-    
     try:
-        cursor.executemany(
-            """
-            INSERT OR REPLACE INTO daily_prices (stock_id, date, open, close, high, low, volume)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            data_to_insert
-        )
-        conn.commit()
-        print(f"Saved {cursor.rowcount} records for stock ID {stock_id}.")
+        stats = save_daily_frames([(stock_id, df)])
+        print(f"Saved records for stock ID {stock_id}: {stats['inserted']} inserted, "
+              f"{stats['updated']} updated, {stats['unchanged']} unchanged.")
     except Exception as e:
         print(f"Error saving data for stock ID {stock_id}: {e}")
-    finally:
-        conn.close()
 
-def get_stock_news(stock_id: int, limit: int = 20) -> List[dict]:
-    """Retrieves recent news for a specific stock."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT n.headline, n.summary, n.url, n.publisher, n.published_at, n.sentiment_score
-        FROM news n
-        JOIN stock_news sn ON n.id = sn.news_id
+def refresh_price_store(touched: Optional[Dict[int, str]] = None) -> int:
+    """
+    Brings the columnar price store up to date after a committed price load.
+    Pass the writer's `touched` so only those bars are rewritten. Returns bars written.
+    """
+    with pooled_connection(readonly=False) as conn:
+        return sync_price_store(conn, PRICE_STORE_DIR, touched)
+
+def load_price_arrays(tickers=None, start: Optional[str] = None, end: Optional[str] = None,
+                      fields: Iterable[str] = PRICE_STORE_FIELDS) -> dict:
+    """
+    OHLCV from the memory-mapped price store, without going through SQLite.
+    `tickers` is one ticker (1-D arrays), a list (date x stock copies) or
+    None for every stock (date x stock). Single tickers and the whole
+    universe are zero-copy views of the files.
+    Returns {"dates", "tickers", <field>: array}. Raises FileNotFoundError if
+    the store has not been built and KeyError for a ticker it does not hold.
+    """
+    store = open_price_store(PRICE_STORE_DIR)
+    if store is None:
+        raise FileNotFoundError("Price store not built; run python3 price_store.py --rebuild")
+    return store.view(tickers, start, end, fields)
+
+NEWS_ITEM_FIELDS = ("headline", "summary", "url", "publisher", "published_at", "sentiment")
+# Most news items returned by one feed page or per stock in a batch; limits are clamped to [1, this].
+MAX_NEWS_LIMIT = 100
+
+def encode_cursor(*values) -> str:
+    """Opaque, URL-safe token for a keyset position."""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(token: str, *types) -> tuple:
+    """Inverse of encode_cursor, checking the values against `types`. Raises ValueError if malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if (not isinstance(values, list) or len(values) != len(types)
+            or not all(isinstance(v, t) for v, t in zip(values, types))):
+        raise ValueError("Invalid cursor")
+    return tuple(values)
+
+def _news_item(row) -> dict:
+    """Row of NEWS_ITEM_FIELDS columns (plus any extra ones the caller reads) to an API dict."""
+    return dict(zip(NEWS_ITEM_FIELDS, row))
+
+def get_stock_news(stock_id: int, limit: int = 20, cursor: Optional[str] = None,
+                   conn: Optional[sqlite3.Connection] = None) -> List[dict]:
+    """
+    Retrieves recent news for a specific stock, newest first.
+    Every item carries a `cursor`; pass the last one back to get the next page.
+    Walks idx_stock_news_stock_published backwards, so no sort is needed however
+    much news the stock has.
+    """
+    query = """
+        SELECT n.headline, n.summary, n.url, n.publisher, n.published_at, n.sentiment_score,
+               sn.published_at, sn.news_id
+        FROM stock_news sn
+        CROSS JOIN news n ON n.id = sn.news_id
         WHERE sn.stock_id = ?
-        ORDER BY n.published_at DESC
-        LIMIT ?
-    """, (stock_id, limit))
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [
-        {
-            "headline": r[0],
-            "summary": r[1],
-            "url": r[2],
-            "publisher": r[3],
-            "published_at": r[4],
-            "sentiment": r[5]
-        } for r in rows
-    ]
+    """
+    params = [stock_id]
+    if cursor:
+        query += " AND (sn.published_at, sn.news_id) < (?, ?)"
+        params.extend(decode_cursor(cursor, str, int))
+    query += " ORDER BY sn.published_at DESC, sn.news_id DESC LIMIT ?"
+    params.append(max(1, min(limit, MAX_NEWS_LIMIT)))
 
-def get_market_news(limit: int = 15) -> List[dict]:
-    """Retrieves recent news across all stocks."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT n.headline, n.summary, n.url, n.publisher, n.published_at, n.sentiment_score, s.ticker
-        FROM news n
-        JOIN stock_news sn ON n.id = sn.news_id
-        JOIN stocks s ON s.id = sn.stock_id
-        ORDER BY n.published_at DESC
-        LIMIT ?
-    """, (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [
-        {
-            "headline": r[0],
-            "summary": r[1],
-            "url": r[2],
-            "publisher": r[3],
-            "published_at": r[4],
-            "sentiment": r[5],
-            "ticker": r[6]
-        } for r in rows
-    ]
+    with pooled_connection(conn=conn) as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [dict(_news_item(r), cursor=encode_cursor(r[6], r[7])) for r in rows]
 
-def get_news_price_correlation(stock_id: int, days: int = 30) -> dict:
+def get_market_news(limit: int = 15, cursor: Optional[str] = None,
+                    conn: Optional[sqlite3.Connection] = None) -> List[dict]:
+    """
+    Retrieves recent news across all stocks, newest first, one item per
+    (article, stock) link. Paged with `cursor` like get_stock_news; reads
+    idx_stock_news_published backwards and joins only the rows returned.
+    """
+    query = """
+        SELECT n.headline, n.summary, n.url, n.publisher, n.published_at, n.sentiment_score,
+               s.ticker, sn.published_at, sn.news_id, sn.stock_id
+        FROM stock_news sn
+        CROSS JOIN news n ON n.id = sn.news_id
+        CROSS JOIN stocks s ON s.id = sn.stock_id
+    """
+    params = []
+    if cursor:
+        query += " WHERE (sn.published_at, sn.news_id, sn.stock_id) < (?, ?, ?)"
+        params.extend(decode_cursor(cursor, str, int, int))
+    query += " ORDER BY sn.published_at DESC, sn.news_id DESC, sn.stock_id DESC LIMIT ?"
+    params.append(max(1, min(limit, MAX_NEWS_LIMIT)))
+
+    with pooled_connection(conn=conn) as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [dict(_news_item(r), ticker=r[6], cursor=encode_cursor(r[7], r[8], r[9])) for r in rows]
+
+def get_news_for_stocks(stock_ids: Iterable[int], limit: int = 5,
+                        conn: Optional[sqlite3.Connection] = None) -> Dict[int, List[dict]]:
+    """
+    Latest `limit` news items for each of several stocks (e.g. a watchlist) in
+    one query. Returns {stock_id: [items, newest first]}, with an empty list for
+    stocks without news. Each stock's items come from a short backwards walk of
+    idx_stock_news_stock_published.
+    """
+    stock_ids = list(dict.fromkeys(stock_ids))
+    result = {stock_id: [] for stock_id in stock_ids}
+    if not stock_ids:
+        return result
+    with pooled_connection(conn=conn) as conn:
+        rows = conn.execute(f"""
+            WITH ids(stock_id) AS (VALUES {", ".join(["(?)"] * len(stock_ids))})
+            SELECT n.headline, n.summary, n.url, n.publisher, n.published_at, n.sentiment_score,
+                   ids.stock_id, n.id
+            FROM ids
+            CROSS JOIN news n ON n.id IN (
+                SELECT news_id FROM stock_news
+                WHERE stock_id = ids.stock_id
+                ORDER BY published_at DESC, news_id DESC
+                LIMIT ?
+            )
+        """, [*stock_ids, max(1, min(limit, MAX_NEWS_LIMIT))]).fetchall()
+    # At most `limit` rows per stock, so ordering them here is cheap
+    rows.sort(key=lambda r: (r[4] or "", r[7]), reverse=True)
+    for r in rows:
+        result[r[6]].append(_news_item(r))
+    return result
+
+def get_news_price_correlation(stock_id: int, days: Optional[int] = None,
+                               conn: Optional[sqlite3.Connection] = None) -> dict:
     """
     Analyzes the correlation between news sentiment and price changes.
-    Returns a summary of the impact.
+    Returns a summary of the impact: the same-day correlation plus the
+    lagged (t+1..t+5) correlations.
+
+    By default the figures come from news_impact (stocks it has no rows for
+    are computed on the fly): the same-day correlation covers the last
+    ROLLING_WINDOW trading days (about 30 calendar days), the lagged ones the
+    past LOOKBACK_DAYS. With `days`, everything is computed on the fly over
+    the last `days` calendar days, the same-day correlation included.
     """
-    conn = get_connection()
-    
-    # Get average sentiment per day
-    news_query = """
-        SELECT date(n.published_at) as news_date, AVG(n.sentiment_score) as avg_sentiment
-        FROM news n
-        JOIN stock_news sn ON n.id = sn.news_id
-        WHERE sn.stock_id = ? AND n.published_at >= date('now', ?)
-        GROUP BY news_date
-    """
-    news_df = pd.read_sql_query(news_query, conn, params=(stock_id, f'-{days} days'))
-    
-    if news_df.empty:
-        conn.close()
+    with pooled_connection(conn=conn) as conn:
+        if days is not None:
+            lags = compute_impact(conn, stock_ids=[stock_id], lookback_days=days).get(stock_id)
+        else:
+            lags = load_impact(conn, stock_id)
+            if lags is None:
+                lags = compute_impact(conn, stock_ids=[stock_id]).get(stock_id)
+
+    if not lags:
         return {"correlation": 0, "message": "Not enough news data for analysis."}
-        
-    # Get daily price changes
-    price_query = """
-        SELECT date, (close - open) / open * 100 as pct_change
-        FROM daily_prices
-        WHERE stock_id = ? AND date >= date('now', ?)
-    """
-    price_df = pd.read_sql_query(price_query, conn, params=(stock_id, f'-{days} days'))
-    
-    conn.close()
-    
-    if price_df.empty:
-        return {"correlation": 0, "message": "Not enough price data for analysis."}
-        
-    # Merge on date
-    merged = pd.merge(news_df, price_df, left_on='news_date', right_on='date')
-    
-    if len(merged) < 3:
-        return {"correlation": 0, "message": "Insufficient overlapping data points for correlation."}
-        
-    correlation = merged['avg_sentiment'].corr(merged['pct_change'])
-    
+
+    same_day = lags[0]
+    # Over a caller's window the whole lookback is the window; otherwise the trailing rolling window
+    prefix = "" if days is not None else "rolling_"
+    correlation = same_day[prefix + "correlation"]
+    lagged = [
+        {"lag": lag["lag"],
+         "correlation": None if lag["correlation"] is None else round(lag["correlation"], 2),
+         "data_points": lag["data_points"]}
+        for lag in lags[1:]
+    ]
+    if correlation is None:
+        return {"correlation": 0, "message": "Insufficient overlapping data points for correlation.",
+                "data_points": same_day[prefix + "data_points"], "lags": lagged}
+
     impact_msg = ""
     if correlation > 0.3:
         impact_msg = "Positive correlation: News sentiment strongly influences price movement."
@@ -194,5 +802,6 @@ def get_news_price_correlation(stock_id: int, days: int = 30) -> dict:
     return {
         "correlation": round(correlation, 2),
         "message": impact_msg,
-        "data_points": len(merged)
+        "data_points": same_day[prefix + "data_points"],
+        "lags": lagged
     }
@@ -1,119 +1,572 @@
 import yfinance as yf
-from textblob import TextBlob
-from db_utils import get_connection, get_all_stocks
+from db_utils import (BULK_WRITE_PRAGMAS, DATA_VERSION_NEWS, apply_pragmas, bump_data_version, get_connection,
+                      get_all_stocks, init_db)
+from metrics import StageTimer
+from news_impact import refresh_news_impact
+from news_search import index_is_current, rebuild_index
+from price_fetcher import TokenBucket
+from sentiment import DEFAULT_BACKEND, SentimentEngine, content_hash, get_scorer
 import sqlite3
 import datetime
+import queue
+import threading
 import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Concurrent Ticker.news requests, and how fast they may be issued overall.
+FETCH_WORKERS = 8
+NEWS_RATE = 5.0
+NEWS_BURST = 5
+# Threads scoring sentiment between the fetch and write stages, and the most
+# articles one of them gathers from its queue into a single scoring batch.
+SENTIMENT_WORKERS = 1
+SENTIMENT_BATCH = 512
+# Items each inter-stage queue holds before the stage feeding it blocks.
+QUEUE_SIZE = 64
+# Articles written per transaction, and the longest a partial batch waits (seconds).
+WRITE_BATCH = 1000
+FLUSH_INTERVAL = 2.0
+# Days of stored news preloaded into the dedup index. Ticker.news only
+# returns recent items, so older articles rarely come back.
+DEDUP_WINDOW_DAYS = 30
+# Rows per multi-row INSERT ... RETURNING statement (7 parameters each).
+INSERT_CHUNK_ROWS = 100
+
+NEWS_COLUMNS = ('headline', 'summary', 'url', 'publisher', 'published_at', 'sentiment_score', 'content_hash')
+
+# Queue sentinel telling a stage its input is exhausted.
+_DONE = object()
+# Seconds a blocked queue operation waits before checking whether the run was aborted.
+_ABORT_POLL = 0.1
+
+class _Aborted(Exception):
+    """Raised in a stage (or run) blocked on a queue once another stage has died."""
 
 def analyze_sentiment(text):
-    if not text:
-        return 0.0
-    analysis = TextBlob(text)
-    return analysis.sentiment.polarity
+    return get_scorer("textblob").score(text)
+
+def yf_symbol(ticker: str) -> str:
+    # BSE stocks usually end with .BO in yfinance
+    if not ticker.endswith(".BO") and not ticker.endswith(".NS"):
+        return ticker + ".BO"
+    return ticker
+
+def parse_news_item(item: dict) -> Optional[dict]:
+    """Normalizes one Ticker.news entry to the news table columns. Returns None for items without a title."""
+    # Handle new yfinance format where data is nested in 'content'
+    content = item.get('content', item)
+
+    title = content.get('title')
+    if not title:
+        return None
+
+    summary = content.get('summary', content.get('description', ''))
+
+    # Get URL - look in nested dicts if needed
+    url = content.get('link')
+    if not url and content.get('canonicalUrl'):
+        url = content['canonicalUrl'].get('url')
+    if not url and content.get('clickThroughUrl'):
+        url = content['clickThroughUrl'].get('url')
+
+    # Get Publisher
+    publisher = content.get('publisher')
+    if not publisher and content.get('provider'):
+        publisher = content['provider'].get('displayName')
+
+    # Get Published Date
+    published_at = None
+    pub_time = content.get('providerPublishTime') or content.get('pubDate')
+
+    if pub_time:
+        try:
+            if isinstance(pub_time, int):
+                published_at = datetime.datetime.fromtimestamp(pub_time).strftime('%Y-%m-%d %H:%M:%S')
+            elif isinstance(pub_time, str):
+                # Handle ISO format like 2026-01-10T15:39:14Z
+                d = datetime.datetime.fromisoformat(pub_time.replace('Z', '+00:00'))
+                published_at = d.strftime('%Y-%m-%d %H:%M:%S')
+        except Exception as date_e:
+            print(f"Error parsing date {pub_time}: {date_e}")
+
+    return {
+        'headline': title,
+        'summary': summary,
+        'url': url,
+        'publisher': publisher,
+        'published_at': published_at,
+        'content_hash': content_hash(f"{title} {summary}"),
+    }
+
+def article_key(article: dict) -> str:
+    """Identity used for dedup: the URL, or the content hash for items without one."""
+    return article['url'] or 'hash:' + article['content_hash']
+
+class NewsIndex:
+    """
+    In-memory view of recently stored news: article key -> news id, plus the
+    (stock_id, news_id) links that already exist. Lets the pipeline drop
+    articles it has already stored before they are scored or sent to SQLite.
+    Thread-safe; the writer adds what it inserts.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.links = set()
+        self._lock = threading.Lock()
+
+    def load(self, conn: sqlite3.Connection, window_days: int = DEDUP_WINDOW_DAYS) -> int:
+        """Preloads articles published in the last `window_days` days and their links. Returns the article count."""
+        since = (datetime.datetime.now() - datetime.timedelta(days=window_days)).strftime('%Y-%m-%d %H:%M:%S')
+        rows = conn.execute("""
+            SELECT id, url, content_hash, headline, summary FROM news WHERE published_at >= ?
+        """, (since,)).fetchall()
+        # Rows stored before content_hash existed get one now
+        missing = [(content_hash(f"{headline} {summary or ''}"), news_id)
+                   for news_id, url, hash_, headline, summary in rows if hash_ is None]
+        if missing:
+            conn.executemany("UPDATE news SET content_hash = ? WHERE id = ?", missing)
+            conn.commit()
+        hashes = {news_id: hash_ for hash_, news_id in missing}
+        links = conn.execute("""
+            SELECT stock_id, news_id FROM stock_news WHERE published_at >= ?
+        """, (since,)).fetchall()
+        with self._lock:
+            for news_id, url, hash_, _, _ in rows:
+                self.ids[url or 'hash:' + (hash_ or hashes[news_id])] = news_id
+            self.links.update(links)
+        return len(rows)
+
+    def filter(self, stock_id: int, articles: List[dict]) -> List[dict]:
+        """
+        Drops articles already stored and linked to `stock_id`. Stored articles
+        that still need the link are kept with their 'news_id' set.
+        """
+        kept = []
+        with self._lock:
+            for article in articles:
+                news_id = self.ids.get(article_key(article))
+                if news_id is None:
+                    kept.append(article)
+                elif (stock_id, news_id) not in self.links:
+                    kept.append(dict(article, news_id=news_id))
+        return kept
+
+    def add(self, ids: Dict[str, int], links):
+        with self._lock:
+            self.ids.update(ids)
+            self.links.update(links)
+
+class YFinanceNewsProvider:
+    """Returns the raw Ticker.news list for one symbol."""
+
+    def news(self, symbol: str) -> list:
+        return yf.Ticker(symbol).news or []
+
+class FakeNewsProvider:
+    """
+    Local stand-in for YFinanceNewsProvider used for benchmarks and offline runs.
+    Returns deterministic items in the nested yfinance 'content' format. A share
+    of every ticker's items are wire stories from a common pool, so the same
+    article comes back for many tickers the way syndicated news does.
+    """
+
+    POSITIVE = ("surges", "beats estimates", "wins order", "upgraded", "record profit", "strong growth")
+    NEGATIVE = ("slumps", "misses estimates", "faces probe", "downgraded", "weak outlook", "loses contract")
+    NEUTRAL = ("announces results", "holds AGM", "files update", "reshuffles board", "sets record date")
+
+    def __init__(self, latency: float = 0.0, items_per_stock: int = 10, wire_share: float = 0.3,
+                 wire_pool: int = 200, end_date: str = "2026-10-16"):
+        self.latency = latency
+        self.items_per_stock = items_per_stock
+        self.wire_share = wire_share
+        self.wire_pool = wire_pool
+        self.end = datetime.datetime.fromisoformat(end_date)
+        self.calls = 0
+
+    def _item(self, key: str, seed: int, subject: str) -> dict:
+        words = (self.POSITIVE, self.NEGATIVE, self.NEUTRAL)[seed % 3]
+        event = words[(seed // 3) % len(words)]
+        published = self.end - datetime.timedelta(minutes=seed % (60 * 24 * 14))
+        return {'content': {
+            'title': f"{subject} {event}",
+            'summary': f"{subject} {event} as analysts review the quarter; shares moved {seed % 9} percent.",
+            'canonicalUrl': {'url': f"https://news.example.com/{key}"},
+            'provider': {'displayName': f"Wire {seed % 5}"},
+            'pubDate': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }}
+
+    def news(self, symbol: str) -> list:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        seed = zlib.crc32(symbol.encode())
+        n_wire = int(round(self.items_per_stock * self.wire_share))
+        items = []
+        for i in range(self.items_per_stock):
+            if i < n_wire:
+                story = (seed + i * 7919) % self.wire_pool
+                items.append(self._item(f"wire/{story}", zlib.crc32(f"wire{story}".encode()), "Sensex"))
+            else:
+                items.append(self._item(f"{symbol}/{i}", seed + i, symbol.split('.')[0]))
+        return items
+
+class NewsPipeline:
+    """
+    Fetches, scores and stores news for many stocks in three concurrent stages:
+
+      fetch      FETCH_WORKERS threads call the provider, paced by one shared TokenBucket
+      sentiment  SENTIMENT_WORKERS threads score articles in batches through a
+                 SentimentEngine, so repeated stories are only scored once
+      write      a single thread batch-inserts articles and stock links,
+                 WRITE_BATCH articles per transaction
+
+    Before a run, a NewsIndex of recently stored articles and links is loaded, so
+    articles that come back on every run are dropped in the fetch stage and only
+    new articles and links reach SQLite.
+
+    Stages are connected by bounded queues, so a slow stage blocks the one
+    feeding it instead of letting results pile up in memory. Every stage is
+    timed through `timer`, with its time charged to the tickers it handled.
+    """
+
+    def __init__(self, provider=None, fetch_workers: int = FETCH_WORKERS,
+                 sentiment_workers: int = SENTIMENT_WORKERS, limiter: Optional[TokenBucket] = None,
+                 batch_size: int = WRITE_BATCH, queue_size: int = QUEUE_SIZE,
+                 engine: Optional[SentimentEngine] = None, timer: Optional[StageTimer] = None):
+        self.provider = provider or YFinanceNewsProvider()
+        self.fetch_workers = max(1, fetch_workers)
+        self.sentiment_workers = max(1, sentiment_workers)
+        self.limiter = limiter or TokenBucket(NEWS_RATE, NEWS_BURST)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.engine = engine or SentimentEngine()
+        self.timer = timer or StageTimer("news_pipeline")
+        # stock_id -> ticker of the current run, for per-ticker timings
+        self.tickers: Dict[int, str] = {}
+        self.index = NewsIndex()
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self._failure: Optional[BaseException] = None
+
+    def _count(self, name: str, value=1):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + value
+
+    def _put(self, q: queue.Queue, item):
+        while True:
+            if self._abort.is_set():
+                raise _Aborted()
+            try:
+                q.put(item, timeout=_ABORT_POLL)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, q: queue.Queue):
+        while True:
+            if self._abort.is_set():
+                raise _Aborted()
+            try:
+                return q.get(timeout=_ABORT_POLL)
+            except queue.Empty:
+                pass
 
-def fetch_and_store_news(limit=None):
+    def _run_stage(self, target, *args):
+        """Runs a stage; if it dies, records why and aborts the run so no stage blocks on a full queue."""
+        try:
+            target(*args)
+        except _Aborted:
+            pass
+        except BaseException as e:
+            with self._lock:
+                if self._failure is None:
+                    self._failure = e
+            self._abort.set()
+
+    def _fetch_stage(self, stocks: queue.Queue, fetched: queue.Queue):
+        while True:
+            task = self._get(stocks)
+            if task is _DONE:
+                return
+            stock_id, ticker = task
+            self.limiter.acquire()
+            try:
+                with self.timer.stage('fetch', (ticker,)) as span:
+                    items = self.provider.news(yf_symbol(ticker))
+            except Exception as e:
+                print(f"Error fetching news for {ticker}: {e}")
+                self._count('failed')
+                continue
+            finally:
+                self._count('fetch_seconds', span.seconds)
+            try:
+                with self.timer.stage('parse', (ticker,)):
+                    articles = [a for a in map(parse_news_item, items) if a is not None]
+                    fresh = self.index.filter(stock_id, articles)
+            except Exception as e:
+                print(f"Error parsing news for {ticker}: {e}")
+                self._count('failed')
+                continue
+            self._count('stocks')
+            self._count('articles', len(articles))
+            self._count('duplicates', len(articles) - len(fresh))
+            articles = fresh
+            if articles:
+                self._put(fetched, (stock_id, articles))
+
+    def _sentiment_stage(self, fetched: queue.Queue, scored: queue.Queue):
+        while True:
+            # Block for one task, then take whatever else is already queued
+            tasks = [self._get(fetched)]
+            count = 0 if tasks[0] is _DONE else len(tasks[0][1])
+            while tasks[-1] is not _DONE and count < SENTIMENT_BATCH:
+                try:
+                    tasks.append(fetched.get_nowait())
+                except queue.Empty:
+                    break
+                if tasks[-1] is not _DONE:
+                    count += len(tasks[-1][1])
+            done = tasks[-1] is _DONE
+            if done:
+                tasks.pop()
+
+            if tasks:
+                # Articles already stored only need a link
+                pending = [(stock_id, article) for stock_id, batch in tasks for article in batch
+                           if 'news_id' not in article]
+                articles = [article for _, article in pending]
+                with self.timer.stage('sentiment', [self.tickers.get(stock_id) for stock_id, _ in pending]) as span:
+                    try:
+                        scores = self.engine.score_batch(f"{a['headline']} {a['summary']}" for a in articles)
+                    except Exception as e:
+                        # Store the articles unscored rather than stall the pipeline
+                        print(f"Error scoring sentiment for {len(articles)} articles: {e}")
+                        self._count('sentiment_errors')
+                        scores = [None] * len(articles)
+                    for article, score in zip(articles, scores):
+                        article['sentiment_score'] = score
+                self._count('sentiment_seconds', span.seconds)
+                for task in tasks:
+                    self._put(scored, task)
+            if done:
+                return
+
+    def _insert_articles(self, cursor: sqlite3.Cursor, articles: List[dict]) -> Dict[str, int]:
+        """Inserts new articles with multi-row INSERT ... RETURNING. Returns {article key: news id}."""
+        ids = {}
+        placeholders = '(' + ', '.join('?' * len(NEWS_COLUMNS)) + ')'
+        for offset in range(0, len(articles), INSERT_CHUNK_ROWS):
+            chunk = articles[offset:offset + INSERT_CHUNK_ROWS]
+            cursor.execute(
+                f"""
+                INSERT INTO news ({', '.join(NEWS_COLUMNS)})
+                VALUES {', '.join([placeholders] * len(chunk))}
+                ON CONFLICT DO NOTHING
+                RETURNING id, url, content_hash
+                """,
+                [article[c] for article in chunk for c in NEWS_COLUMNS]
+            )
+            for news_id, url, hash_ in cursor.fetchall():
+                ids[url or 'hash:' + hash_] = news_id
+        self._count('inserted', len(ids))
+
+        # URLs stored before the dedup window conflict and return nothing
+        conflicts = [a['url'] for a in articles if a['url'] and article_key(a) not in ids]
+        for offset in range(0, len(conflicts), 500):
+            chunk = conflicts[offset:offset + 500]
+            cursor.execute(f"SELECT url, id FROM news WHERE url IN ({', '.join('?' * len(chunk))})", chunk)
+            ids.update(cursor.fetchall())
+        return ids
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Tuple[int, dict]]):
+        with self.timer.stage('write', [self.tickers.get(stock_id) for stock_id, _ in batch]) as span:
+            self._store_batch(conn, batch)
+        self._count('write_seconds', span.seconds)
+
+    def _store_batch(self, conn: sqlite3.Connection, batch: List[Tuple[int, dict]]):
+        cursor = conn.cursor()
+        try:
+            links = set()
+            new = {}
+            pending = []
+            for stock_id, article in batch:
+                if 'news_id' in article:
+                    links.add((stock_id, article['news_id']))
+                else:
+                    key = article_key(article)
+                    new.setdefault(key, article)
+                    pending.append((stock_id, key))
+
+            # URL-less articles are matched on content_hash, which has no unique
+            # constraint; look up the few that are not in the index
+            hashed = [a['content_hash'] for key, a in new.items() if a['url'] is None]
+            stored = dict(cursor.execute(
+                f"SELECT content_hash, id FROM news WHERE url IS NULL AND content_hash IN ({', '.join('?' * len(hashed))})",
+                hashed
+            ).fetchall()) if hashed else {}
+            ids = {'hash:' + hash_: news_id for hash_, news_id in stored.items()}
+            ids.update(self._insert_articles(cursor, [a for key, a in new.items() if key not in ids]))
+            links.update((stock_id, ids[key]) for stock_id, key in pending if key in ids)
+
+            # stock_news_published_insert copies published_at onto each new link;
+            # rowcount leaves out the rows that triggers change
+            cursor.executemany("INSERT OR IGNORE INTO stock_news (stock_id, news_id) VALUES (?, ?)", links)
+            self._count('linked', max(cursor.rowcount, 0))
+            self.engine.save(conn)
+            conn.commit()
+            self.index.add(ids, links)
+        except Exception as e:
+            conn.rollback()
+            print(f"Error storing a batch of {len(batch)} news items: {e}")
+            self._count('write_errors')
+
+    def _write_stage(self, scored: queue.Queue):
+        conn = get_connection()
+        apply_pragmas(conn, BULK_WRITE_PRAGMAS)
+        # Counts SQL round trips, which should scale with new articles only
+        conn.set_trace_callback(lambda statement: self._count('statements'))
+        batch = []
+        last_flush = time.monotonic()
+        done = False
+        try:
+            while not done:
+                if self._abort.is_set():
+                    raise _Aborted()
+                try:
+                    task = scored.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    task = None
+                if task is _DONE:
+                    done = True
+                elif task is not None:
+                    stock_id, articles = task
+                    batch.extend((stock_id, article) for article in articles)
+                if batch and (len(batch) >= self.batch_size or time.monotonic() - last_flush >= FLUSH_INTERVAL):
+                    self._write_batch(conn, batch)
+                    batch = []
+                    last_flush = time.monotonic()
+            if batch:
+                self._write_batch(conn, batch)
+            # Invalidates cached news responses in the API
+            bump_data_version(conn, DATA_VERSION_NEWS)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run(self, stocks: List[Tuple[int, str]]) -> dict:
+        """
+        Fetches and stores news for every (stock_id, ticker). Returns the run's counters.
+        Failures of one stock or batch are counted and skipped; if a stage thread dies
+        anyway, the run is aborted and RuntimeError is raised.
+        """
+        self.stats = {name: 0 for name in ('stocks', 'failed', 'articles', 'duplicates', 'inserted', 'linked',
+                                          'sentiment_errors', 'write_errors', 'statements', 'fetch_seconds',
+                                          'sentiment_seconds', 'write_seconds')}
+        start = time.perf_counter()
+        self.tickers = dict(stocks)
+        self._abort.clear()
+        self._failure = None
+        conn = get_connection()
+        try:
+            self.stats['indexed'] = self.index.load(conn)
+        finally:
+            conn.close()
+        stock_queue = queue.Queue(self.queue_size)
+        fetched = queue.Queue(self.queue_size)
+        scored = queue.Queue(self.queue_size)
+
+        stages = [
+            (stock_queue, [threading.Thread(target=self._run_stage, args=(self._fetch_stage, stock_queue, fetched),
+                                            daemon=True) for _ in range(self.fetch_workers)]),
+            (fetched, [threading.Thread(target=self._run_stage, args=(self._sentiment_stage, fetched, scored),
+                                        daemon=True) for _ in range(self.sentiment_workers)]),
+            (scored, [threading.Thread(target=self._run_stage, args=(self._write_stage, scored), daemon=True)]),
+        ]
+        for _, threads in stages:
+            for thread in threads:
+                thread.start()
+
+        try:
+            for stock in stocks:
+                self._put(stock_queue, stock)
+            # Shut the stages down in order, once everything upstream has been handed on
+            for inbox, threads in stages:
+                for _ in threads:
+                    self._put(inbox, _DONE)
+                for thread in threads:
+                    thread.join()
+        except _Aborted:
+            pass
+        if self._failure is not None:
+            # A stage died: the others stop at their next queue operation
+            for _, threads in stages:
+                for thread in threads:
+                    thread.join()
+            raise RuntimeError(f"News pipeline stage failed: {self._failure!r}") from self._failure
+
+        self.stats['elapsed'] = time.perf_counter() - start
+        return self.stats
+
+def fetch_and_store_news(limit=None, provider=None, fetch_workers: int = FETCH_WORKERS,
+                         sentiment_workers: int = SENTIMENT_WORKERS, backend: str = DEFAULT_BACKEND,
+                         processes: int = 0, rate: float = NEWS_RATE) -> Dict:
     stocks = get_all_stocks()
     if limit:
         stocks = stocks[:limit]
-    
+
+    init_db()  # adds columns and tables introduced since the database was created
     conn = get_connection()
-    cursor = conn.cursor()
-    
+    try:
+        if not index_is_current(conn):
+            # First run after news_fts was added: index the existing archive once
+            print("Building the news search index...")
+            rebuild_index(conn)
+            conn.commit()
+    finally:
+        conn.close()
     print(f"Starting news fetch for {len(stocks)} stocks...")
-    
-    for stock_id, ticker in stocks:
+    timer = StageTimer("fetch_news")
+    engine = SentimentEngine(backend, processes=processes)
+    pipeline = NewsPipeline(provider, fetch_workers=fetch_workers, sentiment_workers=sentiment_workers,
+                            limiter=TokenBucket(rate, max(NEWS_BURST, int(rate))), engine=engine, timer=timer)
+    try:
+        stats = pipeline.run(stocks)
+    finally:
+        engine.close()
+    if stats['inserted'] or stats['linked']:
+        conn = get_connection()
         try:
-            print(f"Fetching news for {ticker}...")
-            # BSE stocks usually end with .BO in yfinance
-            yf_ticker = ticker
-            if not yf_ticker.endswith(".BO") and not yf_ticker.endswith(".NS"):
-                yf_ticker += ".BO"
-                
-            t = yf.Ticker(yf_ticker)
-            news_items = t.news
-            
-            if not news_items:
-                print(f"No news found for {ticker}")
-                continue
-                
-            for item in news_items:
-                # Handle new yfinance format where data is nested in 'content'
-                content = item.get('content', item)
-                
-                title = content.get('title')
-                if not title:
-                    continue
-                    
-                summary = content.get('summary', content.get('description', ''))
-                
-                # Get URL - look in nested dicts if needed
-                url = content.get('link')
-                if not url and 'canonicalUrl' in content:
-                    url = content['canonicalUrl'].get('url')
-                if not url and 'clickThroughUrl' in content:
-                    url = content['clickThroughUrl'].get('url')
-                
-                # Get Publisher
-                publisher = content.get('publisher')
-                if not publisher and 'provider' in content:
-                    publisher = content['provider'].get('displayName')
-                
-                # Get Published Date
-                published_at = None
-                pub_time = content.get('providerPublishTime') or content.get('pubDate')
-                
-                if pub_time:
-                    try:
-                        if isinstance(pub_time, int):
-                            published_at = datetime.datetime.fromtimestamp(pub_time).strftime('%Y-%m-%d %H:%M:%S')
-                        elif isinstance(pub_time, str):
-                            # Handle ISO format like 2026-01-10T15:39:14Z
-                            # Python 3.11+ handles 'Z' automatically, for older we might need to replace
-                            d = datetime.datetime.fromisoformat(pub_time.replace('Z', '+00:00'))
-                            published_at = d.strftime('%Y-%m-%d %H:%M:%S')
-                    except Exception as date_e:
-                        print(f"Error parsing date {pub_time}: {date_e}")
-                
-                # Analyze sentiment of title and summary
-                sentiment = analyze_sentiment(f"{title} {summary}")
-                
-                try:
-                    # Insert news article if it doesn't exist
-                    cursor.execute("""
-                        INSERT OR IGNORE INTO news (headline, summary, url, publisher, published_at, sentiment_score)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (title, summary, url, publisher, published_at, sentiment))
-                    
-                    # Get the news_id (either from insert or existing)
-                    if cursor.rowcount > 0:
-                        news_id = cursor.lastrowid
-                    else:
-                        cursor.execute("SELECT id FROM news WHERE url = ?", (url,))
-                        res = cursor.fetchone()
-                        news_id = res[0] if res else None
-                    
-                    if news_id:
-                        # Link news to stock
-                        cursor.execute("""
-                            INSERT OR IGNORE INTO stock_news (stock_id, news_id)
-                            VALUES (?, ?)
-                        """, (stock_id, news_id))
-                        
-                except Exception as e:
-                    print(f"Error storing news item for {ticker}: {e}")
-            
-            conn.commit()
-            # Small sleep to avoid hitting rate limits
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"Error fetching news for {ticker}: {e}")
-            
-    conn.close()
+            with timer.stage('news_impact'):
+                stats['impact_rows'] = refresh_news_impact(conn)
+                bump_data_version(conn, DATA_VERSION_NEWS)
+                conn.commit()
+        finally:
+            conn.close()
+    print(f"Fetched {stats['articles']} articles for {stats['stocks']} stocks "
+          f"({stats['failed']} failed): {stats['duplicates']} already stored, "
+          f"{stats['inserted']} new, {stats['linked']} new links "
+          f"in {stats['elapsed']:.1f} seconds.")
+    print(f"Sentiment ({backend}): {engine.stats['scored']} scored, "
+          f"{engine.stats['memory_hits'] + engine.stats['db_hits']} served from cache.")
+    if 'impact_rows' in stats:
+        print(f"News impact refreshed ({stats['impact_rows']} rows).")
+    for line in timer.report():
+        print(line)
+    timer.finish()
     print("News fetch completed.")
+    return stats
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Fetch latest news and score its sentiment.")
     # For testing, we can run with a small limit
-    import sys
-    limit = int(sys.argv[1]) if len(sys.argv) > 1 else None
-    fetch_and_store_news(limit=limit)
+    parser.add_argument("limit", nargs="?", type=int, help="Only fetch news for the first N stocks.")
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS, help="Concurrent news requests.")
+    parser.add_argument("--sentiment", default=DEFAULT_BACKEND, help="Sentiment backend: textblob or lexicon.")
+    parser.add_argument("--processes", type=int, default=0, help="Processes for sentiment scoring (0 = inline).")
+    args = parser.parse_args()
+    fetch_and_store_news(limit=args.limit, fetch_workers=args.workers, backend=args.sentiment,
+                         processes=args.processes)
@@ -0,0 +1,327 @@
+"""
+Technical indicators over daily_prices, stored one row per (stock_id, date)
+in the indicators table:
+
+  sma_20, sma_50, sma_200   simple moving averages of close
+  ema_12, ema_26            exponential moving averages of close
+  macd, macd_signal,        ema_12 - ema_26, its 9-bar EMA, and their difference
+  macd_hist
+  rsi_14                    Wilder's relative strength index
+  bb_upper, bb_lower        Bollinger bands, sma_20 +/- 2 standard deviations
+  atr_14                    Wilder's average true range
+
+Stocks are laid out as the columns of a (bar x stock) matrix, so every
+indicator is computed for a whole batch of stocks at once: windowed ones
+from running sums, recursive ones one bar at a time across all stocks.
+Each row also keeps the recursion state (bars, avg_gain, avg_loss), so new
+bars are computed from the last stored row and the 199 bars before them
+instead of the full history.
+"""
+import argparse
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from resample import group_starts
+
+INDICATOR_FIELDS = ('sma_20', 'sma_50', 'sma_200', 'ema_12', 'ema_26', 'macd', 'macd_signal', 'macd_hist',
+                    'rsi_14', 'bb_upper', 'bb_lower', 'atr_14')
+# Stored alongside the indicators so a later update can resume from any row.
+STATE_FIELDS = ('bars', 'avg_gain', 'avg_loss')
+
+SMA_PERIODS = (20, 50, 200)
+EMA_FAST, EMA_SLOW, MACD_SIGNAL = 12, 26, 9
+RSI_PERIOD = 14
+BOLLINGER_PERIOD, BOLLINGER_WIDTH = 20, 2.0
+ATR_PERIOD = 14
+
+# Bars before the first new one that the longest window needs.
+HISTORY_BARS = max(SMA_PERIODS) - 1
+# A stored row is only resumed from once every indicator in it is warmed up;
+# younger stocks are recomputed from their first bar.
+WARMUP_BARS = EMA_SLOW + MACD_SIGNAL - 1
+
+BATCH_STOCKS = 200
+
+
+def indicators_available(conn: sqlite3.Connection) -> bool:
+    """True if the indicators table exists (it is created by schema.sql)."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'indicators'"
+    ).fetchone() is not None
+
+
+def rolling_mean_std(values: np.ndarray, window: int):
+    """
+    Mean and population standard deviation of each trailing `window` rows,
+    per column, from running sums. NaN until a column has `window` bars.
+    """
+    present = ~np.isnan(values)
+    # Centered on each column's mean so the running sums of squares stay small
+    center = np.where(present, values, 0.0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+    shifted = np.where(present, values - center, 0.0)
+
+    def trailing(x):
+        running = np.cumsum(x, axis=0)
+        earlier = np.zeros_like(running)
+        earlier[window:] = running[:-window]
+        return running - earlier
+
+    count = trailing(present.astype(np.float64))
+    total, squares = trailing(shifted), trailing(shifted * shifted)
+    full = (count >= window - 0.5) & present
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / window
+        std = np.sqrt(np.maximum(squares / window - mean * mean, 0.0))
+    return np.where(full, mean + center, np.nan), np.where(full, std, np.nan)
+
+
+def _smooth(previous: np.ndarray, value: np.ndarray, alpha: float, update: np.ndarray) -> np.ndarray:
+    """One step of an exponential average: seeds from `value`, then moves `alpha` toward it where `update`."""
+    stepped = np.where(np.isnan(previous), value, previous + alpha * (value - previous))
+    return np.where(update & ~np.isnan(value), stepped, previous)
+
+
+def compute(close: np.ndarray, high: np.ndarray, low: np.ndarray, first_row: int,
+            state: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Indicators for (bar x stock) matrices, NaN where a stock has no bar.
+    Rows before `first_row` are history: they feed the moving windows and
+    the previous close, but the recursive state is taken from `state`
+    (per-stock arrays: bars, ema_12, ema_26, macd_signal, avg_gain,
+    avg_loss, atr_14 and close, all NaN/0 for stocks computed from scratch).
+    Returns matrices for rows first_row onward, keyed by INDICATOR_FIELDS
+    and STATE_FIELDS.
+    """
+    n_rows, n_stocks = close.shape
+    out = {name: np.full((n_rows - first_row, n_stocks), np.nan) for name in INDICATOR_FIELDS + STATE_FIELDS}
+
+    for period in SMA_PERIODS:
+        mean, std = rolling_mean_std(close, period)
+        out[f'sma_{period}'] = mean[first_row:]
+        if period == BOLLINGER_PERIOD:
+            out['bb_upper'] = (mean + BOLLINGER_WIDTH * std)[first_row:]
+            out['bb_lower'] = (mean - BOLLINGER_WIDTH * std)[first_row:]
+
+    bars = state['bars'].astype(np.float64)
+    ema_fast, ema_slow = state['ema_12'].copy(), state['ema_26'].copy()
+    signal, atr = state['macd_signal'].copy(), state['atr_14'].copy()
+    avg_gain, avg_loss = state['avg_gain'].copy(), state['avg_loss'].copy()
+    previous = state['close'].copy()
+
+    # The recursive indicators step through the bars, each step covering every stock
+    for row in range(first_row, n_rows):
+        c, h, l = close[row], high[row], low[row]
+        present = ~np.isnan(c)
+        bars = bars + present
+        ema_fast = _smooth(ema_fast, c, 2.0 / (EMA_FAST + 1), present)
+        ema_slow = _smooth(ema_slow, c, 2.0 / (EMA_SLOW + 1), present)
+        macd = ema_fast - ema_slow
+        signal = _smooth(signal, macd, 2.0 / (MACD_SIGNAL + 1), present)
+
+        change = c - previous
+        avg_gain = _smooth(avg_gain, np.maximum(change, 0.0), 1.0 / RSI_PERIOD, present)
+        avg_loss = _smooth(avg_loss, np.maximum(-change, 0.0), 1.0 / RSI_PERIOD, present)
+        with np.errstate(invalid='ignore'):
+            true_range = np.where(np.isnan(previous), h - l,
+                                  np.fmax(h - l, np.fmax(np.abs(h - previous), np.abs(l - previous))))
+        atr = _smooth(atr, true_range, 1.0 / ATR_PERIOD, present)
+        previous = np.where(present, c, previous)
+
+        i = row - first_row
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsi = np.where(avg_loss > 0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss), 100.0)
+        for name, values, min_bars in (
+            ('ema_12', ema_fast, EMA_FAST), ('ema_26', ema_slow, EMA_SLOW), ('macd', macd, EMA_SLOW),
+            ('macd_signal', signal, WARMUP_BARS), ('macd_hist', macd - signal, WARMUP_BARS),
+            ('rsi_14', rsi, RSI_PERIOD + 1), ('atr_14', atr, ATR_PERIOD),
+        ):
+            out[name][i] = np.where(present & (bars >= min_bars), values, np.nan)
+        out['bars'][i] = np.where(present, bars, np.nan)
+        out['avg_gain'][i] = np.where(present, avg_gain, np.nan)
+        out['avg_loss'][i] = np.where(present, avg_loss, np.nan)
+    return out
+
+
+def _plan(conn: sqlite3.Connection, touched: Dict[int, str]):
+    """
+    For each touched stock, the stored row to resume from: the last one
+    before its earliest touched date, if it is warmed up. Fills
+    temp.indicator_scope with (stock_id, resume_date, from_date) and returns
+    {stock_id: state row} for the stocks that resume.
+    """
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS indicator_scope (
+            stock_id INTEGER PRIMARY KEY, touched_date TEXT, resume_date TEXT, from_date TEXT
+        )
+    """)
+    conn.execute("DELETE FROM temp.indicator_scope")
+    conn.executemany("INSERT INTO temp.indicator_scope (stock_id, touched_date) VALUES (?, ?)", touched.items())
+    # Each lookup is one seek on the (stock_id, date) key
+    conn.execute("""
+        UPDATE temp.indicator_scope SET resume_date = (
+            SELECT MAX(date) FROM indicators
+            WHERE stock_id = indicator_scope.stock_id AND date < indicator_scope.touched_date
+        )
+    """)
+    columns = ('date', 'bars', 'ema_12', 'ema_26', 'macd_signal', 'avg_gain', 'avg_loss', 'atr_14')
+    rows = conn.execute(f"""
+        SELECT s.stock_id, {', '.join('i.' + c for c in columns)}, d.close
+        FROM temp.indicator_scope s
+        CROSS JOIN indicators i ON i.stock_id = s.stock_id AND i.date = s.resume_date
+        CROSS JOIN daily_prices d ON d.stock_id = i.stock_id AND d.date = i.date
+    """).fetchall()
+    states = {row[0]: dict(zip(columns + ('close',), row[1:])) for row in rows}
+    cold = [stock_id for stock_id, state in states.items() if (state['bars'] or 0) < WARMUP_BARS]
+    for stock_id in cold:
+        del states[stock_id]
+    conn.executemany("UPDATE temp.indicator_scope SET resume_date = NULL WHERE stock_id = ?",
+                     [(stock_id,) for stock_id in cold])
+
+    # Windows reach HISTORY_BARS bars back from the first new bar
+    conn.execute("""
+        UPDATE temp.indicator_scope SET from_date = coalesce((
+            SELECT date FROM daily_prices
+            WHERE stock_id = indicator_scope.stock_id AND date <= indicator_scope.resume_date
+            ORDER BY date DESC LIMIT 1 OFFSET ?
+        ), '0001-01-01')
+    """, (HISTORY_BARS - 1,))
+    return states
+
+
+def _load_bars(conn: sqlite3.Connection) -> Dict[str, np.ndarray]:
+    """Daily bars of every stock in temp.indicator_scope from its from_date on, ordered by (stock_id, date)."""
+    rows = conn.execute("""
+        SELECT d.stock_id, d.date, d.close, d.high, d.low
+        FROM temp.indicator_scope s
+        CROSS JOIN daily_prices d ON d.stock_id = s.stock_id AND d.date >= s.from_date
+        ORDER BY s.stock_id, d.date
+    """).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * 5
+    return {
+        'stock_id': np.array(columns[0], dtype=np.int64),
+        'date': np.array(columns[1], dtype='datetime64[D]'),
+        **{field: np.array(values, dtype=np.float64) for field, values in zip(('close', 'high', 'low'), columns[2:])},
+    }
+
+
+def _update_batch(conn: sqlite3.Connection, touched: Dict[int, str]) -> int:
+    states = _plan(conn, touched)
+    # Rows after the resume point are recomputed; stocks without one start over
+    conn.executemany("DELETE FROM indicators WHERE stock_id = ? AND date > ?",
+                     [(stock_id, states[stock_id]['date'] if stock_id in states else '') for stock_id in touched])
+    daily = _load_bars(conn)
+    conn.execute("DELETE FROM temp.indicator_scope")
+    if not len(daily['date']):
+        return 0
+
+    starts = group_starts(daily['stock_id'])
+    stock_ids = daily['stock_id'][starts]
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(daily['date']))))
+    position = np.arange(len(segment)) - starts[segment]
+
+    # Bars up to the resume date are history; new bars start at row `first_row` for every stock
+    resume = np.array([states[s]['date'] if s in states else '0001-01-01' for s in stock_ids.tolist()],
+                      dtype='datetime64[D]')
+    history = np.bincount(segment, weights=daily['date'] <= resume[segment], minlength=len(starts)).astype(np.int64)
+    first_row = int(history.max()) if len(history) else 0
+    row = first_row - history[segment] + position
+    n_rows = int(row.max()) + 1
+
+    matrices = {}
+    for field in ('close', 'high', 'low'):
+        matrices[field] = np.full((n_rows, len(starts)), np.nan)
+        matrices[field][row, segment] = daily[field]
+    dates = np.full((n_rows, len(starts)), np.datetime64('NaT'), dtype='datetime64[D]')
+    dates[row, segment] = daily['date']
+
+    state = {
+        name: np.array([states[s][name] if s in states else np.nan for s in stock_ids.tolist()], dtype=np.float64)
+        for name in ('ema_12', 'ema_26', 'macd_signal', 'avg_gain', 'avg_loss', 'atr_14', 'close')
+    }
+    state['bars'] = np.array([states[s]['bars'] if s in states else 0 for s in stock_ids.tolist()], dtype=np.int64)
+    out = compute(matrices['close'], matrices['high'], matrices['low'], first_row, state)
+
+    new_rows, new_cols = np.nonzero(~np.isnat(dates[first_row:]))
+    fields = INDICATOR_FIELDS + STATE_FIELDS
+    # NaN binds as NULL
+    conn.executemany(
+        f"""
+        INSERT OR REPLACE INTO indicators (stock_id, date, {', '.join(fields)})
+        VALUES ({', '.join('?' * (len(fields) + 2))})
+        """,
+        zip(
+            stock_ids[new_cols].tolist(),
+            np.datetime_as_string(dates[first_row:][new_rows, new_cols], unit='D').tolist(),
+            *[out[name][new_rows, new_cols].tolist() for name in INDICATOR_FIELDS],
+            out['bars'][new_rows, new_cols].astype(np.int64).tolist(),
+            out['avg_gain'][new_rows, new_cols].tolist(),
+            out['avg_loss'][new_rows, new_cols].tolist(),
+        )
+    )
+    return len(new_rows)
+
+
+def update_indicators(conn: sqlite3.Connection, touched: Dict[int, str], batch_stocks: int = BATCH_STOCKS) -> int:
+    """
+    Brings the indicators of the touched stocks up to date. `touched` maps
+    stock_id to the earliest daily date inserted or changed since the last
+    update; rows from that date on are recomputed, resuming from the stored
+    row before it. Runs inside the caller's transaction. Returns rows written.
+    """
+    if not touched or not indicators_available(conn):
+        return 0
+    items = sorted(touched.items())
+    return sum(_update_batch(conn, dict(items[offset:offset + batch_stocks]))
+               for offset in range(0, len(items), batch_stocks))
+
+
+def rebuild_indicators(conn: sqlite3.Connection, batch_stocks: int = BATCH_STOCKS) -> int:
+    """Recomputes the indicators table from scratch, a batch of stocks at a time."""
+    conn.execute("DELETE FROM indicators")
+    stock_ids = [row[0] for row in conn.execute("SELECT DISTINCT stock_id FROM daily_prices ORDER BY stock_id")]
+    return update_indicators(conn, {stock_id: '0001-01-01' for stock_id in stock_ids}, batch_stocks)
+
+
+def get_indicators(conn: sqlite3.Connection, stock_id: int, fields: Optional[List[str]] = None,
+                   start_date: Optional[str] = None, end_date: Optional[str] = None,
+                   tail: Optional[int] = None) -> List[tuple]:
+    """(date, *fields) rows for one stock, oldest first; `tail` keeps only the newest N."""
+    fields = list(fields or INDICATOR_FIELDS)
+    query = f"SELECT date, {', '.join(fields)} FROM indicators WHERE stock_id = ?"
+    params = [stock_id]
+    if start_date:
+        query += " AND date >= ?"
+        params.append(start_date)
+    if end_date:
+        query += " AND date <= ?"
+        params.append(end_date)
+    if tail:
+        query = f"SELECT * FROM ({query} ORDER BY date DESC LIMIT ?) ORDER BY date ASC"
+        params.append(tail)
+    else:
+        query += " ORDER BY date ASC"
+    return conn.execute(query, params).fetchall()
+
+
+if __name__ == "__main__":
+    import db_utils
+
+    parser = argparse.ArgumentParser(description="Maintain the technical indicators table.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all indicators from daily_prices.")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("nothing to do; indicators are updated automatically on every price load (use --rebuild)")
+
+    db_utils.init_db()  # creates the indicators table on databases that predate it
+    start_time = time.time()
+    conn = db_utils.get_connection()
+    try:
+        rows = rebuild_indicators(conn)
+        db_utils.bump_data_version(conn, db_utils.DATA_VERSION_PRICES)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Rebuilt {rows} indicator rows in {time.time() - start_time:.2f} seconds.")
@@ -0,0 +1,419 @@
+"""
+Lightweight in-process metrics rendered in the Prometheus text format.
+
+Histograms, counters and gauges are plain Python objects guarded by a lock,
+so recording a sample costs a few microseconds and is cheap enough to leave
+on in production. The API serves the registry at /metrics. The ingestion
+scripts run in their own processes. Each one writes its registry to
+METRICS_DIR/<script>.prom when it finishes, with a `process` label on every
+sample, and /metrics merges those files in.
+
+What is recorded:
+
+  http_request_duration_seconds   every Flask route (method, route, status)
+  sqlite_query_duration_seconds   every execute/executemany on db_utils connections, up to the first row
+  sqlite_slow_queries_total       statements over SLOW_QUERY_SECONDS, also kept in slow_queries()
+  ingest_stage_duration_seconds   fetch / parse / sentiment / write spans of the ingestion scripts
+  ingest_ticker_seconds_total     the same spans shared out among the tickers they covered
+"""
+import bisect
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Upper bounds (seconds) of the histogram buckets, from a cached API hit to a nightly load stage
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0, 300.0)
+# Statements slower than this (seconds) go to the slow-query log
+SLOW_QUERY_SECONDS = 0.25
+# Slow queries kept in memory for /api/slow_queries
+SLOW_QUERY_LOG = 200
+# Characters of SQL and of its parameters kept per slow-query entry
+SLOW_QUERY_SQL_CHARS = 2000
+SLOW_QUERY_PARAM_CHARS = 500
+# Where the ingestion scripts leave their metrics for /metrics
+METRICS_DIR = "metrics"
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels: tuple, value) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, value: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, *labels) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def items(self) -> List[tuple]:
+        """(label values, total) pairs."""
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; buckets are counted individually and summed when rendered."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        # bisect_left puts a value equal to a bound in that bound's bucket (le = "less or equal")
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def summary(self, *labels) -> Optional[dict]:
+        """{"count", "sum", "p50", "p95"} for one series, quantiles estimated from the bucket bounds."""
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                return None
+            counts, total, count = list(series[0]), series[1], series[2]
+        result = {"count": count, "sum": total}
+        for name, q in (("p50", 0.5), ("p95", 0.95)):
+            target, seen = q * count, 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                seen += n
+                if seen >= target:
+                    result[name] = bound
+                    break
+        return result
+
+    def _samples(self, labels: tuple, value) -> List[str]:
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = 'le="' + _number(bound) + '"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+        plain = _labels(self.label_names, labels)
+        lines.append(f"{self.name}_sum{plain} {_number(total)}")
+        lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class Registry:
+    """The metrics of one process, in registration order."""
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to build a Flask response.", ("method", "route", "status"))
+SQL_QUERY_SECONDS = REGISTRY.histogram(
+    "sqlite_query_duration_seconds", "SQLite execute/executemany time up to the first row.", ("operation",))
+SQL_SLOW_QUERIES = REGISTRY.counter(
+    "sqlite_slow_queries_total", f"Statements slower than {SLOW_QUERY_SECONDS}s.", ("operation",))
+INGEST_STAGE_SECONDS = REGISTRY.histogram(
+    "ingest_stage_duration_seconds", "Duration of one ingestion stage span.", ("script", "stage"))
+INGEST_TICKER_SECONDS = REGISTRY.counter(
+    "ingest_ticker_seconds_total", "Ingestion stage time attributed to each ticker.", ("script", "stage", "ticker"))
+INGEST_RUN_SECONDS = REGISTRY.gauge(
+    "ingest_run_duration_seconds", "Wall-clock duration of the last ingestion run.", ("script",))
+INGEST_LAST_RUN = REGISTRY.gauge(
+    "ingest_last_run_timestamp_seconds", "Unix time the last ingestion run finished.", ("script",))
+
+
+# --- SQLite timing -----------------------------------------------------------
+
+_OPERATION = re.compile(r"\s*(\w+)")
+_OPERATIONS = {"select", "with", "insert", "update", "delete", "replace", "create", "drop", "alter", "pragma",
+               "begin", "commit", "rollback", "explain", "analyze", "vacuum", "savepoint", "release"}
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG)
+_request = threading.local()
+
+
+# SQL text -> operation label; statements are mostly the same few strings
+_operation_cache: Dict[str, str] = {}
+
+
+def _operation(sql: str) -> str:
+    operation = _operation_cache.get(sql)
+    if operation is None:
+        match = _OPERATION.match(sql)
+        word = match.group(1).lower() if match else ""
+        operation = word if word in _OPERATIONS else "other"
+        if len(_operation_cache) >= 4096:
+            _operation_cache.clear()
+        _operation_cache[sql] = operation
+    return operation
+
+
+def record_query(sql: str, params, seconds: float, many: bool = False):
+    """Records one statement's time; slow ones also go to the slow-query log and stderr."""
+    operation = _operation(sql)
+    SQL_QUERY_SECONDS.observe(seconds, operation)
+    request = _request.__dict__
+    if request.get("active"):
+        request["sql_seconds"] += seconds
+        request["queries"] += 1
+    if seconds < SLOW_QUERY_SECONDS:
+        return
+    SQL_SLOW_QUERIES.inc(1, operation)
+    if many:
+        try:
+            params = f"<{len(params)} parameter sets>"
+        except TypeError:
+            params = "<parameter sets>"
+    entry = {
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(seconds, 4),
+        "sql": " ".join(sql.split())[:SLOW_QUERY_SQL_CHARS],
+        "params": repr(params)[:SLOW_QUERY_PARAM_CHARS] if not isinstance(params, str) else params,
+    }
+    _slow_queries.append(entry)
+    print(f"SLOW QUERY {entry['seconds']:.3f}s: {entry['sql'][:200]} {entry['params'][:200]}", file=sys.stderr)
+
+
+def slow_queries() -> List[dict]:
+    """The most recent slow statements, newest first."""
+    return list(reversed(_slow_queries))
+
+
+def begin_request():
+    """Starts counting the current thread's SQL time (see request_sql)."""
+    _request.active = True
+    _request.sql_seconds = 0.0
+    _request.queries = 0
+
+
+def end_request() -> tuple:
+    """Stops counting and returns (seconds, statements) spent in SQLite since begin_request."""
+    _request.active = False
+    return getattr(_request, "sql_seconds", 0.0), getattr(_request, "queries", 0)
+
+
+# --- Ingestion stages --------------------------------------------------------
+
+class Span:
+    """Elapsed seconds of a finished StageTimer.stage block."""
+    seconds = 0.0
+
+
+class StageTimer:
+    """
+    Times the stages of an ingestion run. Each `stage` block is observed in
+    INGEST_STAGE_SECONDS, and its time is shared equally among the tickers
+    passed in, so a batch of 50 downloads charges each ticker a fiftieth.
+    A ticker listed several times (once per article, say) gets that many shares.
+    """
+
+    def __init__(self, script: str):
+        self.script = script
+        self.started = time.time()
+        self.stages: List[str] = []
+
+    @contextmanager
+    def stage(self, name: str, tickers: Iterable[str] = ()):
+        if name not in self.stages:
+            self.stages.append(name)
+        span = Span()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - start
+            INGEST_STAGE_SECONDS.observe(span.seconds, self.script, name)
+            tickers = [ticker for ticker in tickers if ticker]
+            if tickers:
+                share = span.seconds / len(tickers)
+                for ticker in tickers:
+                    INGEST_TICKER_SECONDS.inc(share, self.script, name, ticker)
+
+    def report(self, slowest: int = 3) -> List[str]:
+        """One line per stage: spans, total and quantiles, and the tickers it spent most time on."""
+        per_stage: Dict[str, list] = {}
+        for (script, stage, ticker), seconds in INGEST_TICKER_SECONDS.items():
+            if script == self.script:
+                per_stage.setdefault(stage, []).append((seconds, ticker))
+        lines = []
+        for stage in self.stages:
+            s = INGEST_STAGE_SECONDS.summary(self.script, stage)
+            if s is None:
+                continue
+            line = (f"  {stage:<12} {s['count']:>6} spans {s['sum']:9.2f} s total  "
+                    f"p50 <= {s['p50']:g} s  p95 <= {s['p95']:g} s")
+            top = sorted(per_stage.get(stage, ()), reverse=True)[:slowest]
+            if top:
+                line += "  slowest: " + ", ".join(f"{ticker} {seconds * 1000:.1f} ms" for seconds, ticker in top)
+            lines.append(line)
+        return lines
+
+    def finish(self, directory: Optional[str] = None) -> str:
+        """Records the run's duration and writes the registry to <directory>/<script>.prom. Returns the path."""
+        now = time.time()
+        INGEST_RUN_SECONDS.set(now - self.started, self.script)
+        INGEST_LAST_RUN.set(now, self.script)
+        return write_textfile(self.script, directory)
+
+
+def _add_label(line: str, label: str) -> str:
+    """Adds `label` (name="value") to one sample line."""
+    series, _, value = line.rpartition(" ")
+    if series.endswith("}"):
+        return f"{series[:-1]},{label}}} {value}"
+    return f"{series}{{{label}}} {value}"
+
+
+def write_textfile(script: str, directory: Optional[str] = None) -> str:
+    """
+    Writes this process's metrics to <directory>/<script>.prom (METRICS_DIR,
+    read at call time, by default), each sample labelled process="<script>".
+    """
+    directory = METRICS_DIR if directory is None else directory
+    os.makedirs(directory, exist_ok=True)
+    label = f'process="{_escape(script)}"'
+    lines = [line if line.startswith("#") else _add_label(line, label)
+             for line in REGISTRY.render().splitlines()]
+    path = os.path.join(directory, f"{script}.prom")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def merge_exposition(texts: Iterable[str]) -> str:
+    """
+    Concatenates Prometheus text outputs, grouping every family's samples
+    under one HELP/TYPE header as the format requires.
+    """
+    families: "OrderedDict[str, list]" = OrderedDict()
+    current = None
+    for text in texts:
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            if line.startswith("# "):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    current = parts[2]
+                    family = families.setdefault(current, [[], []])
+                    if not any(l.split(" ", 3)[1] == parts[1] for l in family[0]):
+                        family[0].append(line)
+                continue
+            families.setdefault(current, [[], []])[1].append(line)
+    lines = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def render_all(directory: Optional[str] = None) -> str:
+    """This process's metrics merged with the textfiles the ingestion scripts left in `directory`."""
+    directory = METRICS_DIR if directory is None else directory
+    texts = [REGISTRY.render()]
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".prom"):
+                try:
+                    with open(os.path.join(directory, name)) as f:
+                        texts.append(f.read())
+                except OSError:
+                    continue
+    return merge_exposition(texts)
@@ -0,0 +1,132 @@
+import argparse
+import time
+import db_utils
+from db_utils import get_connection
+
+# Clustered layout: rows are stored in (stock_id, date) order inside the primary
+# key B-tree itself, so a range read for one ticker is a single index range scan
+# with no rowid lookups, and the separate UNIQUE/secondary indexes disappear.
+CLUSTERED_DDL = """
+CREATE TABLE IF NOT EXISTS daily_prices_clustered (
+    stock_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    open REAL,
+    close REAL,
+    high REAL,
+    low REAL,
+    volume INTEGER,
+    PRIMARY KEY (stock_id, date),
+    FOREIGN KEY (stock_id) REFERENCES stocks(id)
+) WITHOUT ROWID
+"""
+
+# While the copy runs, writes to daily_prices are mirrored into the new table so
+# the migration can proceed while update_prices/backfill keep writing.
+MIRROR_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS daily_prices_mirror_insert AFTER INSERT ON daily_prices BEGIN
+        INSERT OR REPLACE INTO daily_prices_clustered (stock_id, date, open, close, high, low, volume)
+        VALUES (NEW.stock_id, NEW.date, NEW.open, NEW.close, NEW.high, NEW.low, NEW.volume);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS daily_prices_mirror_update AFTER UPDATE ON daily_prices BEGIN
+        DELETE FROM daily_prices_clustered WHERE stock_id = OLD.stock_id AND date = OLD.date;
+        INSERT OR REPLACE INTO daily_prices_clustered (stock_id, date, open, close, high, low, volume)
+        VALUES (NEW.stock_id, NEW.date, NEW.open, NEW.close, NEW.high, NEW.low, NEW.volume);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS daily_prices_mirror_delete AFTER DELETE ON daily_prices BEGIN
+        DELETE FROM daily_prices_clustered WHERE stock_id = OLD.stock_id AND date = OLD.date;
+    END
+    """,
+)
+
+MIRROR_TRIGGER_NAMES = ("daily_prices_mirror_insert", "daily_prices_mirror_update", "daily_prices_mirror_delete")
+
+def is_clustered(conn) -> bool:
+    """True if daily_prices already uses the WITHOUT ROWID layout."""
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'daily_prices'"
+    ).fetchone()
+    return bool(row) and "WITHOUT ROWID" in row[0].upper()
+
+def migrate(batch_size: int = 50_000, keep_old: bool = False, pause: float = 0.0):
+    """
+    Copies daily_prices into the clustered layout in batches and swaps the tables.
+    Each batch is its own short transaction, so readers and the ingestion
+    scripts are only blocked for the final rename.
+    """
+    conn = get_connection()
+    conn.isolation_level = None
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    if is_clustered(conn):
+        print("daily_prices already uses the clustered layout.")
+        conn.close()
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(CLUSTERED_DDL)
+    for statement in MIRROR_TRIGGERS:
+        conn.execute(statement)
+    conn.execute("COMMIT")
+
+    total = conn.execute("SELECT COUNT(*) FROM daily_prices").fetchone()[0]
+    print(f"Migrating {total} rows in batches of {batch_size}...")
+
+    start_time = time.time()
+    last_id = 0
+    copied = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        upper, count = conn.execute(
+            "SELECT MAX(id), COUNT(*) FROM (SELECT id FROM daily_prices WHERE id > ? ORDER BY id LIMIT ?)",
+            (last_id, batch_size)
+        ).fetchone()
+        if not count:
+            conn.execute("COMMIT")
+            break
+        # Rows already mirrored by the triggers are at least as new; keep them.
+        conn.execute("""
+            INSERT OR IGNORE INTO daily_prices_clustered (stock_id, date, open, close, high, low, volume)
+            SELECT stock_id, date, open, close, high, low, volume
+            FROM daily_prices
+            WHERE id > ? AND id <= ?
+        """, (last_id, upper))
+        conn.execute("COMMIT")
+        last_id = upper
+        copied += count
+        print(f"  Copied {copied}/{total} rows...")
+        if pause:
+            time.sleep(pause)
+
+    conn.execute("BEGIN IMMEDIATE")
+    for name in MIRROR_TRIGGER_NAMES:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("ALTER TABLE daily_prices RENAME TO daily_prices_rowid")
+    conn.execute("ALTER TABLE daily_prices_clustered RENAME TO daily_prices")
+    if not keep_old:
+        conn.execute("DROP TABLE daily_prices_rowid")
+    conn.execute("COMMIT")
+
+    if not keep_old:
+        print("Reclaiming space from the old table...")
+        conn.execute("VACUUM")
+    conn.close()
+
+    elapsed = time.time() - start_time
+    print(f"Migration complete in {elapsed:.2f} seconds."
+          + (" Old table kept as daily_prices_rowid." if keep_old else ""))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate daily_prices to the clustered WITHOUT ROWID layout.")
+    parser.add_argument("--db", default=db_utils.DB_NAME, help="Database file to migrate.")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Rows copied per transaction.")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches.")
+    parser.add_argument("--keep-old", action="store_true", help="Keep the old table as daily_prices_rowid.")
+    args = parser.parse_args()
+    db_utils.DB_NAME = args.db
+    migrate(batch_size=args.batch_size, keep_old=args.keep_old, pause=args.pause)
@@ -0,0 +1,236 @@
+"""
+Cross-sectional news/price impact analytics.
+
+Daily average sentiment and daily returns for every stock are loaded in two
+queries and pivoted into aligned (trading date x stock) matrices. Same-day
+and lagged correlations (sentiment on day t against the return on trading
+day t+k), over the whole lookback and over a trailing rolling window, are
+then computed for all stocks at once with masked NumPy reductions.
+refresh_news_impact stores the results in news_impact, so /api/news/<ticker>
+only looks them up.
+"""
+import argparse
+import datetime
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Calendar days of history the correlations are computed over.
+LOOKBACK_DAYS = 365
+# Trading days after the news whose returns are correlated with it (lags 1..MAX_LAG).
+MAX_LAG = 5
+# Trading days in the rolling window (about 30 calendar days).
+ROLLING_WINDOW = 21
+# Fewer overlapping days than this give no correlation.
+MIN_DATA_POINTS = 3
+
+
+def _pivot(stock_ids: np.ndarray, dates: np.ndarray, values: np.ndarray,
+           stock_axis: np.ndarray, date_axis: np.ndarray) -> np.ndarray:
+    """Scatters (stock, date, value) rows into a date x stock matrix, NaN where there is no row."""
+    matrix = np.full((len(date_axis), len(stock_axis)), np.nan)
+    rows = np.searchsorted(date_axis, dates)
+    on_grid = rows < len(date_axis)
+    on_grid[on_grid] = date_axis[rows[on_grid]] == dates[on_grid]
+    matrix[rows[on_grid], np.searchsorted(stock_axis, stock_ids[on_grid])] = values[on_grid]
+    return matrix
+
+
+def load_matrices(conn: sqlite3.Connection, since: str, stock_ids: Optional[List[int]] = None) -> dict:
+    """
+    Loads daily average sentiment and daily % change ((close - open) / open)
+    from `since` on. Returns {"dates", "stock_ids", "sentiment", "returns"},
+    both matrices indexed [trading date, stock]. News on days without a price
+    bar (weekends, holidays) has no trading date and is dropped.
+    """
+    if stock_ids is None:
+        stocks_clause, params = "SELECT id FROM stocks", []
+    else:
+        stocks_clause, params = f"VALUES {', '.join(['(?)'] * len(stock_ids))}", list(stock_ids)
+
+    # Both queries seek each stock's range on its (stock_id, ...) index
+    sentiment = conn.execute(f"""
+        WITH ids(stock_id) AS ({stocks_clause})
+        SELECT sn.stock_id, date(sn.published_at) AS news_date, AVG(n.sentiment_score)
+        FROM ids
+        CROSS JOIN stock_news sn ON sn.stock_id = ids.stock_id AND sn.published_at >= ?
+        CROSS JOIN news n ON n.id = sn.news_id
+        GROUP BY sn.stock_id, news_date
+    """, params + [since]).fetchall()
+    prices = conn.execute(f"""
+        WITH ids(stock_id) AS ({stocks_clause})
+        SELECT d.stock_id, d.date, (d.close - d.open) / d.open * 100
+        FROM ids
+        CROSS JOIN daily_prices d ON d.stock_id = ids.stock_id AND d.date >= ?
+    """, params + [since]).fetchall()
+
+    def columns(rows):
+        values = list(zip(*rows)) if rows else [(), (), ()]
+        return (np.array(values[0], dtype=np.int64), np.array(values[1], dtype='datetime64[D]'),
+                np.array([np.nan if v is None else v for v in values[2]], dtype=np.float64))
+
+    s_ids, s_dates, s_values = columns(sentiment)
+    p_ids, p_dates, p_values = columns(prices)
+    date_axis = np.unique(p_dates)
+    stock_axis = np.unique(np.concatenate([s_ids, p_ids]))
+    return {
+        "dates": date_axis,
+        "stock_ids": stock_axis,
+        "sentiment": _pivot(s_ids, s_dates, s_values, stock_axis, date_axis),
+        "returns": _pivot(p_ids, p_dates, p_values, stock_axis, date_axis),
+    }
+
+
+def lagged(returns: np.ndarray, max_lag: int) -> np.ndarray:
+    """(max_lag + 1, dates, stocks) view whose [k, t] is the return on trading day t + k (NaN past the end)."""
+    padded = np.concatenate([returns, np.full((max_lag, returns.shape[1]), np.nan)])
+    return np.moveaxis(np.lib.stride_tricks.sliding_window_view(padded, max_lag + 1, axis=0), -1, 0)
+
+
+def _pearson(n, sx, sy, sxx, syy, sxy):
+    """Pearson r from pair count and sums; NaN below MIN_DATA_POINTS or with zero variance."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        var = (sxx - sx * sx / n) * (syy - sy * sy / n)
+        r = cov / np.sqrt(var)
+    return np.where((n >= MIN_DATA_POINTS) & (var > 1e-12), np.clip(r, -1.0, 1.0), np.nan)
+
+
+def _pair_terms(x: np.ndarray, y: np.ndarray):
+    """Per-cell pair indicator and the products Pearson sums, zeroed where either side is NaN."""
+    both = ~(np.isnan(x) | np.isnan(y))
+    x0 = np.where(both, x, 0.0)
+    y0 = np.where(both, y, 0.0)
+    return both.astype(np.float64), x0, y0, x0 * x0, y0 * y0, x0 * y0
+
+
+def masked_correlation(x: np.ndarray, y: np.ndarray, axis: int = -2):
+    """Correlation of x and y along `axis`, over the positions where both are present. Returns (r, n)."""
+    sums = [term.sum(axis=axis) for term in _pair_terms(x, y)]
+    return _pearson(*sums), sums[0].astype(np.int64)
+
+
+def rolling_correlation(x: np.ndarray, y: np.ndarray, window: int, axis: int = -2):
+    """
+    Correlation over each trailing `window` of positions along `axis`, from
+    running sums, so the cost does not depend on the window. Returns (r, n)
+    with one entry per position (the first window - 1 cover fewer positions).
+    """
+    axis = axis % x.ndim
+    head = (slice(None),) * axis
+    sums = []
+    for term in _pair_terms(x, y):
+        running = np.cumsum(term, axis=axis)
+        # Running sum as of `window` positions earlier, zero before the start
+        earlier = np.zeros_like(running)
+        if window < running.shape[axis]:
+            earlier[head + (slice(window, None),)] = running[head + (slice(None, -window),)]
+        sums.append(running - earlier)
+    return _pearson(*sums), np.rint(sums[0]).astype(np.int64)
+
+
+def compute_impact(conn: sqlite3.Connection, stock_ids: Optional[List[int]] = None,
+                   lookback_days: int = LOOKBACK_DAYS, max_lag: int = MAX_LAG,
+                   window: int = ROLLING_WINDOW, as_of: Optional[str] = None) -> Dict[int, List[dict]]:
+    """
+    Correlations for every stock (or just `stock_ids`). Returns
+    {stock_id: [one dict per lag 0..max_lag]} with keys lag, correlation and
+    data_points (whole lookback) and rolling_correlation / rolling_data_points
+    (the last `window` trading days). Stocks without overlapping news and
+    price days are left out.
+    """
+    end = datetime.date.fromisoformat(as_of) if as_of else datetime.date.today()
+    since = (end - datetime.timedelta(days=lookback_days)).isoformat()
+    matrices = load_matrices(conn, since, stock_ids)
+    if not len(matrices["dates"]):
+        return {}
+
+    sentiment = matrices["sentiment"][np.newaxis]
+    returns = lagged(matrices["returns"], max_lag)
+    correlation, points = masked_correlation(sentiment, returns)
+    rolling, rolling_points = rolling_correlation(sentiment, returns, window)
+    rolling, rolling_points = rolling[:, -1], rolling_points[:, -1]
+
+    impact = {}
+    for column in np.flatnonzero(points.sum(axis=0) > 0):
+        impact[int(matrices["stock_ids"][column])] = [
+            {
+                "lag": lag,
+                "correlation": None if np.isnan(correlation[lag, column]) else float(correlation[lag, column]),
+                "data_points": int(points[lag, column]),
+                "rolling_correlation": None if np.isnan(rolling[lag, column]) else float(rolling[lag, column]),
+                "rolling_data_points": int(rolling_points[lag, column]),
+            }
+            for lag in range(max_lag + 1)
+        ]
+    return impact
+
+
+def store_impact(conn: sqlite3.Connection, impact: Dict[int, List[dict]], replace_all: bool = True) -> int:
+    """Writes compute_impact results to news_impact inside the caller's transaction. Returns rows written."""
+    if replace_all:
+        conn.execute("DELETE FROM news_impact")
+    else:
+        conn.executemany("DELETE FROM news_impact WHERE stock_id = ?", [(stock_id,) for stock_id in impact])
+    computed_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = [
+        (stock_id, lag["lag"], lag["correlation"], lag["data_points"],
+         lag["rolling_correlation"], lag["rolling_data_points"], computed_at)
+        for stock_id, lags in impact.items() for lag in lags
+    ]
+    conn.executemany("""
+        INSERT INTO news_impact (stock_id, lag, correlation, data_points,
+                                 rolling_correlation, rolling_data_points, computed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+def impact_available(conn: sqlite3.Connection) -> bool:
+    """True if the news_impact table exists (it is created by schema.sql)."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_impact'"
+    ).fetchone() is not None
+
+
+def refresh_news_impact(conn: sqlite3.Connection, **kwargs) -> int:
+    """Recomputes news_impact for the whole universe inside the caller's transaction. Returns rows written."""
+    if not impact_available(conn):
+        return 0
+    return store_impact(conn, compute_impact(conn, **kwargs))
+
+
+def load_impact(conn: sqlite3.Connection, stock_id: int) -> Optional[List[dict]]:
+    """Stored lags for one stock, or None if news_impact has nothing for it (or does not exist yet)."""
+    try:
+        rows = conn.execute("""
+            SELECT lag, correlation, data_points, rolling_correlation, rolling_data_points, computed_at
+            FROM news_impact WHERE stock_id = ? ORDER BY lag
+        """, (stock_id,)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    if not rows:
+        return None
+    keys = ("lag", "correlation", "data_points", "rolling_correlation", "rolling_data_points", "computed_at")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+if __name__ == "__main__":
+    import db_utils
+
+    parser = argparse.ArgumentParser(description="Recompute the news_impact table for all stocks.")
+    parser.add_argument("--lookback", type=int, default=LOOKBACK_DAYS, help="Calendar days of history.")
+    args = parser.parse_args()
+
+    db_utils.init_db()  # creates news_impact on databases that predate it
+    start_time = time.time()
+    conn = db_utils.get_connection()
+    try:
+        rows = refresh_news_impact(conn, lookback_days=args.lookback)
+        db_utils.bump_data_version(conn, db_utils.DATA_VERSION_NEWS)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Stored {rows} news impact rows in {time.time() - start_time:.2f} seconds.")
@@ -0,0 +1,193 @@
+import argparse
+import re
+import sqlite3
+import time
+from typing import List, Optional
+
+# Relative bm25 weight of a match in the headline vs the summary.
+HEADLINE_WEIGHT = 2.0
+SUMMARY_WEIGHT = 1.0
+# Tokens of context around matches in a snippet.
+SNIPPET_TOKENS = 16
+MAX_PAGE_SIZE = 100
+# Most recent matches ranked per query. Ranking cost grows with the number of
+# matches, so frequent terms are ranked within their newest SEARCH_WINDOW hits.
+SEARCH_WINDOW = 2000
+
+# Quoted phrases, or single terms with an optional trailing * for prefix search
+_QUERY_TOKEN = re.compile(r'"([^"]+)"|(\w+\*?)', re.UNICODE)
+
+
+def search_available(conn: sqlite3.Connection) -> bool:
+    """True if the news_fts index exists (it is created by schema.sql)."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_fts'"
+    ).fetchone() is not None
+
+
+def build_match_query(text: str) -> str:
+    """
+    Turns free text into an FTS5 MATCH expression: every word or "quoted
+    phrase" must appear, and a trailing * makes a word a prefix. Anything
+    else is dropped, so user input can never be an FTS5 syntax error.
+    """
+    terms = []
+    for phrase, word in _QUERY_TOKEN.findall(text or ""):
+        if phrase:
+            words = re.findall(r"\w+", phrase, re.UNICODE)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+        elif word.endswith("*"):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{word}"')
+    return " AND ".join(terms)
+
+
+def _page_rows(conn: sqlite3.Connection, match: str, date_from: Optional[str], date_to: Optional[str],
+               limit: int, offset: int) -> List[tuple]:
+    """(news_id, bm25) of one page of matches, best first."""
+    filters, params = "", []
+    if date_from:
+        filters += " AND n.published_at >= ?"
+        params.append(date_from)
+    if date_to:
+        filters += " AND n.published_at < date(?, '+1 day')"
+        params.append(date_to)
+
+    # Every article in the date range has an id in [MIN(id), MAX(id)] of the
+    # range, which the index can seek to. Ids follow insertion time, not
+    # publish time (old articles fetched late get high ids), so the range is
+    # only a bound and the exact published_at filter still applies
+    low, high = 0, 2 ** 63 - 1
+    join = "JOIN news n ON n.id = f.rowid" if filters else ""
+    if filters:
+        low, high = conn.execute(f"SELECT MIN(n.id), MAX(n.id) FROM news n WHERE 1 {filters}", params).fetchone()
+        if low is None:
+            return []
+
+    # Scoring is linear in the number of matches; rank only the newest
+    # SEARCH_WINDOW of them that pass the filters (walking ids newest first is cheap)
+    window = max(SEARCH_WINDOW, limit + offset)
+    cutoff = conn.execute(f"""
+        SELECT f.rowid FROM news_fts f
+        {join}
+        WHERE news_fts MATCH ? AND f.rowid BETWEEN ? AND ? {filters}
+        ORDER BY f.rowid DESC LIMIT 1 OFFSET ?
+    """, [match, low, high] + params + [window - 1]).fetchone()
+    if cutoff is not None:
+        low = cutoff[0]
+
+    return conn.execute(f"""
+        SELECT f.rowid, bm25(news_fts, {HEADLINE_WEIGHT}, {SUMMARY_WEIGHT}, 0.0) AS score
+        FROM news_fts f
+        {join}
+        WHERE news_fts MATCH ? AND f.rowid BETWEEN ? AND ? {filters}
+        ORDER BY score LIMIT ? OFFSET ?
+    """, [match, low, high] + params + [limit, offset]).fetchall()
+
+
+def search_news(conn: sqlite3.Connection, text: str, ticker: Optional[str] = None,
+                date_from: Optional[str] = None, date_to: Optional[str] = None,
+                page: int = 1, page_size: int = 20) -> dict:
+    """
+    Ranked full-text search over news headlines and summaries (bm25, headline
+    matches weighted higher). Optional filters: a ticker the article is linked
+    to, and a published_at range of YYYY-MM-DD dates, both inclusive. Only the
+    newest SEARCH_WINDOW matches are ranked. Returns one page of results plus
+    whether another page follows.
+    """
+    terms = build_match_query(text)
+    if not terms:
+        raise ValueError("Query has no searchable terms")
+    page = max(1, page)
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    match = f"{{headline summary}} : ({terms})"
+    if ticker:
+        # Linked tickers are indexed too, so the filter is intersected inside the index
+        match += ' AND tickers : "' + ticker.replace('"', '') + '"'
+
+    # One extra row tells whether there is a next page without counting every match
+    ranked = _page_rows(conn, match, date_from, date_to, page_size + 1, (page - 1) * page_size)
+
+    results = []
+    for news_id, score in ranked[:page_size]:
+        # Snippets are only built for the rows returned; one rowid probe each
+        row = conn.execute(f"""
+            SELECT n.headline, n.url, n.publisher, n.published_at, n.sentiment_score, n.tickers,
+                   snippet(news_fts, -1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS})
+            FROM news_fts f
+            JOIN news n ON n.id = f.rowid
+            WHERE news_fts MATCH ? AND f.rowid = ?
+        """, (f"{{headline summary}} : ({terms})", news_id)).fetchone()
+        results.append({
+            "id": news_id,
+            "headline": row[0],
+            "url": row[1],
+            "publisher": row[2],
+            "published_at": row[3],
+            "sentiment": row[4],
+            "tickers": row[5].split() if row[5] else [],
+            "snippet": row[6],
+            # bm25 is negative, lower is better; flipped so higher is better
+            "score": round(-score, 4),
+        })
+
+    return {
+        "query": terms,
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(ranked) > page_size,
+        "results": results,
+    }
+
+
+def index_is_current(conn: sqlite3.Connection) -> bool:
+    """True if every news row is in the index (false after news_fts is added to an existing database)."""
+    indexed = conn.execute("SELECT COUNT(*) FROM news_fts_docsize").fetchone()[0]
+    return indexed == conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+
+
+def rebuild_index(conn: sqlite3.Connection):
+    """
+    Re-derives news.tickers from stock_news and re-indexes every news row.
+    Triggers keep both in sync after that.
+    """
+    # Empty the index; the update trigger then re-inserts every row as it is rewritten
+    conn.execute("INSERT INTO news_fts(news_fts) VALUES ('delete-all')")
+    conn.execute("""
+        UPDATE news SET tickers = (
+            SELECT group_concat(s.ticker, ' ') FROM stock_news sn JOIN stocks s ON s.id = sn.stock_id
+            WHERE sn.news_id = news.id
+        )
+    """)
+    conn.execute("INSERT INTO news_fts(news_fts) VALUES ('optimize')")
+
+
+if __name__ == "__main__":
+    import db_utils
+
+    parser = argparse.ArgumentParser(description="Maintain or query the news full-text index.")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index all news (after upgrading a database).")
+    parser.add_argument("query", nargs="?", help="Search the index and print the top matches.")
+    args = parser.parse_args()
+    if not args.rebuild and not args.query:
+        parser.error("nothing to do; pass --rebuild or a query")
+
+    db_utils.init_db()  # creates news_fts and its triggers on databases that predate them
+    conn = db_utils.get_connection()
+    try:
+        if args.rebuild:
+            start_time = time.time()
+            rebuild_index(conn)
+            conn.commit()
+            print(f"Indexed {conn.execute('SELECT COUNT(*) FROM news').fetchone()[0]} articles "
+                  f"in {time.time() - start_time:.2f} seconds.")
+        elif not index_is_current(conn):
+            print("The index is missing articles; run with --rebuild first.")
+        if args.query:
+            for result in search_news(conn, args.query)["results"]:
+                print(f"{result['score']:8.3f}  {result['published_at']}  {result['headline']}")
+    finally:
+        conn.close()
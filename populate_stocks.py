@@ -1,40 +1,122 @@
+import argparse
+import json
+import os
+import re
+import time
+from typing import Dict, Optional, Tuple
+
 import pandas as pd
-from db_utils import add_stock, init_db
+from db_utils import init_db, sync_stocks
 
 NIFTY_500_URL = "https://raw.githubusercontent.com/kprohith/nse-stock-analysis/master/ind_nifty500list.csv"
+# Local copy of the Nifty 500 list; downloaded from NIFTY_500_URL when missing
+NIFTY_500_CSV = "ind_nifty500list.csv"
+# BSE scrip code -> company name map (about 5k entries), loaded as "<code>.BO"
+SCRIP_CODES_JSON = "stk.json"
+
+# Trailing words dropped from company names before matching them across sources
+COMPANY_SUFFIXES = {"ltd", "limited", "co", "company", "corp", "corporation", "inc", "pvt", "private", "plc"}
+
+Universe = Dict[str, Tuple[str, Optional[str]]]
+
+def load_nifty_csv(path: str = NIFTY_500_CSV) -> Universe:
+    """
+    Reads the Nifty 500 CSV ('Company Name', 'Industry', 'Symbol', ...) as
+    {"<Symbol>.BO": (name, industry)}. Downloads and saves it first if `path` does not exist.
+    """
+    if not os.path.exists(path):
+        print(f"Downloading stock list from {NIFTY_500_URL}...")
+        pd.read_csv(NIFTY_500_URL).to_csv(path, index=False)
+    df = pd.read_csv(path, dtype=str)
+    df = df.dropna(subset=['Symbol', 'Company Name'])
+    tickers = df['Symbol'].str.strip() + '.BO'
+    names = df['Company Name'].str.strip()
+    sectors = df['Industry'].str.strip() if 'Industry' in df else pd.Series(None, index=df.index)
+    return dict(zip(tickers, zip(names, [s if isinstance(s, str) and s else None for s in sectors])))
+
+def load_scrip_codes(path: str = SCRIP_CODES_JSON) -> Universe:
+    """Reads the {scrip code: name} map as {"<code>.BO": (name, None)}; it carries no sectors."""
+    with open(path) as f:
+        codes = json.load(f)
+    return {f"{code}.BO": (name.strip(), None) for code, name in codes.items() if name and name.strip()}
+
+def company_key(name: str) -> str:
+    """
+    Normalizes a company name for matching across sources: "HOUSING DEVELOPMENT
+    FINANCE CORP.LTD." and "Housing Development Finance Corporation Ltd." both
+    become "housing development finance".
+    """
+    words = re.sub(r"[^a-z0-9]+", " ", name.lower().replace("&", " and ")).split()
+    if words and words[0] == "the":
+        words = words[1:]
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+def merge_universes(*universes: Universe) -> Universe:
+    """
+    Combines sources; a ticker keeps the first source's name and the first
+    non-empty sector. The same company listed under another ticker by a later
+    source (a BSE scrip code next to its Nifty symbol) is left out, so each
+    company is only fetched and stored once.
+    """
+    merged: Universe = {}
+    companies: Dict[str, str] = {}
+    for universe in universes:
+        seen = {}
+        for ticker, (name, sector) in universe.items():
+            key = company_key(name)
+            if ticker not in merged:
+                if companies.get(key, ticker) != ticker:
+                    continue
+                merged[ticker] = (name, sector)
+            elif merged[ticker][1] is None and sector is not None:
+                merged[ticker] = (merged[ticker][0], sector)
+            seen.setdefault(key, ticker)
+        for key, ticker in seen.items():
+            companies.setdefault(key, ticker)
+    return merged
+
+def populate_stocks(csv_path: Optional[str] = NIFTY_500_CSV, scrip_codes_path: Optional[str] = SCRIP_CODES_JSON,
+                    deactivate_missing: bool = True) -> Dict[str, int]:
+    """
+    Syncs the stocks table with the Nifty 500 CSV and the BSE scrip code map
+    (either source can be skipped with None) in one transaction. Stocks in
+    neither source are marked inactive unless deactivate_missing is False.
+    Returns the {ticker: id} map.
+    """
+    start_time = time.time()
+    sources = []
+    if csv_path:
+        sources.append(load_nifty_csv(csv_path))
+        print(f"Found {len(sources[-1])} stocks in {csv_path}.")
+    if scrip_codes_path:
+        sources.append(load_scrip_codes(scrip_codes_path))
+        print(f"Found {len(sources[-1])} scrip codes in {scrip_codes_path}.")
+    universe = merge_universes(*sources)
+    if len(sources) > 1:
+        print(f"{len(set().union(*sources)) - len(universe)} scrip codes skipped as listed under a Nifty symbol.")
+    if not universe:
+        # An empty source would otherwise deactivate every stock
+        raise ValueError("No stocks found in the given sources")
 
-def populate_stocks():
-    print(f"Downloading stock list from {NIFTY_500_URL}...")
-    try:
-        # Read CSV directly from URL
-        df = pd.read_csv(NIFTY_500_URL)
-        
-        # Expecting columns: 'Company Name', 'Industry', 'Symbol', 'Series', 'ISIN Code'
-        # We will use Symbol + '.BO' for BSE ticker
-        
-        print(f"Found {len(df)} stocks in the list.")
-        
-        count = 0
-        for index, row in df.iterrows():
-            symbol = row.get('Symbol')
-            name = row.get('Company Name')
-            sector = row.get('Industry')
-            
-            if symbol and name:
-                ticker = f"{symbol}.BO"
-                stock_id = add_stock(ticker, name, sector)
-                if stock_id:
-                    count += 1
-                    if count % 50 == 0:
-                        print(f"Added {count} stocks...")
-                else:
-                    print(f"Failed to add {ticker}")
-                    
-        print(f"Population complete. Total stocks added: {count}")
-
-    except Exception as e:
-        print(f"Error downloading or processing stock list: {e}")
+    ids, stats = sync_stocks(universe, deactivate_missing=deactivate_missing)
+    print(f"Population complete in {time.time() - start_time:.2f} seconds: {stats['inserted']} added, "
+          f"{stats['renamed']} renamed, {stats['sector_changed']} sector changes, "
+          f"{stats['reactivated']} reactivated, {stats['deactivated']} deactivated "
+          f"({stats['active']} active of {len(ids)}).")
+    return ids
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the stocks table with the Nifty 500 list and BSE scrip codes.")
+    parser.add_argument("--csv", default=NIFTY_500_CSV, help="Nifty 500 CSV (downloaded here if missing).")
+    parser.add_argument("--scrip-codes", default=SCRIP_CODES_JSON, help="BSE scrip code JSON map.")
+    parser.add_argument("--no-csv", action="store_true", help="Skip the Nifty 500 CSV.")
+    parser.add_argument("--no-scrip-codes", action="store_true", help="Skip the BSE scrip code map.")
+    parser.add_argument("--keep-missing", action="store_true",
+                        help="Leave stocks missing from the sources active instead of deactivating them.")
+    args = parser.parse_args()
     init_db()  # Ensure DB is created
-    populate_stocks()
+    populate_stocks(csv_path=None if args.no_csv else args.csv,
+                    scrip_codes_path=None if args.no_scrip_codes else args.scrip_codes,
+                    deactivate_missing=not args.keep_missing)
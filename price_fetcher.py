@@ -0,0 +1,233 @@
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from metrics import StageTimer
+
+# Tickers per yf.download call. Yahoo handles ~50 symbols per request comfortably.
+DEFAULT_CHUNK_SIZE = 50
+# Sustained download calls per second, and how many may be issued back to back.
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 2
+# How many times a failed ticker is retried (each time in a chunk half as large).
+DEFAULT_MAX_RETRIES = 3
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+    Tokens refill continuously at `rate` per second up to `capacity`; `acquire`
+    blocks only for as long as it takes for enough tokens to become available.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: float = DEFAULT_BURST,
+                 clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Takes `tokens` from the bucket, sleeping if necessary. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(self._clock())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.waited += waited
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+class YFinanceProvider:
+    """Downloads OHLCV for several tickers with a single yf.download call."""
+
+    def download(self, tickers: List[str], **kwargs) -> pd.DataFrame:
+        return yf.download(tickers, group_by='ticker', progress=False, **kwargs)
+
+
+class FakeProvider:
+    """
+    Local stand-in for YFinanceProvider used for benchmarks and offline runs.
+    Produces deterministic synthetic bars per ticker in the same wide layout
+    yf.download returns with group_by='ticker', optionally simulating request
+    latency and tickers that fail to download.
+    """
+
+    def __init__(self, latency: float = 0.0, per_ticker_latency: float = 0.0,
+                 missing: Optional[set] = None, end_date: Optional[str] = None):
+        self.latency = latency
+        self.per_ticker_latency = per_ticker_latency
+        self.missing = set(missing or ())
+        self.end_date = pd.Timestamp(end_date) if end_date else pd.Timestamp.today().normalize()
+        self.calls = 0
+
+    def _dates(self, period: Optional[str], start: Optional[str], end: Optional[str]) -> pd.DatetimeIndex:
+        end_ts = pd.Timestamp(end) - pd.Timedelta(days=1) if end else self.end_date
+        if start:
+            start_ts = pd.Timestamp(start)
+        else:
+            period = period or '1mo'
+            for suffix in ('mo', 'd', 'y'):
+                if period.endswith(suffix):
+                    n = int(period[:-len(suffix)])
+                    break
+            else:
+                raise ValueError(f"Unsupported period: {period}")
+            if suffix == 'd':
+                # yfinance counts trading days for short periods
+                return pd.bdate_range(end=end_ts, periods=n, name='Date')
+            offset = pd.DateOffset(months=n) if suffix == 'mo' else pd.DateOffset(years=n)
+            start_ts = end_ts - offset
+        return pd.bdate_range(start_ts, end_ts, name='Date')
+
+    def frame_for(self, ticker: str, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        """Synthetic OHLCV for one ticker; the same date always yields the same bar."""
+        seed = zlib.crc32(ticker.encode())
+        base = 50 + seed % 3000
+        phase = (seed % 1000) / 1000.0
+        # Derive each bar from its own date so overlapping windows agree
+        day = dates.values.astype('datetime64[D]').astype(np.int64).astype(np.float64)
+        close = base * (1 + 0.3 * np.sin(day / 180.0 + phase) + 0.05 * np.sin(day / 7.0 + 3 * phase))
+        open_ = close * (1 + 0.01 * np.sin(day * 1.3 + phase))
+        high = np.maximum(open_, close) * 1.01
+        low = np.minimum(open_, close) * 0.99
+        volume = (1e5 * (2 + np.sin(day / 3.0 + phase))).astype(np.int64)
+        return pd.DataFrame(
+            {'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+            index=dates
+        )
+
+    def download(self, tickers: List[str], period: Optional[str] = None,
+                 start: Optional[str] = None, end: Optional[str] = None, **kwargs) -> pd.DataFrame:
+        self.calls += 1
+        delay = self.latency + self.per_ticker_latency * len(tickers)
+        if delay:
+            time.sleep(delay)
+        dates = self._dates(period, start, end)
+        frames = {}
+        for ticker in tickers:
+            if ticker in self.missing:
+                # yfinance reports failed symbols as all-NaN columns
+                frames[ticker] = pd.DataFrame(np.nan, index=dates, columns=PRICE_COLUMNS)
+            else:
+                frames[ticker] = self.frame_for(ticker, dates)
+        return pd.concat(frames, axis=1)
+
+
+def split_frame(frame: pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """
+    Splits a wide multi-ticker download into one OHLCV frame per ticker.
+    Tickers with no usable rows are left out of the result.
+    """
+    result = {}
+    if frame is None or frame.empty:
+        return result
+
+    if isinstance(frame.columns, pd.MultiIndex):
+        # group_by='ticker' puts the ticker on level 0; tolerate the other order too
+        level = 0 if set(tickers) & set(frame.columns.get_level_values(0)) else 1
+        available = set(frame.columns.get_level_values(level))
+        for ticker in tickers:
+            if ticker not in available:
+                continue
+            sub = frame.xs(ticker, axis=1, level=level)
+            sub = sub.dropna(how='all', subset=[c for c in ('Open', 'Close') if c in sub.columns])
+            if not sub.empty:
+                result[ticker] = sub
+    elif len(tickers) == 1:
+        sub = frame.dropna(how='all', subset=[c for c in ('Open', 'Close') if c in frame.columns])
+        if not sub.empty:
+            result[tickers[0]] = sub
+    return result
+
+
+class PriceFetcher:
+    """
+    Downloads prices for many stocks in chunks, one provider call per chunk.
+    Calls are paced by a shared TokenBucket instead of fixed sleeps. Tickers that
+    fail (an exception or no rows) are retried in progressively smaller chunks;
+    whatever still fails ends up in `failed`. Downloads and frame splitting
+    are timed as the "fetch" and "parse" stages of `timer`.
+    """
+
+    def __init__(self, provider=None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 limiter: Optional[TokenBucket] = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 timer: Optional[StageTimer] = None):
+        self.provider = provider or YFinanceProvider()
+        self.timer = timer or StageTimer("price_fetcher")
+        self.chunk_size = max(1, chunk_size)
+        self.limiter = limiter or TokenBucket()
+        self.max_retries = max_retries
+        self.failed: List[Tuple[int, str]] = []
+        self.requests = 0
+
+    def _download_chunk(self, chunk: List[Tuple[int, str]], download_kwargs: dict) -> Dict[str, pd.DataFrame]:
+        tickers = [ticker for _, ticker in chunk]
+        self.limiter.acquire()
+        self.requests += 1
+        try:
+            with self.timer.stage("fetch", tickers):
+                frame = self.provider.download(tickers, **download_kwargs)
+        except Exception as e:
+            print(f"  ERROR downloading chunk of {len(tickers)} ({tickers[0]}...): {e}")
+            return {}
+        with self.timer.stage("parse", tickers):
+            return split_frame(frame, tickers)
+
+    def fetch(self, stocks: List[Tuple[int, str]], **download_kwargs) -> Iterator[Tuple[int, str, pd.DataFrame]]:
+        """
+        Yields (stock_id, ticker, df) for every stock that returned data.
+        `download_kwargs` (period, start, end, ...) are passed to the provider.
+        """
+        self.failed = []
+        pending = [(list(stocks), self.chunk_size, 0)]
+        while pending:
+            batch, size, attempt = pending.pop(0)
+            retry = []
+            for offset in range(0, len(batch), size):
+                chunk = batch[offset:offset + size]
+                frames = self._download_chunk(chunk, download_kwargs)
+                for stock_id, ticker in chunk:
+                    df = frames.get(ticker)
+                    if df is None:
+                        retry.append((stock_id, ticker))
+                    else:
+                        yield stock_id, ticker, df
+            if not retry:
+                continue
+            if attempt < self.max_retries:
+                pending.append((retry, max(1, size // 2), attempt + 1))
+            else:
+                self.failed.extend(retry)
+
+    def fetch_batches(self, stocks: List[Tuple[int, str]], **download_kwargs) -> Iterator[List[Tuple[int, str, pd.DataFrame]]]:
+        """Like `fetch`, but yields lists of up to `chunk_size` results so callers can save them together."""
+        batch = []
+        for item in self.fetch(stocks, **download_kwargs):
+            batch.append(item)
+            if len(batch) >= self.chunk_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
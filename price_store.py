@@ -0,0 +1,335 @@
+"""
+Columnar on-disk copy of daily_prices for research and backtests.
+
+Every OHLCV field is a float64 .npy file shaped (date x stock), NaN where a
+stock has no bar, next to dates.npy (datetime64[D]) and stock_ids.npy, in a
+generation directory under the store. meta.json at the top names that
+directory and holds the used extents, tickers and the prices data version
+the store matches. Files are preallocated in DATE_CHUNK / STOCK_CHUNK steps,
+so a nightly sync appends dates in place, past the extents readers use. A
+rebuild writes a new generation and switches to it by replacing meta.json,
+so readers see the old store or the new one, never a mix. Readers memory-map the files and get views: a
+whole field is never copied into the process.
+
+sync_price_store runs after a price load. It writes just the touched rows
+when the store was current before the load and the load only appended dates
+or stocks, and rebuilds otherwise (a revised bar is never rewritten in place).
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Sequence, Union
+
+import numpy as np
+
+PRICE_STORE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+# Allocation steps of the date and stock axes
+DATE_CHUNK = 256
+STOCK_CHUNK = 64
+# Rows fetched from SQLite per chunk while filling the store
+FETCH_ROWS = 100_000
+
+_META = "meta.json"
+# Prefix of the generation directories holding the arrays
+_GENERATION = "gen-"
+
+
+def _round_up(n: int, step: int) -> int:
+    return max(step, -(-n // step) * step)
+
+
+class PriceStore:
+    """An open store: `dates`, `stock_ids`, `tickers` and one (date x stock) memmap view per field."""
+
+    def __init__(self, path: str, meta: dict, mode: str = 'r'):
+        self.path = path
+        self.meta = meta
+        n_dates, n_stocks = meta['n_dates'], meta['n_stocks']
+        # Stores built before generations keep their arrays next to meta.json
+        data = os.path.join(path, meta.get('generation', ''))
+        self._dates = np.load(os.path.join(data, 'dates.npy'), mmap_mode=mode)
+        self._stock_ids = np.load(os.path.join(data, 'stock_ids.npy'), mmap_mode=mode)
+        self._fields = {field: np.load(os.path.join(data, f'{field}.npy'), mmap_mode=mode)
+                        for field in PRICE_STORE_FIELDS}
+        self.dates = self._dates[:n_dates]
+        self.stock_ids = self._stock_ids[:n_stocks]
+        self.tickers = meta['tickers']
+        self.fields = {field: array[:n_dates, :n_stocks] for field, array in self._fields.items()}
+        self._columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @staticmethod
+    def open_meta(path: str) -> Optional[dict]:
+        """The store's meta.json, or None if it has not been built."""
+        try:
+            with open(os.path.join(path, _META)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def open(cls, path: str, mode: str = 'r') -> Optional['PriceStore']:
+        """Opens the store at `path`, or returns None if it has not been built."""
+        meta = cls.open_meta(path)
+        return None if meta is None else cls(path, meta, mode)
+
+    @property
+    def data_version(self) -> int:
+        return self.meta['data_version']
+
+    def date_slice(self, start: Optional[str] = None, end: Optional[str] = None) -> slice:
+        """Rows of the dates in [start, end] (ISO dates, either open)."""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, 'D'),
+                                                                    side='right'))
+        return slice(lo, hi)
+
+    def column(self, ticker: str) -> int:
+        """Column of a ticker. Raises KeyError if the store has no prices for it."""
+        return self._columns[ticker]
+
+    def view(self, tickers: Union[str, Sequence[str], None] = None, start: Optional[str] = None,
+             end: Optional[str] = None, fields: Iterable[str] = PRICE_STORE_FIELDS) -> dict:
+        """
+        {"dates", "tickers", <field>: array} for a date range. A single ticker
+        gives 1-D views and None (every stock) gives (date x stock) views, both
+        without copying. A list of tickers is gathered into (date x stock)
+        copies, since its columns are not evenly spaced.
+        """
+        rows = self.date_slice(start, end)
+        if tickers is None:
+            columns, names = slice(None), list(self.tickers)
+        elif isinstance(tickers, str):
+            columns, names = self.column(tickers), [tickers]
+        else:
+            names = list(tickers)
+            columns = np.array([self.column(t) for t in names], dtype=np.intp)
+        result = {"dates": self.dates[rows], "tickers": names}
+        for field in fields:
+            result[field] = self.fields[field][rows, columns]
+        return result
+
+
+def _fetch_rows(conn: sqlite3.Connection, query: str, params: Sequence = ()):
+    """Yields (stock_ids, dates, {field: values}) column chunks of an ordered price query."""
+    cursor = conn.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(FETCH_ROWS)
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        values = {field: np.array(column, dtype=np.float64)
+                  for field, column in zip(PRICE_STORE_FIELDS, columns[2:])}
+        yield np.array(columns[0], dtype=np.int64), np.array(columns[1], dtype='datetime64[D]'), values
+
+
+def _write_meta(path: str, meta: dict):
+    """Replaces meta.json atomically; readers see the old or the new extents, never a mix."""
+    tmp = os.path.join(path, _META + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, _META))
+
+
+def _prices_version(conn: sqlite3.Connection) -> int:
+    try:
+        row = conn.execute("SELECT version FROM data_version WHERE name = 'prices'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def _tickers(conn: sqlite3.Connection, stock_ids: np.ndarray) -> list:
+    names = dict(conn.execute("SELECT id, ticker FROM stocks").fetchall())
+    return [names.get(stock_id, str(stock_id)) for stock_id in stock_ids.tolist()]
+
+
+def _remove_generations(path: str, keep: Iterable[str]):
+    """
+    Deletes generation directories not in `keep`, and the arrays of a store
+    built before generations once it is no longer kept ("" in `keep`).
+    """
+    keep = set(keep)
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if name.startswith(_GENERATION) and name not in keep:
+            shutil.rmtree(full, ignore_errors=True)
+        elif name.endswith(".npy") and "" not in keep:
+            os.remove(full)
+
+
+def rebuild_price_store(conn: sqlite3.Connection, path: str) -> int:
+    """
+    Writes the whole of daily_prices to a new generation of the store at
+    `path` and switches to it with one replace of meta.json. Open readers keep
+    their old mapping; the generation they use is kept until the next
+    rebuild, so a reader between reading meta.json and mapping the arrays
+    still finds them. Returns the number of bars written.
+    """
+    os.makedirs(path, exist_ok=True)
+    previous = PriceStore.open_meta(path)
+    generation = f"{_GENERATION}{time.time_ns()}"
+    data = os.path.join(path, generation)
+    os.makedirs(data)
+    version = _prices_version(conn)
+    date_axis = np.array([row[0] for row in conn.execute("SELECT DISTINCT date FROM daily_prices ORDER BY date")],
+                         dtype='datetime64[D]')
+    stock_axis = np.array([row[0] for row in conn.execute(
+        "SELECT id FROM stocks WHERE EXISTS (SELECT 1 FROM daily_prices WHERE stock_id = stocks.id) ORDER BY id"
+    )], dtype=np.int64)
+    shape = (_round_up(len(date_axis), DATE_CHUNK), _round_up(len(stock_axis), STOCK_CHUNK))
+
+    def create(name, dtype, file_shape, fill):
+        array = np.lib.format.open_memmap(os.path.join(data, name), mode='w+', dtype=dtype, shape=file_shape)
+        array[:] = fill
+        return array
+
+    dates = create('dates.npy', 'datetime64[D]', (shape[0],), np.datetime64('NaT'))
+    dates[:len(date_axis)] = date_axis
+    stock_ids = create('stock_ids.npy', np.int64, (shape[1],), -1)
+    stock_ids[:len(stock_axis)] = stock_axis
+    fields = {field: create(f'{field}.npy', np.float64, shape, np.nan) for field in PRICE_STORE_FIELDS}
+
+    written = 0
+    for ids, bar_dates, values in _fetch_rows(conn, f"""
+        SELECT stock_id, date, {', '.join(PRICE_STORE_FIELDS)} FROM daily_prices ORDER BY stock_id, date
+    """):
+        rows = np.searchsorted(date_axis, bar_dates)
+        columns = np.searchsorted(stock_axis, ids)
+        for field, array in fields.items():
+            array[rows, columns] = values[field]
+        written += len(ids)
+
+    for array in [dates, stock_ids] + list(fields.values()):
+        array.flush()
+    del dates, stock_ids, fields
+    _write_meta(path, {
+        "generation": generation,
+        "n_dates": len(date_axis),
+        "n_stocks": len(stock_axis),
+        "tickers": _tickers(conn, stock_axis),
+        "data_version": version,
+    })
+    kept = [generation]
+    if previous is not None:
+        kept.append(previous.get('generation', ''))
+    _remove_generations(path, kept)
+    return written
+
+
+def _update_price_store(conn: sqlite3.Connection, store: PriceStore, touched: Dict[int, str]) -> Optional[int]:
+    """
+    Writes the bars of `touched` (stock_id -> earliest changed date) into an
+    open read-write store. Only dates and stocks past the extents in
+    meta.json are written, which readers cannot see until meta.json is
+    replaced. Returns the bars written, or None if the change does not fit
+    that way (a revised bar already visible to readers, a date before the end
+    of the axis, a stock id below the last one, or a full axis) and the store
+    must be rebuilt.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS price_store_scope (stock_id INTEGER PRIMARY KEY, from_date TEXT)")
+    conn.execute("DELETE FROM temp.price_store_scope")
+    conn.executemany("INSERT INTO temp.price_store_scope VALUES (?, ?)", touched.items())
+    chunks = list(_fetch_rows(conn, f"""
+        SELECT d.stock_id, d.date, {', '.join('d.' + f for f in PRICE_STORE_FIELDS)}
+        FROM temp.price_store_scope s
+        CROSS JOIN daily_prices d ON d.stock_id = s.stock_id AND d.date >= s.from_date
+        ORDER BY d.stock_id, d.date
+    """))
+    conn.execute("DELETE FROM temp.price_store_scope")
+    if not chunks:
+        return 0
+    ids = np.concatenate([chunk[0] for chunk in chunks])
+    bar_dates = np.concatenate([chunk[1] for chunk in chunks])
+
+    n_dates, n_stocks = len(store.dates), len(store.stock_ids)
+    new_dates = np.setdiff1d(bar_dates, store.dates)
+    new_ids = np.setdiff1d(ids, store.stock_ids)
+    # Writing over a visible bar would let a reader see a half-written revision
+    revised = n_dates and np.any((bar_dates <= store.dates[-1]) & np.isin(ids, store.stock_ids))
+    if revised or (n_dates and len(new_dates) and new_dates[0] <= store.dates[-1]) or \
+            (n_stocks and len(new_ids) and new_ids[0] <= store.stock_ids[-1]) or \
+            n_dates + len(new_dates) > len(store._dates) or n_stocks + len(new_ids) > len(store._stock_ids):
+        return None
+
+    store._dates[n_dates:n_dates + len(new_dates)] = new_dates
+    store._stock_ids[n_stocks:n_stocks + len(new_ids)] = new_ids
+    date_axis = store._dates[:n_dates + len(new_dates)]
+    stock_axis = store._stock_ids[:n_stocks + len(new_ids)]
+    written = 0
+    for chunk_ids, chunk_dates, values in chunks:
+        rows = np.searchsorted(date_axis, chunk_dates)
+        columns = np.searchsorted(stock_axis, chunk_ids)
+        for field, array in store._fields.items():
+            array[rows, columns] = values[field]
+        written += len(chunk_ids)
+    for array in [store._dates, store._stock_ids] + list(store._fields.values()):
+        array.flush()
+    tickers = store.tickers + _tickers(conn, new_ids) if len(new_ids) else store.tickers
+    _write_meta(store.path, {
+        **({"generation": store.meta['generation']} if 'generation' in store.meta else {}),
+        "n_dates": len(date_axis),
+        "n_stocks": len(stock_axis),
+        "tickers": tickers,
+        "data_version": _prices_version(conn),
+    })
+    return written
+
+
+def sync_price_store(conn: sqlite3.Connection, path: str, touched: Optional[Dict[int, str]] = None) -> int:
+    """
+    Brings the store at `path` up to date with daily_prices after a committed
+    load. If the store matched the prices data version just before the load
+    (one bump behind), only the `touched` bars are written; if it already
+    matches, nothing is. Anything else rebuilds it. Returns bars written.
+    """
+    version = _prices_version(conn)
+    store = PriceStore.open(path, mode='r+')
+    if store is not None:
+        if store.data_version == version:
+            return 0
+        if touched and store.data_version == version - 1:
+            written = _update_price_store(conn, store, touched)
+            if written is not None:
+                return written
+    return rebuild_price_store(conn, path)
+
+
+_open_stores: Dict[str, tuple] = {}
+
+
+def open_price_store(path: str) -> Optional[PriceStore]:
+    """Read-only store at `path`, reopened only when a sync has replaced its meta.json. None if not built."""
+    try:
+        stamp = os.stat(os.path.join(path, _META)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _open_stores.get(path)
+    if cached is None or cached[0] != stamp:
+        store = PriceStore.open(path)
+        if store is None:
+            return None
+        _open_stores[path] = cached = (stamp, store)
+    return cached[1]
+
+
+if __name__ == "__main__":
+    import db_utils
+
+    parser = argparse.ArgumentParser(description="Build or sync the memory-mapped columnar price store.")
+    parser.add_argument("--rebuild", action="store_true", help="Rewrite the whole store from daily_prices.")
+    parser.add_argument("--path", default=db_utils.PRICE_STORE_DIR)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    conn = db_utils.get_connection()
+    try:
+        if args.rebuild:
+            bars = rebuild_price_store(conn, args.path)
+        else:
+            bars = sync_price_store(conn, args.path)
+    finally:
+        conn.close()
+    print(f"Wrote {bars} bars to {args.path} in {time.time() - start_time:.2f} seconds.")
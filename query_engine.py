@@ -0,0 +1,212 @@
+"""
+Guarded execution of ad-hoc SQL for /api/execute_sql.
+
+Queries run on a dedicated pool of read-only connections, behind a bounded
+thread pool, so a heavy query can neither write nor take connections or
+threads from the chart and news endpoints. An authorizer admits only
+reads. Each query gets a time budget, enforced by a progress handler that
+interrupts SQLite, and each page is capped in rows and bytes. Results are
+paged with cursor tokens that re-run the query and skip the rows already
+returned. Every result carries the statement's EXPLAIN QUERY PLAN.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import db_utils
+from db_utils import ConnectionPool, decode_cursor, encode_cursor
+
+# Queries running at once; more wait in the queue
+QUERY_WORKERS = 2
+# Queries allowed to wait for a worker before new ones are refused
+QUERY_QUEUE = 8
+# Wall-clock budget of one query, in seconds
+QUERY_TIME_BUDGET = 5.0
+# Rows and approximate JSON bytes per page
+MAX_PAGE_ROWS = 1000
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+# SQLite VM instructions between time budget checks
+PROGRESS_STEPS = 10_000
+# Rows pulled from the cursor per fetchmany
+FETCH_ROWS = 500
+
+# Authorizer actions a read-only query needs; everything else is denied
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+
+class QueryError(Exception):
+    """A query that cannot be run; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _authorize(action, *args):
+    return sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def _json_value(value):
+    """Row values as JSON-safe types; BLOBs are summarized rather than sent."""
+    if isinstance(value, bytes):
+        return f"<blob {len(value)} bytes>"
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _value_size(value) -> int:
+    """Rough JSON size of a value, for the page byte cap."""
+    if value is None:
+        return 4
+    if isinstance(value, str):
+        return len(value) + 2
+    return len(str(value))
+
+
+def _query_hash(sql: str) -> str:
+    return hashlib.sha1(sql.encode()).hexdigest()[:16]
+
+
+def format_plan(rows) -> List[str]:
+    """EXPLAIN QUERY PLAN rows (id, parent, notused, detail) as lines indented by depth."""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+class QueryEngine:
+    """Runs read-only SQL with a time budget and paged, size-capped results on a bounded worker pool."""
+
+    def __init__(self, db_name: str, workers: int = QUERY_WORKERS, queue: int = QUERY_QUEUE,
+                 time_budget: float = QUERY_TIME_BUDGET, max_rows: int = MAX_PAGE_ROWS,
+                 max_bytes: int = MAX_PAGE_BYTES):
+        self.time_budget = time_budget
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._pool = ConnectionPool(db_name, readonly=True, max_size=workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        # Running plus queued queries
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def execute(self, sql: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> dict:
+        """
+        Runs one SELECT and returns a page: {"columns", "data", "plan",
+        "row_count", "truncated", "next_cursor", "elapsed_ms"}. `cursor` is
+        the next_cursor of the previous page of the same query. Raises
+        QueryError (400 invalid, 403 not read-only, 408 over budget, 503 busy).
+        """
+        sql = sql.strip().rstrip(';').strip()
+        if not sql:
+            raise QueryError("No query provided")
+        offset = 0
+        if cursor:
+            try:
+                query_hash, offset = decode_cursor(cursor, str, int)
+            except ValueError as e:
+                raise QueryError(str(e))
+            if query_hash != _query_hash(sql) or offset < 0:
+                raise QueryError("Cursor does not belong to this query")
+        try:
+            limit = int(limit or self.max_rows)
+        except (TypeError, ValueError):
+            raise QueryError("limit must be a number")
+        limit = self.max_rows if limit < 1 else min(limit, self.max_rows)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise QueryError("Too many queries running; try again shortly", 503)
+        try:
+            return self._executor.submit(self._run, sql, offset, limit).result()
+        finally:
+            self._slots.release()
+
+    def _run(self, sql: str, offset: int, limit: int) -> dict:
+        conn = self._pool.acquire()
+        started = time.perf_counter()
+        deadline = started + self.time_budget
+        conn.set_authorizer(_authorize)
+        conn.set_progress_handler(lambda: 1 if time.perf_counter() > deadline else 0, PROGRESS_STEPS)
+        try:
+            plan = format_plan(conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall())
+            cursor = conn.execute(sql)
+            if cursor.description is None:
+                raise QueryError("Only queries that return rows are allowed", 403)
+            columns = [d[0] for d in cursor.description]
+
+            skipped = 0
+            while skipped < offset:
+                chunk = cursor.fetchmany(min(FETCH_ROWS, offset - skipped))
+                if not chunk:
+                    break
+                skipped += len(chunk)
+
+            rows, size, truncated = [], 2, False
+            while len(rows) < limit:
+                chunk = cursor.fetchmany(min(FETCH_ROWS, limit - len(rows)))
+                if not chunk:
+                    break
+                for row in chunk:
+                    row = [_json_value(v) for v in row]
+                    size += sum(_value_size(v) + 1 for v in row) + 2
+                    if rows and size > self.max_bytes:
+                        truncated = True
+                        break
+                    rows.append(row)
+                if truncated:
+                    break
+            more = truncated or (len(rows) == limit and cursor.fetchone() is not None)
+        except sqlite3.Error as e:
+            if str(e) == "interrupted":
+                with self._lock:
+                    self.timeouts += 1
+                raise QueryError(f"Query exceeded its {self.time_budget:g}s time budget", 408)
+            if str(e) == "not authorized" or "readonly" in str(e):
+                raise QueryError("Only read-only SELECT statements are allowed", 403)
+            raise QueryError(str(e))
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.set_authorizer(None)
+            self._pool.release(conn)
+
+        with self._lock:
+            self.completed += 1
+        return {
+            "columns": columns,
+            "data": rows,
+            "plan": plan,
+            "row_count": len(rows),
+            "offset": offset,
+            "truncated": truncated,
+            "next_cursor": encode_cursor(_query_hash(sql), offset + len(rows)) if more else None,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {"completed": self.completed, "timeouts": self.timeouts, "rejected": self.rejected}
+        return {**counters, "pool": self._pool.stats()}
+
+
+_engines: Dict[str, QueryEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_query_engine() -> QueryEngine:
+    """Returns the shared engine for the current DB_NAME, creating it on first use."""
+    with _engines_lock:
+        engine = _engines.get(db_utils.DB_NAME)
+        if engine is None:
+            engine = _engines[db_utils.DB_NAME] = QueryEngine(db_utils.DB_NAME)
+        return engine
@@ -0,0 +1,368 @@
+"""
+Intraday quotes: a background poller, per-ticker ring buffers and push fan-out.
+
+QuotePoller refreshes the quotes of every ticker someone is subscribed to
+(plus an optional fixed watchlist) every POLL_INTERVAL seconds, in batches
+through a pluggable provider paced by a TokenBucket. Quotes land in
+QuoteCache, which keeps a fixed-size NumPy ring buffer per ticker. Only
+quotes whose price or volume changed are published to QuoteHub. The hub
+serializes each delta once and hands every subscriber the deltas of the
+tickers it asked for. A subscriber that falls behind keeps only the newest
+quote per ticker, so a slow browser costs bounded memory and never blocks
+the poller. The API reads the cache and the hub only; no request waits on
+the provider.
+"""
+import json
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import yfinance as yf
+
+from metrics import REGISTRY
+from price_fetcher import TokenBucket, split_frame
+
+# Seconds between polls of the watched tickers
+POLL_INTERVAL = 5.0
+# Tickers per provider call, and how fast calls may be issued
+QUOTE_BATCH = 100
+QUOTE_RATE = 2.0
+QUOTE_BURST = 4
+# Quotes kept per ticker (about 40 minutes at the default interval)
+RING_SIZE = 512
+# Tickers one subscriber may follow
+MAX_SUBSCRIPTION = 50
+
+QUOTE_POLL_SECONDS = REGISTRY.histogram("quote_poll_duration_seconds", "One poll of every watched ticker.")
+QUOTE_PUBLISH_SECONDS = REGISTRY.histogram("quote_publish_duration_seconds", "Fan-out of one poll's deltas.")
+QUOTE_SUBSCRIBERS = REGISTRY.gauge("quote_subscribers", "Open quote subscriptions.")
+
+
+class Quote(NamedTuple):
+    ticker: str
+    ts: float        # Unix time of the quote
+    price: float
+    volume: float    # Day volume so far
+
+
+class YFinanceQuoteProvider:
+    """Latest 1-minute bar and day volume per ticker, from one yf.download call per batch."""
+
+    def quotes(self, tickers: List[str]) -> List[Quote]:
+        frame = yf.download(tickers, period="1d", interval="1m", group_by='ticker', progress=False)
+        result = []
+        for ticker, df in split_frame(frame, tickers).items():
+            df = df.dropna(subset=['Close'])
+            if not df.empty:
+                result.append(Quote(ticker, df.index[-1].timestamp(), float(df['Close'].iloc[-1]),
+                                    float(df['Volume'].sum())))
+        return result
+
+
+class FakeQuoteProvider:
+    """
+    Local stand-in for YFinanceQuoteProvider for tests, benchmarks and offline
+    runs. Every ticker follows its own deterministic random walk; on each call
+    only `move_share` of the tickers get a new price, so most polls carry few
+    deltas, as on a real exchange.
+    """
+
+    def __init__(self, latency: float = 0.0, move_share: float = 0.3, seed: int = 0):
+        self.latency = latency
+        self.move_share = move_share
+        self.seed = seed
+        self.calls = 0
+        self._state: Dict[str, list] = {}
+
+    def quotes(self, tickers: List[str]) -> List[Quote]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        now = time.time()
+        result = []
+        for ticker in tickers:
+            state = self._state.get(ticker)
+            if state is None:
+                key = zlib.crc32(ticker.encode()) ^ self.seed
+                state = self._state[ticker] = [np.random.default_rng(key), 50.0 + key % 3000, 0.0]
+            rng = state[0]
+            if rng.random() < self.move_share:
+                state[1] = round(state[1] * (1 + rng.normal(0, 0.001)), 2)
+                state[2] += float(rng.integers(100, 5000))
+            result.append(Quote(ticker, now, state[1], state[2]))
+        return result
+
+
+class QuoteRing:
+    """The last `size` quotes of one ticker in preallocated arrays, oldest overwritten first."""
+
+    def __init__(self, size: int = RING_SIZE):
+        self.ts = np.zeros(size)
+        self.price = np.zeros(size)
+        self.volume = np.zeros(size)
+        self.count = 0
+
+    def append(self, ts: float, price: float, volume: float):
+        i = self.count % len(self.ts)
+        self.ts[i], self.price[i], self.volume[i] = ts, price, volume
+        self.count += 1
+
+    def last(self) -> Optional[tuple]:
+        if not self.count:
+            return None
+        i = (self.count - 1) % len(self.ts)
+        return self.ts[i], self.price[i], self.volume[i]
+
+    def history(self) -> Dict[str, list]:
+        """Stored quotes, oldest first, as {"ts", "price", "volume"} lists."""
+        n = min(self.count, len(self.ts))
+        order = (np.arange(self.count - n, self.count)) % len(self.ts)
+        return {"ts": self.ts[order].tolist(), "price": self.price[order].tolist(),
+                "volume": self.volume[order].tolist()}
+
+
+class QuoteCache:
+    """Ring buffer per ticker plus each ticker's reference (previous close) for change figures."""
+
+    def __init__(self, ring_size: int = RING_SIZE):
+        self.ring_size = ring_size
+        self.rings: Dict[str, QuoteRing] = {}
+        self.references: Dict[str, float] = {}
+        self.seq = 0
+        self._lock = threading.Lock()
+
+    def _delta(self, ticker: str, ts: float, price: float, volume: float) -> dict:
+        delta = {"ticker": ticker, "ts": ts, "price": price, "volume": volume, "seq": self.seq}
+        reference = self.references.get(ticker)
+        if reference:
+            delta["change"] = round(price - reference, 4)
+            delta["change_pct"] = round(100 * (price / reference - 1), 3)
+        return delta
+
+    def update(self, quotes: Iterable[Quote]) -> List[dict]:
+        """Appends the quotes that differ from each ticker's last one. Returns them as deltas."""
+        deltas = []
+        with self._lock:
+            for quote in quotes:
+                ring = self.rings.get(quote.ticker)
+                if ring is None:
+                    ring = self.rings[quote.ticker] = QuoteRing(self.ring_size)
+                last = ring.last()
+                if last is not None and last[1] == quote.price and last[2] == quote.volume:
+                    continue
+                ring.append(quote.ts, quote.price, quote.volume)
+                self.seq += 1
+                deltas.append(self._delta(*quote))
+        return deltas
+
+    def latest(self, tickers: Iterable[str]) -> Dict[str, dict]:
+        """{ticker: last quote as a delta} for the tickers that have one."""
+        result = {}
+        with self._lock:
+            for ticker in tickers:
+                ring = self.rings.get(ticker)
+                last = ring.last() if ring is not None else None
+                if last is not None:
+                    result[ticker] = self._delta(ticker, *(float(v) for v in last))
+        return result
+
+    def history(self, ticker: str) -> Optional[Dict[str, list]]:
+        with self._lock:
+            ring = self.rings.get(ticker)
+            return ring.history() if ring is not None else None
+
+
+class Subscription:
+    """
+    One client's feed. `get` blocks until deltas for its tickers arrive and
+    returns them as {ticker: JSON text}. Undelivered deltas are coalesced to
+    the newest per ticker.
+    """
+
+    def __init__(self, tickers: Iterable[str]):
+        self.tickers = frozenset(tickers)
+        self.closed = False
+        self.coalesced = 0
+        self._pending: Dict[str, str] = {}
+        self._cond = threading.Condition()
+
+    def _offer(self, payloads: Dict[str, str]):
+        with self._cond:
+            self.coalesced += len(payloads.keys() & self._pending.keys())
+            self._pending.update(payloads)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Dict[str, str]:
+        """Pending deltas, waiting up to `timeout` seconds for some; {} on timeout or close."""
+        with self._cond:
+            if not self._pending and not self.closed:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, {}
+            return pending
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def event_data(payloads: Dict[str, str]) -> str:
+    """{ticker: delta JSON} as one JSON object, without re-serializing the deltas."""
+    return "{" + ",".join(f"{json.dumps(ticker)}:{payload}" for ticker, payload in payloads.items()) + "}"
+
+
+class QuoteHub:
+    """Routes published deltas to the subscriptions that follow their tickers."""
+
+    def __init__(self):
+        self._by_ticker: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.subscribers = 0
+        self.published = 0
+
+    def subscribe(self, tickers: Iterable[str]) -> Subscription:
+        subscription = Subscription(tickers)
+        with self._lock:
+            for ticker in subscription.tickers:
+                self._by_ticker.setdefault(ticker, set()).add(subscription)
+            self.subscribers += 1
+            QUOTE_SUBSCRIBERS.set(self.subscribers)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        with self._lock:
+            for ticker in subscription.tickers:
+                followers = self._by_ticker.get(ticker)
+                if followers is not None:
+                    followers.discard(subscription)
+                    if not followers:
+                        del self._by_ticker[ticker]
+            self.subscribers -= 1
+            QUOTE_SUBSCRIBERS.set(self.subscribers)
+
+    def watched(self) -> set:
+        with self._lock:
+            return set(self._by_ticker)
+
+    def publish(self, deltas: List[dict]) -> int:
+        """Hands each subscriber its share of `deltas` in one call. Returns the subscribers reached."""
+        if not deltas:
+            return 0
+        start = time.perf_counter()
+        batches: Dict[Subscription, Dict[str, str]] = {}
+        with self._lock:
+            for delta in deltas:
+                followers = self._by_ticker.get(delta["ticker"])
+                if not followers:
+                    continue
+                payload = json.dumps(delta, separators=(',', ':'))
+                for subscription in followers:
+                    batches.setdefault(subscription, {})[delta["ticker"]] = payload
+        for subscription, payloads in batches.items():
+            subscription._offer(payloads)
+        self.published += len(deltas)
+        QUOTE_PUBLISH_SECONDS.observe(time.perf_counter() - start)
+        return len(batches)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"subscribers": self.subscribers, "tickers": len(self._by_ticker), "published": self.published}
+
+
+class QuotePoller:
+    """
+    Background thread that polls the hub's watched tickers (plus `watchlist`)
+    every `interval` seconds and publishes what changed. `reference_loader`,
+    if given, is called with tickers seen for the first time and returns
+    {ticker: previous close} for the change figures. `reference_key`, if
+    given, is called before every poll; when its value changes (a new
+    trading day, new closes stored) every reference is loaded again.
+    """
+
+    def __init__(self, cache: QuoteCache, hub: QuoteHub, provider=None, interval: float = POLL_INTERVAL,
+                 batch_size: int = QUOTE_BATCH, limiter: Optional[TokenBucket] = None,
+                 watchlist: Iterable[str] = (),
+                 reference_loader: Optional[Callable[[List[str]], Dict[str, float]]] = None,
+                 reference_key: Optional[Callable[[], object]] = None):
+        self.cache = cache
+        self.hub = hub
+        self.provider = provider or YFinanceQuoteProvider()
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.limiter = limiter or TokenBucket(QUOTE_RATE, QUOTE_BURST)
+        self.watchlist = set(watchlist)
+        self.reference_loader = reference_loader
+        self.reference_key = reference_key
+        self.polls = 0
+        self.errors = 0
+        self._referenced = set()
+        self._reference_key = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll_once(self) -> int:
+        """Polls every watched ticker once. Returns the number of deltas published."""
+        tickers = sorted(self.hub.watched() | self.watchlist)
+        if not tickers:
+            return 0
+        start = time.perf_counter()
+        if self.reference_loader is not None and self.reference_key is not None:
+            try:
+                key = self.reference_key()
+            except Exception as e:
+                print(f"Error checking reference closes: {e}")
+            else:
+                if key != self._reference_key:
+                    self._reference_key = key
+                    self._referenced.clear()
+        fresh = [ticker for ticker in tickers if ticker not in self._referenced]
+        if fresh and self.reference_loader is not None:
+            try:
+                self.cache.references.update(self.reference_loader(fresh))
+                self._referenced.update(fresh)
+            except Exception as e:
+                print(f"Error loading reference closes: {e}")
+        published = 0
+        for offset in range(0, len(tickers), self.batch_size):
+            batch = tickers[offset:offset + self.batch_size]
+            self.limiter.acquire()
+            try:
+                quotes = self.provider.quotes(batch)
+            except Exception as e:
+                print(f"Error polling quotes for {len(batch)} tickers ({batch[0]}...): {e}")
+                self.errors += 1
+                continue
+            deltas = self.cache.update(quotes)
+            self.hub.publish(deltas)
+            published += len(deltas)
+        self.polls += 1
+        QUOTE_POLL_SECONDS.observe(time.perf_counter() - start)
+        return published
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Quote poll failed: {e}")
+                self.errors += 1
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="quote-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self) -> dict:
+        return {"running": self._thread is not None and self._thread.is_alive(), "polls": self.polls,
+                "errors": self.errors, "interval": self.interval, **self.hub.stats()}
@@ -0,0 +1,141 @@
+"""
+Vectorized OHLCV resampling and line downsampling for chart queries.
+
+All functions take columns as NumPy arrays sorted by date, with dates as
+datetime64[D]. Nothing here touches the database.
+"""
+from typing import Dict
+
+import numpy as np
+
+INTERVALS = ('1w', '1M')
+
+# How each field is combined when bars are merged into one.
+AGGREGATIONS = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+}
+
+
+def period_start(dates: np.ndarray, interval: str) -> np.ndarray:
+    """Maps each date to the start of its period: the Monday of its week ('1w') or the 1st of its month ('1M')."""
+    days = dates.astype('datetime64[D]')
+    if interval == '1w':
+        # 1970-01-01 was a Thursday, so (day + 3) % 7 is the weekday with Monday = 0
+        day_numbers = days.astype(np.int64)
+        return (day_numbers - (day_numbers + 3) % 7).astype('datetime64[D]')
+    if interval == '1M':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown interval: {interval}. Allowed: {', '.join(INTERVALS)}")
+
+
+def period_bounds(date: str, interval: str):
+    """First and last calendar day (ISO strings) of the period containing `date`."""
+    start = period_start(np.array([date], dtype='datetime64[D]'), interval)[0]
+    if interval == '1w':
+        end = start + np.timedelta64(6, 'D')
+    else:
+        end = (start.astype('datetime64[M]') + np.timedelta64(1, 'M')).astype('datetime64[D]') - np.timedelta64(1, 'D')
+    return str(start), str(end)
+
+
+def group_starts(keys: np.ndarray) -> np.ndarray:
+    """Indices where a run of equal (sorted) keys begins."""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+
+
+def aggregate(columns: Dict[str, np.ndarray], keys: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Merges consecutive rows sharing a key into one bar per key.
+    'date' becomes the key; other fields follow AGGREGATIONS (first open,
+    max high, min low, last close, summed volume). NaNs are ignored.
+    """
+    starts = group_starts(keys)
+    if len(starts) == 0:
+        return {name: values[:0] for name, values in columns.items()}
+    ends = np.concatenate((starts[1:], [len(keys)])) - 1
+    result = {}
+    for name, values in columns.items():
+        if name == 'date':
+            result[name] = keys[starts]
+            continue
+        how = AGGREGATIONS[name]
+        values = np.asarray(values, dtype=np.float64)
+        if how == 'first':
+            result[name] = values[starts]
+        elif how == 'last':
+            result[name] = values[ends]
+        elif how == 'max':
+            result[name] = np.fmax.reduceat(values, starts)
+        elif how == 'min':
+            result[name] = np.fmin.reduceat(values, starts)
+        else:
+            result[name] = np.add.reduceat(np.nan_to_num(values), starts)
+    return result
+
+
+def resample(columns: Dict[str, np.ndarray], interval: str) -> Dict[str, np.ndarray]:
+    """Calendar OHLCV bars ('1w' or '1M') labelled with their period start."""
+    return aggregate(columns, period_start(columns['date'], interval))
+
+
+def bucket_ohlcv(columns: Dict[str, np.ndarray], max_points: int) -> Dict[str, np.ndarray]:
+    """
+    Merges consecutive bars into at most `max_points` equal-count buckets,
+    each labelled with the date of its first bar.
+    """
+    n = len(columns['date'])
+    if n <= max_points:
+        return columns
+    buckets = np.arange(n) * max_points // n
+    result = aggregate(columns, buckets)
+    result['date'] = columns['date'][group_starts(buckets)]
+    return result
+
+
+def lttb(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: returns the indices of `threshold` points
+    that best preserve the visual shape of the series `y` (x is the index).
+    The first and last points are always kept.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    x = np.arange(n, dtype=np.float64)
+
+    # Interior points split into threshold - 2 buckets
+    edges = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    starts, ends = edges[:-1], edges[1:]
+    # Average point of each bucket, used as the third triangle vertex
+    sums = np.add.reduceat(y[:n - 1], starts)
+    counts = ends - starts
+    avg_y = np.append(sums / counts, y[-1])
+    avg_x = np.append((starts + ends - 1) / 2.0, n - 1)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        bx, by = x[start:end], y[start:end]
+        # Twice the triangle area formed with the previous pick and the next bucket's average
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_line(columns: Dict[str, np.ndarray], max_points: int, value_field: str) -> Dict[str, np.ndarray]:
+    """Keeps the LTTB-selected rows of every column, choosing points by `value_field`."""
+    keep = lttb(columns[value_field], max_points)
+    if len(keep) == len(columns['date']):
+        return columns
+    return {name: values[keep] for name, values in columns.items()}
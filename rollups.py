@@ -0,0 +1,148 @@
+import argparse
+import sqlite3
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from resample import aggregate, group_starts, period_start
+
+# Materialized OHLCV rollups of daily_prices, one table per interval.
+ROLLUP_TABLES = {
+    '1w': 'weekly_prices',
+    '1M': 'monthly_prices',
+}
+
+PRICE_FIELDS = ('open', 'close', 'high', 'low', 'volume')
+
+# Day numbers stay below this until the year 2243, so stock_id * KEY_SPAN + day
+# is a sort-preserving composite key.
+KEY_SPAN = 100_000
+
+REBUILD_BATCH_STOCKS = 100
+
+
+def rollups_available(conn: sqlite3.Connection) -> bool:
+    """True if the rollup tables exist (they are created by schema.sql)."""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({})".format(
+            ", ".join("?" * len(ROLLUP_TABLES))),
+        tuple(ROLLUP_TABLES.values())
+    )]
+    return len(names) == len(ROLLUP_TABLES)
+
+
+def rollup_complete(conn: sqlite3.Connection, interval: str, stock_id: int) -> bool:
+    """
+    True if the rollup table holds a stock's bars back to its first daily row.
+    On databases upgraded without --rebuild, price loads only add the periods
+    they touch, so the older history is missing until a rebuild.
+    """
+    table = ROLLUP_TABLES[interval]
+    first_period = conn.execute(f"SELECT MIN(period_start) FROM {table} WHERE stock_id = ?", (stock_id,)).fetchone()[0]
+    first_day = conn.execute("SELECT MIN(date) FROM daily_prices WHERE stock_id = ?", (stock_id,)).fetchone()[0]
+    return first_period is not None and first_day is not None and first_period <= first_day
+
+
+def _load_daily(conn: sqlite3.Connection, scope: Dict[int, str]) -> Dict[str, np.ndarray]:
+    """Daily rows for each stock in `scope` from its start date on, ordered by (stock_id, date)."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS rollup_scope (stock_id INTEGER PRIMARY KEY, from_date TEXT)")
+    conn.execute("DELETE FROM temp.rollup_scope")
+    conn.executemany("INSERT INTO temp.rollup_scope (stock_id, from_date) VALUES (?, ?)", scope.items())
+    rows = conn.execute("""
+        SELECT d.stock_id, d.date, d.open, d.close, d.high, d.low, d.volume
+        FROM temp.rollup_scope s
+        JOIN daily_prices d ON d.stock_id = s.stock_id AND d.date >= s.from_date
+        ORDER BY d.stock_id, d.date
+    """).fetchall()
+    conn.execute("DELETE FROM temp.rollup_scope")
+
+    columns = list(zip(*rows)) if rows else [()] * 7
+    return {
+        'stock_id': np.array(columns[0], dtype=np.int64),
+        'date': np.array(columns[1], dtype='datetime64[D]'),
+        **{field: np.array(values, dtype=np.float64) for field, values in zip(PRICE_FIELDS, columns[2:])},
+    }
+
+
+def _refresh_interval(conn: sqlite3.Connection, interval: str, touched: Dict[int, str]) -> int:
+    table = ROLLUP_TABLES[interval]
+    # Recompute every period from the one containing the earliest touched date
+    firsts = np.array(list(touched.values()), dtype='datetime64[D]')
+    scope = dict(zip(touched.keys(), np.datetime_as_string(period_start(firsts, interval), unit='D').tolist()))
+
+    daily = _load_daily(conn, scope)
+    periods = period_start(daily['date'], interval).astype(np.int64)
+    keys = daily['stock_id'] * KEY_SPAN + periods
+    bars = aggregate({field: daily[field] for field in PRICE_FIELDS}, keys)
+    starts = group_starts(keys)
+    counts = np.diff(np.append(starts, len(keys)))
+    period_keys = keys[starts]
+
+    conn.executemany(
+        f"DELETE FROM {table} WHERE stock_id = ? AND period_start >= ?",
+        scope.items()
+    )
+    conn.executemany(
+        f"""
+        INSERT INTO {table} (stock_id, period_start, open, close, high, low, volume, bars)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        zip(
+            (period_keys // KEY_SPAN).tolist(),
+            np.datetime_as_string((period_keys % KEY_SPAN).astype('datetime64[D]'), unit='D').tolist(),
+            *[_nullable(bars[field]) for field in ('open', 'close', 'high', 'low')],
+            bars['volume'].astype(np.int64).tolist(),
+            counts.tolist(),
+        )
+    )
+    return len(period_keys)
+
+
+def _nullable(values: np.ndarray) -> List:
+    """Float array to a list with NaN as None (stored as NULL)."""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def refresh_rollups(conn: sqlite3.Connection, touched: Dict[int, str]) -> int:
+    """
+    Recomputes the weekly and monthly bars affected by daily rows written since
+    the last refresh. `touched` maps stock_id to the earliest daily date that
+    was inserted or changed; only periods from that date on are rebuilt.
+    Runs inside the caller's transaction. Returns the number of rollup rows written.
+    """
+    if not touched or not rollups_available(conn):
+        return 0
+    return sum(_refresh_interval(conn, interval, touched) for interval in ROLLUP_TABLES)
+
+
+def rebuild_rollups(conn: sqlite3.Connection, batch_stocks: int = REBUILD_BATCH_STOCKS) -> int:
+    """Recomputes both rollup tables from scratch, a batch of stocks at a time."""
+    for table in ROLLUP_TABLES.values():
+        conn.execute(f"DELETE FROM {table}")
+    stock_ids = [row[0] for row in conn.execute("SELECT DISTINCT stock_id FROM daily_prices ORDER BY stock_id")]
+    written = 0
+    for offset in range(0, len(stock_ids), batch_stocks):
+        batch = stock_ids[offset:offset + batch_stocks]
+        written += refresh_rollups(conn, {stock_id: '0001-01-01' for stock_id in batch})
+    return written
+
+
+if __name__ == "__main__":
+    import db_utils
+
+    parser = argparse.ArgumentParser(description="Maintain the weekly/monthly price rollup tables.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all rollups from daily_prices.")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("nothing to do; rollups are refreshed automatically on every price load (use --rebuild)")
+
+    db_utils.init_db()  # creates the rollup tables on databases that predate them
+    start_time = time.time()
+    conn = db_utils.get_connection()
+    try:
+        rows = rebuild_rollups(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Rebuilt {rows} rollup rows in {time.time() - start_time:.2f} seconds.")
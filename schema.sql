@@ -17,7 +17,6 @@ CREATE TABLE IF NOT EXISTS daily_prices (
     FOREIGN KEY (stock_id) REFERENCES stocks(id),
     UNIQUE(stock_id, date)
 );
-CREATE INDEX IF NOT EXISTS idx_daily_prices_stock_date ON daily_prices(stock_id, date);
 CREATE TABLE IF NOT EXISTS news (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     headline TEXT NOT NULL,
@@ -25,12 +24,164 @@ CREATE TABLE IF NOT EXISTS news (
     url TEXT UNIQUE,
     publisher TEXT,
     published_at TEXT,
-    sentiment_score REAL
+    sentiment_score REAL,
+    content_hash TEXT,
+    tickers TEXT
 );
+CREATE INDEX IF NOT EXISTS idx_news_content_hash ON news(content_hash);
+CREATE INDEX IF NOT EXISTS idx_news_published_at ON news(published_at);
 CREATE TABLE IF NOT EXISTS stock_news (
     stock_id INTEGER,
     news_id INTEGER,
+    published_at TEXT,
     FOREIGN KEY (stock_id) REFERENCES stocks(id),
     FOREIGN KEY (news_id) REFERENCES news(id),
     PRIMARY KEY (stock_id, news_id)
-);
\ No newline at end of file
+);
+-- stock_news.published_at copies news.published_at ('' when unknown, so undated
+-- articles sort last and keyset cursors never compare NULLs). The news feeds
+-- walk these indexes newest first instead of sorting the news join.
+CREATE INDEX IF NOT EXISTS idx_stock_news_stock_published ON stock_news(stock_id, published_at, news_id);
+CREATE INDEX IF NOT EXISTS idx_stock_news_published ON stock_news(published_at, news_id, stock_id);
+CREATE INDEX IF NOT EXISTS idx_stock_news_news ON stock_news(news_id);
+CREATE TRIGGER IF NOT EXISTS stock_news_published_insert AFTER INSERT ON stock_news
+WHEN new.published_at IS NULL BEGIN
+    UPDATE stock_news SET published_at = coalesce((SELECT published_at FROM news WHERE id = new.news_id), '')
+    WHERE stock_id = new.stock_id AND news_id = new.news_id;
+END;
+CREATE TRIGGER IF NOT EXISTS news_published_update AFTER UPDATE OF published_at ON news BEGIN
+    UPDATE stock_news SET published_at = coalesce(new.published_at, '') WHERE news_id = new.id;
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+    headline,
+    summary,
+    tickers,
+    content='news',
+    content_rowid='id',
+    tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+    INSERT INTO news_fts(rowid, headline, summary, tickers) VALUES (new.id, new.headline, new.summary, new.tickers);
+END;
+-- Rows stored before news_fts existed are not indexed until rebuilt; deleting
+-- them from the index would corrupt it, hence the docsize check
+CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+    INSERT INTO news_fts(news_fts, rowid, headline, summary, tickers)
+    SELECT 'delete', old.id, old.headline, old.summary, old.tickers
+    WHERE EXISTS (SELECT 1 FROM news_fts_docsize WHERE id = old.id);
+END;
+CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF headline, summary, tickers ON news BEGIN
+    INSERT INTO news_fts(news_fts, rowid, headline, summary, tickers)
+    SELECT 'delete', old.id, old.headline, old.summary, old.tickers
+    WHERE EXISTS (SELECT 1 FROM news_fts_docsize WHERE id = old.id);
+    INSERT INTO news_fts(rowid, headline, summary, tickers) VALUES (new.id, new.headline, new.summary, new.tickers);
+END;
+CREATE TRIGGER IF NOT EXISTS stock_news_tickers_insert AFTER INSERT ON stock_news BEGIN
+    UPDATE news SET tickers = trim(coalesce(tickers, '') || ' ' || (SELECT ticker FROM stocks WHERE id = new.stock_id))
+    WHERE id = new.news_id;
+END;
+CREATE TRIGGER IF NOT EXISTS stock_news_tickers_delete AFTER DELETE ON stock_news BEGIN
+    UPDATE news SET tickers = (
+        SELECT group_concat(s.ticker, ' ') FROM stock_news sn JOIN stocks s ON s.id = sn.stock_id
+        WHERE sn.news_id = old.news_id
+    )
+    WHERE id = old.news_id;
+END;
+CREATE TABLE IF NOT EXISTS weekly_prices (
+    stock_id INTEGER NOT NULL,
+    period_start TEXT NOT NULL,
+    open REAL,
+    close REAL,
+    high REAL,
+    low REAL,
+    volume INTEGER,
+    bars INTEGER,
+    FOREIGN KEY (stock_id) REFERENCES stocks(id),
+    PRIMARY KEY (stock_id, period_start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS monthly_prices (
+    stock_id INTEGER NOT NULL,
+    period_start TEXT NOT NULL,
+    open REAL,
+    close REAL,
+    high REAL,
+    low REAL,
+    volume INTEGER,
+    bars INTEGER,
+    FOREIGN KEY (stock_id) REFERENCES stocks(id),
+    PRIMARY KEY (stock_id, period_start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS data_version (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sentiment_cache (
+    content_hash TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (content_hash, backend)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS news_impact (
+    stock_id INTEGER NOT NULL,
+    lag INTEGER NOT NULL,
+    correlation REAL,
+    data_points INTEGER,
+    rolling_correlation REAL,
+    rolling_data_points INTEGER,
+    computed_at TEXT,
+    FOREIGN KEY (stock_id) REFERENCES stocks(id),
+    PRIMARY KEY (stock_id, lag)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS indicators (
+    stock_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    sma_20 REAL,
+    sma_50 REAL,
+    sma_200 REAL,
+    ema_12 REAL,
+    ema_26 REAL,
+    macd REAL,
+    macd_signal REAL,
+    macd_hist REAL,
+    rsi_14 REAL,
+    bb_upper REAL,
+    bb_lower REAL,
+    atr_14 REAL,
+    -- Recursion state, so later bars can be computed from this row
+    bars INTEGER,
+    avg_gain REAL,
+    avg_loss REAL,
+    FOREIGN KEY (stock_id) REFERENCES stocks(id),
+    PRIMARY KEY (stock_id, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS latest_snapshot (
+    stock_id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    avg_volume_20 REAL,
+    return_1d REAL,
+    return_5d REAL,
+    return_20d REAL,
+    return_60d REAL,
+    return_120d REAL,
+    return_250d REAL,
+    high_52w REAL,
+    low_52w REAL,
+    sma_20 REAL,
+    sma_50 REAL,
+    sma_200 REAL,
+    ema_12 REAL,
+    ema_26 REAL,
+    macd REAL,
+    macd_signal REAL,
+    macd_hist REAL,
+    rsi_14 REAL,
+    bb_upper REAL,
+    bb_lower REAL,
+    atr_14 REAL,
+    FOREIGN KEY (stock_id) REFERENCES stocks(id)
+);
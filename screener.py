@@ -0,0 +1,472 @@
+"""
+Stock screener over the latest_snapshot table, which holds one row per stock:
+its last bar, returns over several horizons, average volume, 52-week range
+and the latest technical indicators. DailyPriceWriter refreshes the rows of
+the stocks it touched, so a screen never reads daily_prices.
+
+Filters are written in a small expression language, for example
+
+    close > sma_200 and volume > 2 * avg_volume_20 and sector = "Financial Services"
+    return_20d >= 10 and rsi_14 < 70 and sector in ("Information Technology", "Healthcare")
+
+with + - * /, comparisons (< <= > >= = != and `in (...)`), and / or / not
+and parentheses. Names are SNAPSHOT_FIELDS or the text fields ticker and
+sector (compared case-insensitively). Missing values never match. The
+whole universe is filtered at once as NumPy arrays.
+"""
+import argparse
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from indicators import INDICATOR_FIELDS
+
+# Trading-day horizons of the return_<N>d fields (percent change in close).
+RETURN_DAYS = (1, 5, 20, 60, 120, 250)
+# Bars averaged for avg_volume_20, ending the day before the latest bar.
+AVG_VOLUME_BARS = 20
+# Bars in the 52-week high/low.
+YEAR_BARS = 250
+
+SNAPSHOT_FIELDS = (
+    ('open', 'high', 'low', 'close', 'volume', 'avg_volume_20')
+    + tuple(f'return_{days}d' for days in RETURN_DAYS)
+    + ('high_52w', 'low_52w')
+    + INDICATOR_FIELDS
+)
+TEXT_FIELDS = ('ticker', 'sector')
+
+MAX_RESULTS = 500
+
+
+def snapshot_available(conn: sqlite3.Connection) -> bool:
+    """True if the latest_snapshot table exists (it is created by schema.sql)."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'latest_snapshot'"
+    ).fetchone() is not None
+
+
+def refresh_snapshot(conn: sqlite3.Connection, stock_ids: Iterable[int]) -> int:
+    """
+    Recomputes the latest_snapshot rows of `stock_ids` from their last
+    YEAR_BARS + 1 bars and latest indicators. Runs inside the caller's
+    transaction; the indicators must already be current. Returns rows written.
+    """
+    stock_ids = sorted(set(stock_ids))
+    if not stock_ids or not snapshot_available(conn):
+        return 0
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS snapshot_scope (stock_id INTEGER PRIMARY KEY, from_date TEXT)")
+    conn.execute("DELETE FROM temp.snapshot_scope")
+    conn.executemany("INSERT INTO temp.snapshot_scope (stock_id) VALUES (?)", [(s,) for s in stock_ids])
+    conn.execute("""
+        UPDATE temp.snapshot_scope SET from_date = coalesce((
+            SELECT date FROM daily_prices WHERE stock_id = snapshot_scope.stock_id
+            ORDER BY date DESC LIMIT 1 OFFSET ?
+        ), '0001-01-01')
+    """, (YEAR_BARS,))
+    rows = conn.execute("""
+        SELECT d.stock_id, d.date, d.open, d.high, d.low, d.close, d.volume
+        FROM temp.snapshot_scope s
+        CROSS JOIN daily_prices d ON d.stock_id = s.stock_id AND d.date >= s.from_date
+        ORDER BY s.stock_id, d.date
+    """).fetchall()
+    conn.execute("DELETE FROM temp.snapshot_scope")
+    conn.executemany("DELETE FROM latest_snapshot WHERE stock_id = ?", [(s,) for s in stock_ids])
+    if not rows:
+        return 0
+
+    columns = list(zip(*rows))
+    ids = np.array(columns[0], dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(ids[1:] != ids[:-1]) + 1))
+    counts = np.diff(np.append(starts, len(ids)))
+    segment = np.repeat(np.arange(len(starts)), counts)
+    # Right-aligned (bar x stock) matrices: the latest bar of every stock is the last row
+    n_rows = YEAR_BARS + 1
+    row = n_rows - counts[segment] + (np.arange(len(ids)) - starts[segment])
+    bars = {}
+    for name, values in zip(('open', 'high', 'low', 'close', 'volume'), columns[2:]):
+        bars[name] = np.full((n_rows, len(starts)), np.nan)
+        bars[name][row, segment] = np.array(values, dtype=np.float64)
+
+    close = bars['close']
+    snapshot = {name: bars[name][-1] for name in ('open', 'high', 'low', 'close', 'volume')}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for days in RETURN_DAYS:
+            snapshot[f'return_{days}d'] = (close[-1] / close[-1 - days] - 1.0) * 100.0
+        previous = bars['volume'][-1 - AVG_VOLUME_BARS:-1]
+        enough = (~np.isnan(previous)).sum(axis=0) == AVG_VOLUME_BARS
+        snapshot['avg_volume_20'] = np.where(enough, np.nansum(previous, axis=0) / AVG_VOLUME_BARS, np.nan)
+    year = slice(-YEAR_BARS, None)
+    snapshot['high_52w'] = np.fmax.reduce(bars['high'][year], axis=0)
+    snapshot['low_52w'] = np.fmin.reduce(bars['low'][year], axis=0)
+    last_dates = [columns[1][i] for i in (starts + counts - 1).tolist()]
+
+    price_fields = [f for f in SNAPSHOT_FIELDS if f not in INDICATOR_FIELDS]
+    # NaN binds as NULL
+    conn.executemany(
+        f"""
+        INSERT INTO latest_snapshot (stock_id, date, {', '.join(price_fields)})
+        VALUES ({', '.join('?' * (len(price_fields) + 2))})
+        """,
+        zip(ids[starts].tolist(), last_dates, *[snapshot[f].tolist() for f in price_fields])
+    )
+    # Latest indicator values, when the indicators table has a row for the last bar
+    assignments = ", ".join(f"{f} = i.{f}" for f in INDICATOR_FIELDS)
+    conn.execute(f"""
+        UPDATE latest_snapshot SET {assignments}
+        FROM indicators i
+        WHERE i.stock_id = latest_snapshot.stock_id AND i.date = latest_snapshot.date
+          AND latest_snapshot.stock_id IN ({', '.join('?' * len(stock_ids))})
+    """, stock_ids)
+    return len(starts)
+
+
+def rebuild_snapshot(conn: sqlite3.Connection) -> int:
+    """Recomputes latest_snapshot for every stock with price history."""
+    conn.execute("DELETE FROM latest_snapshot")
+    stock_ids = [row[0] for row in conn.execute("SELECT DISTINCT stock_id FROM daily_prices")]
+    return refresh_snapshot(conn, stock_ids)
+
+
+def load_snapshot(conn: sqlite3.Connection) -> Dict[str, np.ndarray]:
+    """Every active stock's snapshot as one NumPy array per field (NULL as NaN), plus id, ticker, name, sector, date."""
+    rows = conn.execute(f"""
+        SELECT s.id, s.ticker, s.name, s.sector, l.date, {', '.join('l.' + f for f in SNAPSHOT_FIELDS)}
+        FROM latest_snapshot l
+        JOIN stocks s ON s.id = l.stock_id
+        WHERE s.is_active = 1
+        ORDER BY s.ticker
+    """).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * (5 + len(SNAPSHOT_FIELDS))
+    snapshot = {
+        'id': np.array(columns[0], dtype=np.int64),
+        'ticker': np.array(columns[1], dtype=object),
+        'name': np.array(columns[2], dtype=object),
+        'sector': np.array(columns[3], dtype=object),
+        'date': np.array(columns[4], dtype=object),
+    }
+    for field, values in zip(SNAPSHOT_FIELDS, columns[5:]):
+        snapshot[field] = np.array(values, dtype=np.float64)
+    snapshot.update(_folded(snapshot))
+    return snapshot
+
+
+# Filter expression parsing
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op><=|>=|!=|==|=|<|>|\+|-|\*|/|\(|\)|,)
+    )""", re.VERBOSE)
+_KEYWORDS = ('and', 'or', 'not', 'in')
+_COMPARISONS = ('<', '<=', '>', '>=', '=', '==', '!=')
+
+
+def _tokenize(text: str) -> List[tuple]:
+    tokens, position = [], 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            rest = text[position:].lstrip()
+            raise ValueError(f"Unexpected character at position {len(text) - len(rest)}: {rest[:10]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'number':
+            tokens.append(('number', float(value)))
+        elif kind == 'string':
+            tokens.append(('string', value[1:-1]))
+        elif kind == 'name' and value.lower() in _KEYWORDS:
+            tokens.append(('op', value.lower()))
+        else:
+            tokens.append((kind, value.lower() if kind == 'name' else value))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing a tuple AST, e.g. ('cmp', '>', ('field', 'close'), ('number', 10.0))."""
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def peek(self, *values) -> bool:
+        if self.position >= len(self.tokens):
+            return False
+        kind, value = self.tokens[self.position]
+        return kind == 'op' and value in values
+
+    def take(self):
+        if self.position >= len(self.tokens):
+            raise ValueError("Unexpected end of filter")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def expect(self, value: str):
+        kind, found = self.take()
+        if kind != 'op' or found != value:
+            raise ValueError(f"Expected {value!r}, found {found!r}")
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Empty filter")
+        node = self.disjunction()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected {self.tokens[self.position][1]!r}")
+        return node
+
+    def disjunction(self):
+        node = self.conjunction()
+        while self.peek('or'):
+            self.take()
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek('and'):
+            self.take()
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek('not'):
+            self.take()
+            return ('not', self.negation())
+        return self.comparison()
+
+    def comparison(self):
+        node = self.sum()
+        if self.peek(*_COMPARISONS):
+            op = self.take()[1]
+            return ('cmp', '=' if op == '==' else op, node, self.sum())
+        if self.peek('in'):
+            self.take()
+            self.expect('(')
+            values = [self.literal()]
+            while self.peek(','):
+                self.take()
+                values.append(self.literal())
+            self.expect(')')
+            return ('in', node, values)
+        return node
+
+    def literal(self):
+        kind, value = self.take()
+        if kind not in ('number', 'string'):
+            raise ValueError(f"Expected a number or string, found {value!r}")
+        return (kind, value)
+
+    def sum(self):
+        node = self.product()
+        while self.peek('+', '-'):
+            node = ('arith', self.take()[1], node, self.product())
+        return node
+
+    def product(self):
+        node = self.unary()
+        while self.peek('*', '/'):
+            node = ('arith', self.take()[1], node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek('-'):
+            self.take()
+            return ('arith', '-', ('number', 0.0), self.unary())
+        return self.primary()
+
+    def primary(self):
+        if self.peek('('):
+            self.take()
+            node = self.disjunction()
+            self.expect(')')
+            return node
+        kind, value = self.take()
+        if kind == 'name':
+            if value not in SNAPSHOT_FIELDS and value not in TEXT_FIELDS:
+                raise ValueError(f"Unknown field: {value}")
+            return ('field', value)
+        if kind in ('number', 'string'):
+            return (kind, value)
+        raise ValueError(f"Unexpected {value!r}")
+
+
+def parse_filter(text: str):
+    """Parses a filter expression. Raises ValueError with a readable message if it is invalid."""
+    return _Parser(text).parse()
+
+
+def filter_fields(node) -> List[str]:
+    """Field names a parsed filter refers to, in order of first use."""
+    if node[0] == 'field':
+        return [node[1]]
+    fields = []
+    for child in node[1:]:
+        if isinstance(child, tuple):
+            fields.extend(f for f in filter_fields(child) if f not in fields)
+    return fields
+
+
+_ARITHMETIC = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide}
+_ORDERING = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal}
+
+
+def _evaluate(node, snapshot: Dict[str, np.ndarray], n: int):
+    """Returns (kind, value): 'bool' / 'number' arrays of length n, or a scalar 'string'."""
+    kind = node[0]
+    if kind == 'number':
+        return 'number', node[1]
+    if kind == 'string':
+        return 'string', node[1].casefold()
+    if kind == 'field':
+        if node[1] in TEXT_FIELDS:
+            return 'text', snapshot[f'_{node[1]}_folded']
+        return 'number', snapshot[node[1]]
+    if kind in ('and', 'or'):
+        left, right = (_condition(child, snapshot, n) for child in node[1:])
+        return 'bool', (left & right) if kind == 'and' else (left | right)
+    if kind == 'not':
+        return 'bool', ~_condition(node[1], snapshot, n)
+    if kind == 'arith':
+        (lk, left), (rk, right) = (_evaluate(child, snapshot, n) for child in node[2:])
+        if lk != 'number' or rk != 'number':
+            raise ValueError(f"'{node[1]}' needs numbers")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 'number', _ARITHMETIC[node[1]](left, right)
+    if kind == 'in':
+        sk, subject = _evaluate(node[1], snapshot, n)
+        mask = np.zeros(n, dtype=bool)
+        for literal in node[2]:
+            mask |= _compare('=', (sk, subject), _evaluate(literal, snapshot, n), n)
+        return 'bool', mask
+    # 'cmp'
+    return 'bool', _compare(node[1], _evaluate(node[2], snapshot, n), _evaluate(node[3], snapshot, n), n)
+
+
+def _compare(op: str, left, right, n: int) -> np.ndarray:
+    (lk, lv), (rk, rv) = left, right
+    texts = {lk, rk} & {'text', 'string'}
+    if texts:
+        if not {lk, rk} <= {'text', 'string'}:
+            raise ValueError("Text fields can only be compared with text")
+        if op not in ('=', '!='):
+            raise ValueError(f"Text fields only support = and !=, not {op!r}")
+        equal = np.broadcast_to(np.asarray(lv == rv, dtype=bool), (n,))
+        if op == '=':
+            return equal.copy()
+        # Missing text is missing, not different
+        present = np.ones(n, dtype=bool)
+        for kind, value in left, right:
+            if kind == 'text':
+                present &= np.array([v is not None for v in value], dtype=bool)
+        return ~equal & present
+    if lk != 'number' or rk != 'number':
+        raise ValueError(f"'{op}' needs numbers")
+    with np.errstate(invalid='ignore'):
+        if op == '=':
+            result = np.equal(lv, rv)
+        elif op == '!=':
+            # NaN is missing, not different
+            result = np.not_equal(lv, rv) & ~np.isnan(lv) & ~np.isnan(rv)
+        else:
+            result = _ORDERING[op](lv, rv)
+    return np.broadcast_to(result, (n,)).copy()
+
+
+def _condition(node, snapshot: Dict[str, np.ndarray], n: int) -> np.ndarray:
+    kind, value = _evaluate(node, snapshot, n)
+    if kind != 'bool':
+        raise ValueError("Expected a condition (a comparison), not a value")
+    return value
+
+
+def _folded(snapshot: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Case-folded copies of the text fields, which filters compare against."""
+    return {
+        f'_{field}_folded': np.array([v.casefold() if isinstance(v, str) else None for v in snapshot[field]],
+                                     dtype=object)
+        for field in TEXT_FIELDS
+    }
+
+
+def evaluate_filter(node, snapshot: Dict[str, np.ndarray]) -> np.ndarray:
+    """Boolean mask of the snapshot rows matching a parsed filter."""
+    if any(f'_{field}_folded' not in snapshot for field in TEXT_FIELDS):
+        snapshot = {**snapshot, **_folded(snapshot)}
+    return _condition(node, snapshot, len(snapshot['id']))
+
+
+def screen(snapshot: Dict[str, np.ndarray], text: str, sort: Optional[str] = None,
+           limit: int = 50) -> dict:
+    """
+    Runs a filter over a loaded snapshot. `sort` is a field name, prefixed
+    with '-' for descending (missing values last). Returns {"count" (all
+    matches), "fields", "results": [{ticker, name, sector, date, close, <fields used>}, ...]}.
+    """
+    node = parse_filter(text)
+    mask = evaluate_filter(node, snapshot)
+    matches = np.flatnonzero(mask)
+
+    fields = ['close'] + [f for f in filter_fields(node) if f in SNAPSHOT_FIELDS and f != 'close']
+    if sort:
+        descending = sort.startswith('-')
+        key = sort.lstrip('-+').lower()
+        if key not in SNAPSHOT_FIELDS:
+            raise ValueError(f"Unknown sort field: {key}")
+        values = snapshot[key][matches]
+        # Stable sort with missing values last in either direction
+        order = np.lexsort((-values if descending else values, np.isnan(values)))
+        matches = matches[order]
+        if key not in fields:
+            fields.append(key)
+
+    limit = max(1, min(limit, MAX_RESULTS))
+    results = []
+    for i in matches[:limit].tolist():
+        item = {name: snapshot[name][i] for name in ('ticker', 'name', 'sector', 'date')}
+        for field in fields:
+            value = float(snapshot[field][i])
+            item[field] = None if value != value else value
+        results.append(item)
+    return {"count": int(len(matches)), "fields": fields, "results": results}
+
+
+if __name__ == "__main__":
+    import db_utils
+
+    parser = argparse.ArgumentParser(description="Maintain or query the latest_snapshot screener table.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the snapshot of every stock.")
+    parser.add_argument("filter", nargs="?", help='Screen, e.g. "close > sma_200 and rsi_14 < 30".')
+    parser.add_argument("--sort", help="Sort field, prefixed with - for descending.")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    if not args.rebuild and not args.filter:
+        parser.error("nothing to do; pass --rebuild or a filter")
+
+    db_utils.init_db()  # creates latest_snapshot on databases that predate it
+    conn = db_utils.get_connection()
+    try:
+        if args.rebuild:
+            start_time = time.time()
+            rows = rebuild_snapshot(conn)
+            db_utils.bump_data_version(conn, db_utils.DATA_VERSION_PRICES)
+            conn.commit()
+            print(f"Rebuilt {rows} snapshot rows in {time.time() - start_time:.2f} seconds.")
+        if args.filter:
+            start_time = time.perf_counter()
+            result = screen(load_snapshot(conn), args.filter, args.sort, args.limit)
+            elapsed = (time.perf_counter() - start_time) * 1000
+            print(f"{result['count']} matches in {elapsed:.1f} ms")
+            for item in result["results"]:
+                values = "  ".join(f"{f}={item[f]:.2f}" if item[f] is not None else f"{f}=-"
+                                   for f in result["fields"])
+                print(f"{item['ticker']:<16} {values}")
+    finally:
+        conn.close()
@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const stockTitle = document.getElementById('stockTitle');
     const stockSector = document.getElementById('stockSector');
     const stockCount = document.getElementById('stockCount');
+    const stockLive = document.getElementById('stockLive');
     const noData = document.getElementById('noData');
     const loading = document.getElementById('loading');
     const tableBody = document.querySelector('#dataTable tbody');
@@ -97,6 +98,37 @@ document.addEventListener('DOMContentLoaded', () => {
 
         fetchStockData(stock.ticker);
         fetchStockNews(stock.ticker);
+        openQuoteStream(stock.ticker);
+    }
+
+    // --- Live Quotes ---
+    // One Server-Sent Events stream for the displayed ticker; the server only
+    // sends quotes whose price or volume changed.
+    let quoteStream = null;
+
+    function openQuoteStream(ticker) {
+        if (quoteStream) quoteStream.close();
+        stockLive.textContent = '-';
+        stockLive.classList.remove('live-up', 'live-down');
+        if (!window.EventSource) return;
+
+        quoteStream = new EventSource(`/api/quotes/stream?tickers=${encodeURIComponent(ticker)}`);
+        const onQuotes = (e) => {
+            const quote = JSON.parse(e.data)[ticker];
+            if (quote) renderQuote(quote);
+        };
+        quoteStream.addEventListener('snapshot', onQuotes);
+        quoteStream.addEventListener('quotes', onQuotes);
+    }
+
+    function renderQuote(quote) {
+        let text = quote.price.toLocaleString(undefined, { minimumFractionDigits: 2, maximumFractionDigits: 2 });
+        stockLive.classList.remove('live-up', 'live-down');
+        if (quote.change_pct !== undefined) {
+            text += ` (${quote.change_pct >= 0 ? '+' : ''}${quote.change_pct.toFixed(2)}%)`;
+            stockLive.classList.add(quote.change_pct >= 0 ? 'live-up' : 'live-down');
+        }
+        stockLive.textContent = text;
     }
 
     applyFilterBtn.addEventListener('click', () => {
@@ -115,30 +147,39 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         tableBody.innerHTML = '';
 
-        let url = `/api/data/${ticker}`;
-
-        const params = new URLSearchParams();
-        if (startDateInput.value) params.append('start', startDateInput.value);
-        if (endDateInput.value) params.append('end', endDateInput.value);
-
-        if (params.toString()) {
-            url += `?${params.toString()}`;
-        }
-
-        fetch(url)
-            .then(res => res.json())
-            .then(data => {
+        // Columnar payloads: one array per field instead of one object per row.
+        // The chart gets a server-side LTTB reduction of close sized to the canvas,
+        // the table only the latest 50 daily rows of the range.
+        const range = new URLSearchParams();
+        if (startDateInput.value) range.append('start', startDateInput.value);
+        if (endDateInput.value) range.append('end', endDateInput.value);
+
+        const chartParams = new URLSearchParams(range);
+        chartParams.append('format', 'columns');
+        chartParams.append('fields', 'close');
+        chartParams.append('method', 'lttb');
+        chartParams.append('max_points', Math.max(200, document.getElementById('priceChart').clientWidth || 800));
+
+        const tableParams = new URLSearchParams(range);
+        tableParams.append('format', 'columns');
+        tableParams.append('tail', 50);
+
+        Promise.all([
+            fetch(`/api/data/${ticker}?${chartParams}`).then(res => res.json()),
+            fetch(`/api/data/${ticker}?${tableParams}`).then(res => res.json())
+        ])
+            .then(([chartData, tableData]) => {
                 loading.classList.add('hidden');
-                if (data.error || data.data.length === 0) {
+                if (chartData.error || chartData.count === 0) {
                     noData.textContent = "No data available for selected range";
                     noData.classList.remove('hidden');
                     stockCount.textContent = '0';
                     return;
                 }
 
-                stockCount.textContent = data.count.toLocaleString();
-                renderChart(data);
-                renderTable(data.data);
+                stockCount.textContent = chartData.source_count.toLocaleString();
+                renderChart(chartData);
+                renderTable(tableData.data);
             })
             .catch(err => {
                 loading.classList.add('hidden');
@@ -150,8 +191,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function renderChart(apiData) {
         const ctx = document.getElementById('priceChart').getContext('2d');
-        const labels = apiData.data.map(d => d.date);
-        const prices = apiData.data.map(d => d.close);
+        const labels = apiData.data.date;
+        const prices = apiData.data.close;
 
         const gradient = ctx.createLinearGradient(0, 0, 0, 400);
         gradient.addColorStop(0, 'rgba(0, 242, 234, 0.5)'); // Accent color
@@ -212,17 +253,21 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    function renderTable(data) {
-        // Reverse for table (newest first)
-        const reversedData = [...data].reverse();
-        const rows = reversedData.slice(0, 50).map(row => `
+    function renderTable(columns) {
+        // Newest first, latest 50 rows
+        const indices = [];
+        for (let i = columns.date.length - 1; i >= 0 && indices.length < 50; i--) {
+            indices.push(i);
+        }
+        const fmt = value => (value ? value.toFixed(2) : '-');
+        const rows = indices.map(i => `
             <tr>
-                <td>${row.date}</td>
-                <td>${row.open ? row.open.toFixed(2) : '-'}</td>
-                <td>${row.high ? row.high.toFixed(2) : '-'}</td>
-                <td>${row.low ? row.low.toFixed(2) : '-'}</td>
-                <td>${row.close ? row.close.toFixed(2) : '-'}</td>
-                <td>${row.volume ? row.volume.toLocaleString() : '-'}</td>
+                <td>${columns.date[i]}</td>
+                <td>${fmt(columns.open[i])}</td>
+                <td>${fmt(columns.high[i])}</td>
+                <td>${fmt(columns.low[i])}</td>
+                <td>${fmt(columns.close[i])}</td>
+                <td>${columns.volume[i] ? columns.volume[i].toLocaleString() : '-'}</td>
             </tr>
         `).join('');
 
@@ -286,6 +331,13 @@ document.addEventListener('DOMContentLoaded', () => {
                     sqlError.classList.remove('hidden');
                 } else if (data.columns && data.data) {
                     renderSqlTable(data.columns, data.data);
+                    if (data.next_cursor) {
+                        sqlError.textContent = `Showing the first ${data.row_count} rows (${data.elapsed_ms} ms). Add a LIMIT or WHERE clause to narrow the result.`;
+                        sqlError.style.color = '#00f2ea';
+                        sqlError.style.borderColor = 'rgba(0, 242, 234, 0.2)';
+                        sqlError.style.backgroundColor = 'rgba(0, 242, 234, 0.1)';
+                        sqlError.classList.remove('hidden');
+                    }
                 }
             })
             .catch(err => {
@@ -0,0 +1,116 @@
+"""
+Checks for db_utils.DailyPriceWriter, the upsert behind every price load: row
+counts, ids kept on update, unchanged rows left alone, the derived tables
+refreshed in the same commit, and nothing written when the load fails.
+
+    python -m pytest test_daily_price_writer.py
+"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import db_utils
+
+N_DAYS = 30
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "prices.db")
+    monkeypatch.setattr(db_utils, "DB_NAME", path)
+    conn = sqlite3.connect(path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.executemany("INSERT INTO stocks (id, ticker, name) VALUES (?, ?, ?)",
+                     [(1, "SYN1.BO", "Company1"), (2, "SYN2.BO", "Company2")])
+    # Logs every rewrite of an existing price row
+    conn.execute("CREATE TABLE price_updates (id INTEGER)")
+    conn.execute("""
+        CREATE TRIGGER log_price_update AFTER UPDATE ON daily_prices
+        BEGIN INSERT INTO price_updates VALUES (new.id); END
+    """)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def frame(start: str = "2024-01-01", days: int = N_DAYS, offset: float = 0.0) -> pd.DataFrame:
+    index = pd.bdate_range(start, periods=days, name="Date")
+    close = pd.Series(range(days), index=index, dtype=float) + 100 + offset
+    return pd.DataFrame({"Open": close - 1, "High": close + 1, "Low": close - 2, "Close": close,
+                         "Volume": 1000}, index=index)
+
+
+def write(*frames, **kwargs) -> db_utils.DailyPriceWriter:
+    with db_utils.DailyPriceWriter(**kwargs) as writer:
+        writer.add(frames)
+    return writer
+
+
+def test_counts(db):
+    assert write((1, frame()), (2, frame())).stats == {"inserted": 2 * N_DAYS, "updated": 0, "unchanged": 0}
+
+    revised = frame()
+    revised.iloc[-3:, revised.columns.get_loc("Close")] += 5
+    stats = write((1, revised), (2, frame(days=N_DAYS + 2))).stats
+    assert stats == {"inserted": 2, "updated": 3, "unchanged": 2 * N_DAYS - 3}
+    assert db.execute("SELECT COUNT(*) FROM daily_prices").fetchone()[0] == 2 * N_DAYS + 2
+
+
+def test_update_keeps_row_ids_and_skips_unchanged_rows(db):
+    write((1, frame()))
+    before = dict(db.execute("SELECT date, id FROM daily_prices WHERE stock_id = 1").fetchall())
+
+    revised = frame()
+    revised.iloc[-1, revised.columns.get_loc("Close")] += 5
+    write((1, revised))
+
+    after = dict(db.execute("SELECT date, id FROM daily_prices WHERE stock_id = 1").fetchall())
+    assert after == before
+    last = max(before)
+    assert db.execute("SELECT id FROM price_updates").fetchall() == [(before[last],)]
+    assert db.execute("SELECT close FROM daily_prices WHERE stock_id = 1 AND date = ?",
+                      (last,)).fetchone()[0] == revised["Close"].iloc[-1]
+
+
+def test_commit_refreshes_derived_tables(db):
+    write((1, frame(days=60)))
+    assert db.execute("SELECT COUNT(*) FROM weekly_prices WHERE stock_id = 1").fetchone()[0] == 12
+    assert db.execute("SELECT COUNT(*) FROM monthly_prices WHERE stock_id = 1").fetchone()[0] == 3
+    assert db.execute("SELECT COUNT(*) FROM indicators WHERE stock_id = 1").fetchone()[0] == 60
+    assert db.execute("SELECT close FROM latest_snapshot WHERE stock_id = 1").fetchone()[0] == 159.0
+    assert db_utils.get_data_versions(conn=db)[db_utils.DATA_VERSION_PRICES] == 1
+
+    # Nothing changed: no version bump
+    write((1, frame(days=60)))
+    assert db_utils.get_data_versions(conn=db)[db_utils.DATA_VERSION_PRICES] == 1
+
+
+def test_derived_tables_can_be_skipped(db):
+    write((1, frame()), maintain_rollups=False, maintain_indicators=False, maintain_snapshot=False)
+    for table in ("weekly_prices", "monthly_prices", "indicators", "latest_snapshot"):
+        assert db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0, table
+
+
+def test_exception_rolls_back(db):
+    with pytest.raises(RuntimeError):
+        with db_utils.DailyPriceWriter() as writer:
+            writer.add([(1, frame())])
+            raise RuntimeError("download failed")
+    assert db.execute("SELECT COUNT(*) FROM daily_prices").fetchone()[0] == 0
+    assert db.execute("SELECT COUNT(*) FROM weekly_prices").fetchone()[0] == 0
+    assert writer.stats == {"inserted": 0, "updated": 0, "unchanged": 0}
+
+
+def test_staging_leaves_the_database_unlocked(db):
+    writer = db_utils.DailyPriceWriter()
+    try:
+        writer.add([(1, frame())])
+        # Another writer gets in while the load is still being staged
+        db.execute("PRAGMA busy_timeout = 100")
+        db.execute("UPDATE stocks SET name = 'Renamed' WHERE id = 2")
+        db.commit()
+    finally:
+        writer.commit()
+    assert writer.stats["inserted"] == N_DAYS
@@ -0,0 +1,116 @@
+"""
+Regression checks for the news feed queries in db_utils: they must be served
+by the stock_news indexes (no temp B-tree sort of the news join), and keyset
+pagination must return every link exactly once, newest first.
+
+    python -m pytest test_news_queries.py
+"""
+import sqlite3
+
+import pytest
+
+import db_utils
+
+N_STOCKS = 20
+N_ARTICLES = 600
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "news.db"))
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.executemany("INSERT INTO stocks (id, ticker, name) VALUES (?, ?, ?)",
+                     [(i, f"SYN{i}.BO", f"Company{i}") for i in range(1, N_STOCKS + 1)])
+    # Many articles share a timestamp and some have none, to exercise the cursor tie-breaks
+    conn.executemany(
+        "INSERT INTO news (id, headline, url, published_at) VALUES (?, ?, ?, ?)",
+        [(i, f"Headline {i}", f"https://news.example.com/{i}",
+          None if i % 50 == 0 else f"2024-01-{1 + i % 28:02d} 09:{i % 3:02d}:00")
+         for i in range(1, N_ARTICLES + 1)]
+    )
+    conn.executemany("INSERT INTO stock_news (stock_id, news_id) VALUES (?, ?)",
+                     [(1 + i % N_STOCKS, i) for i in range(1, N_ARTICLES + 1)]
+                     + [(1 + (i + 7) % N_STOCKS, i) for i in range(1, N_ARTICLES + 1, 4)])
+    conn.commit()
+    conn.execute("ANALYZE")
+    yield conn
+    conn.close()
+
+
+def query_plans(conn, call) -> list:
+    """EXPLAIN QUERY PLAN lines of every statement `call` runs on `conn`."""
+    statements = []
+    # The trace callback receives the statement with its parameters bound
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return [row[3] for sql in statements for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+def test_published_at_is_denormalized(conn):
+    mismatched = conn.execute("""
+        SELECT COUNT(*) FROM stock_news sn JOIN news n ON n.id = sn.news_id
+        WHERE sn.published_at IS NOT coalesce(n.published_at, '')
+    """).fetchone()[0]
+    assert mismatched == 0
+
+    conn.execute("UPDATE news SET published_at = '2030-01-01 00:00:00' WHERE id = 1")
+    assert {row[0] for row in conn.execute("SELECT published_at FROM stock_news WHERE news_id = 1")} == {
+        "2030-01-01 00:00:00"}
+
+
+@pytest.mark.parametrize("call", [
+    lambda conn: db_utils.get_market_news(15, conn=conn),
+    lambda conn: db_utils.get_market_news(15, cursor=db_utils.encode_cursor("2024-01-10", 5, 1), conn=conn),
+    lambda conn: db_utils.get_stock_news(3, 20, conn=conn),
+    lambda conn: db_utils.get_stock_news(3, 20, cursor=db_utils.encode_cursor("2024-01-10", 5), conn=conn),
+    lambda conn: db_utils.get_news_for_stocks([1, 2, 3], 5, conn=conn),
+])
+def test_news_queries_do_not_sort(conn, call):
+    plan = query_plans(conn, lambda: call(conn))
+    assert plan
+    assert not [line for line in plan if "TEMP B-TREE" in line], plan
+    assert not [line for line in plan if line.startswith("SCAN n")], plan
+
+
+def test_market_news_pages_cover_every_link(conn):
+    seen, cursor = [], None
+    while True:
+        page = db_utils.get_market_news(37, cursor=cursor, conn=conn)
+        if not page:
+            break
+        seen.extend(page)
+        cursor = page[-1]["cursor"]
+
+    expected = conn.execute("""
+        SELECT published_at, news_id, stock_id FROM stock_news
+        ORDER BY published_at DESC, news_id DESC, stock_id DESC
+    """).fetchall()
+    assert [db_utils.decode_cursor(item["cursor"], str, int, int) for item in seen] == expected
+    # Undated articles come last
+    assert seen[-1]["published_at"] is None
+
+
+def test_stock_news_pages(conn):
+    first = db_utils.get_stock_news(3, 10, conn=conn)
+    second = db_utils.get_stock_news(3, 10, cursor=first[-1]["cursor"], conn=conn)
+    combined = db_utils.get_stock_news(3, 20, conn=conn)
+    assert [item["url"] for item in first + second] == [item["url"] for item in combined]
+
+
+def test_news_for_stocks_matches_single_stock_queries(conn):
+    batch = db_utils.get_news_for_stocks([2, 5, 999], 4, conn=conn)
+    assert batch[999] == []
+    for stock_id in (2, 5):
+        single = db_utils.get_stock_news(stock_id, 4, conn=conn)
+        assert [item["url"] for item in batch[stock_id]] == [item["url"] for item in single]
+
+
+def test_invalid_cursor(conn):
+    with pytest.raises(ValueError):
+        db_utils.get_market_news(10, cursor="not-a-cursor", conn=conn)
+    with pytest.raises(ValueError):
+        db_utils.get_stock_news(1, 10, cursor=db_utils.encode_cursor("2024-01-01", 1, 1), conn=conn)
@@ -0,0 +1,130 @@
+"""
+Checks for query_engine.QueryEngine, the guard in front of /api/execute_sql:
+anything but a read is refused, runaway queries are stopped, a full queue is
+refused, and pages are capped in rows and bytes and continue by cursor.
+
+    python -m pytest test_query_engine.py
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from query_engine import QueryEngine, QueryError
+
+N_STOCKS = 250
+RUNAWAY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT MAX(i) FROM n"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "query.db")
+    conn = sqlite3.connect(path)
+    with open("schema.sql") as f:
+        conn.executescript(f.read())
+    conn.executemany("INSERT INTO stocks (id, ticker, name) VALUES (?, ?, ?)",
+                     [(i, f"SYN{i}.BO", f"Company{i}") for i in range(1, N_STOCKS + 1)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def engine(db_path):
+    return QueryEngine(db_path, time_budget=0.5)
+
+
+def stock_count(db_path) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM stocks").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM stocks",
+    "UPDATE stocks SET name = 'x'",
+    "INSERT INTO stocks (ticker, name) VALUES ('NEW.BO', 'New')",
+    "DROP TABLE stocks",
+    "CREATE TABLE scratch (x)",
+    "PRAGMA writable_schema = 1",
+    "PRAGMA table_info(stocks)",
+    "ATTACH DATABASE ':memory:' AS other",
+    "WITH gone AS (SELECT 1) DELETE FROM stocks",
+])
+def test_non_reads_are_refused(engine, db_path, sql):
+    with pytest.raises(QueryError) as e:
+        engine.execute(sql)
+    assert e.value.status == 403
+    assert stock_count(db_path) == N_STOCKS
+
+
+def test_stacked_statement_is_refused(engine, db_path):
+    with pytest.raises(QueryError) as e:
+        engine.execute("SELECT 1; DELETE FROM stocks")
+    assert e.value.status in (400, 403)
+    assert stock_count(db_path) == N_STOCKS
+
+
+def test_runaway_query_times_out(engine):
+    started = time.perf_counter()
+    with pytest.raises(QueryError) as e:
+        engine.execute(RUNAWAY)
+    assert e.value.status == 408
+    assert time.perf_counter() - started < 5
+    assert engine.stats()["timeouts"] == 1
+    # The connection goes back to the pool usable
+    assert engine.execute("SELECT COUNT(*) FROM stocks")["data"] == [[N_STOCKS]]
+
+
+def test_full_queue_is_refused(db_path):
+    engine = QueryEngine(db_path, workers=1, queue=0, time_budget=1.0)
+    slow = threading.Thread(target=lambda: pytest.raises(QueryError, engine.execute, RUNAWAY))
+    slow.start()
+    time.sleep(0.2)
+    try:
+        with pytest.raises(QueryError) as e:
+            engine.execute("SELECT 1")
+        assert e.value.status == 503
+        assert engine.stats()["rejected"] == 1
+    finally:
+        slow.join()
+    assert engine.execute("SELECT 1")["data"] == [[1]]
+
+
+def test_cursor_pages_cover_every_row(engine):
+    sql = "SELECT id, ticker FROM stocks ORDER BY id"
+    seen, cursor = [], None
+    while True:
+        page = engine.execute(sql, cursor=cursor, limit=100)
+        assert page["row_count"] <= 100
+        assert page["plan"]
+        seen.extend(page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert [row[0] for row in seen] == list(range(1, N_STOCKS + 1))
+
+    first = engine.execute(sql, limit=100)
+    with pytest.raises(QueryError) as e:
+        engine.execute("SELECT id FROM stocks", cursor=first["next_cursor"])
+    assert e.value.status == 400
+
+
+def test_rows_are_capped(db_path):
+    page = QueryEngine(db_path, max_rows=50).execute("SELECT id FROM stocks ORDER BY id", limit=10_000)
+    assert page["row_count"] == 50
+    assert not page["truncated"]
+    assert page["next_cursor"] is not None
+
+
+def test_bytes_are_capped(db_path):
+    engine = QueryEngine(db_path, max_bytes=1000)
+    sql = "SELECT id, name FROM stocks ORDER BY id"
+    page = engine.execute(sql)
+    assert page["truncated"]
+    assert 0 < page["row_count"] < N_STOCKS
+    rest = engine.execute(sql, cursor=page["next_cursor"])
+    assert rest["data"][0][0] == page["data"][-1][0] + 1
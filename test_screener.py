@@ -0,0 +1,113 @@
+"""
+Checks for the screener filter language behind /api/screen: parsing and
+precedence, evaluation over a snapshot, and ValueError (answered with 400)
+for anything it does not accept.
+
+    python -m pytest test_screener.py
+"""
+import numpy as np
+import pytest
+
+from screener import SNAPSHOT_FIELDS, filter_fields, parse_filter, screen
+
+CLOSE = [10.0, 20.0, 30.0, 40.0, np.nan]
+
+
+@pytest.fixture
+def snapshot():
+    n = len(CLOSE)
+    snapshot = {
+        'id': np.arange(1, n + 1),
+        'ticker': np.array([f"SYN{i}.BO" for i in range(1, n + 1)], dtype=object),
+        'name': np.array([f"Company{i}" for i in range(1, n + 1)], dtype=object),
+        'sector': np.array(["Banks", "banks", "IT", None, "IT"], dtype=object),
+        'date': np.array(["2024-01-05"] * n, dtype=object),
+    }
+    for field in SNAPSHOT_FIELDS:
+        snapshot[field] = np.full(n, np.nan)
+    snapshot['close'] = np.array(CLOSE)
+    snapshot['sma_200'] = np.array([15.0, 15.0, 35.0, 35.0, 35.0])
+    snapshot['rsi_14'] = np.array([25.0, 50.0, 75.0, 25.0, 25.0])
+    return snapshot
+
+
+def tickers(result) -> list:
+    return [item['ticker'] for item in result['results']]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("close > 15", ('cmp', '>', ('field', 'close'), ('number', 15.0))),
+    ("close == 10", ('cmp', '=', ('field', 'close'), ('number', 10.0))),
+    # and binds tighter than or, not tighter than and
+    ("close > 1 or close < 2 and not rsi_14 > 3",
+     ('or', ('cmp', '>', ('field', 'close'), ('number', 1.0)),
+      ('and', ('cmp', '<', ('field', 'close'), ('number', 2.0)),
+       ('not', ('cmp', '>', ('field', 'rsi_14'), ('number', 3.0)))))),
+    # * binds tighter than +, which binds tighter than a comparison
+    ("close > 1 + 2 * sma_200",
+     ('cmp', '>', ('field', 'close'),
+      ('arith', '+', ('number', 1.0), ('arith', '*', ('number', 2.0), ('field', 'sma_200'))))),
+    ("(close > 1 or close < 2) and rsi_14 > 3",
+     ('and', ('or', ('cmp', '>', ('field', 'close'), ('number', 1.0)),
+              ('cmp', '<', ('field', 'close'), ('number', 2.0))),
+      ('cmp', '>', ('field', 'rsi_14'), ('number', 3.0)))),
+    ("-close < 0", ('cmp', '<', ('arith', '-', ('number', 0.0), ('field', 'close')), ('number', 0.0))),
+    ("SECTOR IN ('IT', 'Banks')", ('in', ('field', 'sector'), [('string', 'IT'), ('string', 'Banks')])),
+])
+def test_parse(text, expected):
+    assert parse_filter(text) == expected
+
+
+def test_filter_fields():
+    assert filter_fields(parse_filter("close > sma_200 and rsi_14 < 30 or close > 1")) == [
+        'close', 'sma_200', 'rsi_14']
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("close > sma_200", ["SYN2.BO", "SYN4.BO"]),
+    ("close > sma_200 and rsi_14 < 30", ["SYN4.BO"]),
+    ("close > sma_200 or rsi_14 > 70", ["SYN2.BO", "SYN3.BO", "SYN4.BO"]),
+    ("not close > sma_200", ["SYN1.BO", "SYN3.BO", "SYN5.BO"]),
+    ("close / sma_200 >= 2 - 0.9", ["SYN2.BO", "SYN4.BO"]),
+    ("close = 30", ["SYN3.BO"]),
+    # Text matches ignore case; missing values never match !=
+    ("sector = 'banks'", ["SYN1.BO", "SYN2.BO"]),
+    ("sector != 'it'", ["SYN1.BO", "SYN2.BO"]),
+    ("sector in ('IT') and close > 0", ["SYN3.BO"]),
+])
+def test_screen(snapshot, text, expected):
+    result = screen(snapshot, text)
+    assert tickers(result) == expected
+    assert result['count'] == len(expected)
+
+
+def test_sort_puts_missing_values_last(snapshot):
+    assert tickers(screen(snapshot, "rsi_14 > 0", sort="-close")) == [
+        "SYN4.BO", "SYN3.BO", "SYN2.BO", "SYN1.BO", "SYN5.BO"]
+    assert tickers(screen(snapshot, "rsi_14 > 0", sort="close", limit=2)) == ["SYN1.BO", "SYN2.BO"]
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "price > 10",                    # unknown field
+    "close ~ 10",                    # unknown operator
+    "close >> 10",
+    "close > 10 xor close < 5",
+    "close > 10 and",
+    "(close > 10",
+    "close > 10)",
+    "close in (sma_200)",            # in takes literals only
+    "close > 'ten'",                 # text against a number
+    "sector > 'IT'",                 # ordering on text
+    "close + 1",                     # a value, not a condition
+    "close > 1 and rsi_14",
+    "close > 1; DROP TABLE stocks",
+])
+def test_invalid_filters_raise_value_error(snapshot, text):
+    with pytest.raises(ValueError):
+        screen(snapshot, text)
+
+
+def test_unknown_sort_field(snapshot):
+    with pytest.raises(ValueError):
+        screen(snapshot, "close > 0", sort="price")
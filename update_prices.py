@@ -1,11 +1,16 @@
-import yfinance as yf
 import time
-from db_utils import get_all_stocks, save_daily_data
+from db_utils import (DATA_VERSION_NEWS, DailyPriceWriter, bump_data_version, get_all_stocks, get_connection,
+                      refresh_price_store)
+from metrics import StageTimer
+from news_impact import refresh_news_impact
+from price_fetcher import PriceFetcher, DEFAULT_CHUNK_SIZE
 
-def update_prices():
+def update_prices(chunk_size: int = DEFAULT_CHUNK_SIZE, provider=None):
     """
     Fetches the latest data (1d) for all stocks in the database 
     and upserts into the daily_prices table.
+    Tickers are downloaded in chunks through the shared PriceFetcher.
+    Stage timings are printed at the end and left in metrics/update_prices.prom.
     """
     stocks = get_all_stocks()
     print(f"Starting daily update for {len(stocks)} stocks...")
@@ -13,29 +18,49 @@ def update_prices():
     start_time = time.time()
     success_count = 0
     
-    for i, (stock_id, ticker) in enumerate(stocks):
-        print(f"[{i+1}/{len(stocks)}] Fetching latest data for {ticker}...")
-        
+    timer = StageTimer("update_prices")
+    fetcher = PriceFetcher(provider=provider, chunk_size=chunk_size, timer=timer)
+    # Upsert (ON CONFLICT DO UPDATE) the whole universe in a single transaction
+    writer = DailyPriceWriter()
+    try:
+        for batch in fetcher.fetch_batches(stocks, period="1d"):
+            with timer.stage("write", [ticker for _, ticker, _ in batch]):
+                writer.add([(stock_id, df) for stock_id, _, df in batch])
+            success_count += len(batch)
+    except BaseException:
+        writer.rollback()
+        raise
+    # Merges the last rows and refreshes rollups, indicators and the screener snapshot
+    with timer.stage("commit"):
+        writer.commit()
+
+    stats = writer.stats
+    print(f"  Rows inserted: {stats['inserted']}, updated: {stats['updated']}, unchanged: {stats['unchanged']}.")
+
+    for stock_id, ticker in fetcher.failed:
+        print(f"  WARNING: No data found for {ticker}")
+
+    if stats['inserted'] or stats['updated']:
+        # New returns change the news/price correlations
+        conn = get_connection()
         try:
-            # Download data for the last 1 day
-            df = yf.download(ticker, period="1d", progress=False, multi_level_index=False)
-            
-            if df.empty:
-                print(f"  WARNING: No data found for {ticker}")
-                continue
-                
-            # save_daily_data now uses INSERT OR REPLACE (upsert)
-            save_daily_data(stock_id, df)
-            success_count += 1
-            
-            # Small delay to be polite to the API
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"  ERROR fetching {ticker}: {e}")
+            with timer.stage("news_impact"):
+                rows = refresh_news_impact(conn)
+                bump_data_version(conn, DATA_VERSION_NEWS)
+                conn.commit()
+        finally:
+            conn.close()
+        print(f"  News impact refreshed ({rows} rows).")
+
+    with timer.stage("price_store"):
+        bars = refresh_price_store(writer.touched)
+    print(f"  Price store synced ({bars} bars).")
             
     elapsed = time.time() - start_time
     print(f"Update complete. Success: {success_count}/{len(stocks)}. Time taken: {elapsed:.2f} seconds.")
+    for line in timer.report():
+        print(line)
+    timer.finish()
 
 if __name__ == "__main__":
     update_prices()